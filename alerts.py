@@ -0,0 +1,266 @@
+"""
+Alert dispatch.
+
+send_email_alert() only queues listings. A background thread waits for a
+short coalescing window so a burst of matches goes out as one digest,
+then hands it to the notifier (notify.py), which delivers it to each
+subscriber with retries. Email goes through a transport; SMTP keeps one
+connection open between digests and reconnects when the server drops it.
+"""
+import os
+import queue
+import smtplib
+import threading
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from prices import get_price_index
+
+EMAIL_ADDRESS = os.getenv('EMAIL_ADDRESS')
+SMTP_HOST = os.getenv('SMTP_HOST')
+SMTP_PORT = int(os.getenv('SMTP_PORT', 587))
+SMTP_USER = os.getenv('SMTP_USER')
+SMTP_PASSWORD = os.getenv('SMTP_PASSWORD')
+SMTP_STARTTLS = os.getenv('SMTP_STARTTLS', 'true').lower() == 'true'
+
+# Matches arriving within this many seconds of each other share a digest
+ALERT_COALESCE_SECONDS = float(os.getenv('ALERT_COALESCE_SECONDS', 30))
+
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+# Compiled once; the HTML part is autoescaped, the text part is not
+_templates = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=select_autoescape(["html"]),
+    trim_blocks=True,
+    lstrip_blocks=True,
+)
+HTML_TEMPLATE = _templates.get_template("alert_email.html")
+TEXT_TEMPLATE = _templates.get_template("alert_email.txt")
+
+
+def _listing_rows(listings, market):
+    """
+    One tuple per listing, shared by both templates and formatted as
+    strings up front, since Jinja escapes a str faster than a number:
+    (title, price, threshold, platform, console type, deal score, market
+    median, link, [(platform, price, link, title) per cross-post])
+    """
+    rows = []
+    for listing in listings:
+        stats = market.get(listing.console_type)
+        deal = listing.deal_score is not None
+        rows.append((
+            listing.title,
+            "%.2f" % listing.price,
+            str(listing.threshold) if listing.threshold is not None else None,
+            listing.platform.value,
+            listing.console_type,
+            "%.0f" % (listing.deal_score * 100) if deal else None,
+            "%.2f" % stats['median'] if deal and stats else None,
+            listing.link,
+            [(duplicate.platform.value, "%.2f" % duplicate.price, duplicate.link, duplicate.title)
+             for duplicate in listing.duplicates],
+        ))
+    return rows
+
+
+def render_alert(listings):
+    """Build (subject, text, html) for a digest of listings"""
+    price_index = get_price_index()
+    market = {
+        listing.console_type: price_index.stats(listing.console_type)
+        for listing in listings
+    }
+
+    rows = _listing_rows(listings, market)
+    subject = f"Found {len(listings)} Gaming Console Deal(s)!"
+    return subject, TEXT_TEMPLATE.render(rows=rows), HTML_TEMPLATE.render(rows=rows)
+
+
+class ConsoleTransport:
+    """Prints alerts instead of sending them (no SMTP configured)"""
+
+    def send(self, recipient, subject, text, html):
+        print(f"\n{'=' * 60}")
+        print(f"EMAIL ALERT WOULD BE SENT:")
+        print(f"To: {recipient}")
+        print(f"Subject: {subject}")
+        print(text)
+        print(f"{'=' * 60}\n")
+
+    def close(self):
+        pass
+
+
+class SMTPTransport:
+    """Sends alerts over one SMTP connection that is reused between digests"""
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, user=SMTP_USER, password=SMTP_PASSWORD,
+                 starttls=SMTP_STARTTLS, sender=None):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.sender = sender or user or EMAIL_ADDRESS
+        self.connection = None
+        # Notification workers share this connection
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        connection = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.starttls:
+            connection.starttls()
+        if self.user:
+            connection.login(self.user, self.password)
+        self.connection = connection
+
+    def _is_connected(self):
+        if self.connection is None:
+            return False
+        try:
+            return self.connection.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+
+    def send(self, recipient, subject, text, html):
+        message = MIMEMultipart('alternative')
+        message['Subject'] = subject
+        message['From'] = self.sender
+        message['To'] = recipient
+        message.attach(MIMEText(text, 'plain'))
+        message.attach(MIMEText(html, 'html'))
+
+        with self.lock:
+            if not self._is_connected():
+                self._disconnect()
+                self._connect()
+
+            try:
+                self.connection.sendmail(self.sender, [recipient], message.as_string())
+            except smtplib.SMTPServerDisconnected:
+                # Dropped between the check and the send, try once more on a fresh one
+                self._connect()
+                self.connection.sendmail(self.sender, [recipient], message.as_string())
+
+    def _disconnect(self):
+        if self.connection is not None:
+            try:
+                self.connection.quit()
+            except smtplib.SMTPException:
+                pass
+            self.connection = None
+
+    def close(self):
+        with self.lock:
+            self._disconnect()
+
+
+def default_transport():
+    return SMTPTransport() if SMTP_HOST else ConsoleTransport()
+
+
+class AlertDispatcher:
+    """Background queue that coalesces listings into digests and sends them"""
+
+    def __init__(self, notifier, coalesce_seconds=ALERT_COALESCE_SECONDS):
+        self.notifier = notifier
+        self.coalesce_seconds = coalesce_seconds
+        self.queue = queue.Queue()
+        self.stats = {"queued": 0, "digests_sent": 0, "listings_sent": 0, "deliveries": 0, "failed_deliveries": 0}
+        self.thread = threading.Thread(target=self._run, name="alert-dispatcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, listings, subscriber_id=None, on_sent=None):
+        """
+        Queue listings for the next digest; never blocks on delivery.
+        With a subscriber_id they go to that subscriber only (watchlist
+        matches), otherwise to everyone whose filters match. on_sent() is
+        called from the dispatcher thread once their digest went out.
+        """
+        if listings:
+            self.stats["queued"] += len(listings)
+            self.queue.put((subscriber_id, list(listings), on_sent))
+
+    def stop(self, timeout=None):
+        """Send whatever is queued, then stop the dispatcher thread"""
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+    def _run(self):
+        while True:
+            batch = self.queue.get()
+            if batch is None:
+                break
+
+            # Keep collecting until the window closes
+            digests = {}
+            callbacks = []
+            stopping = False
+            deadline = time.monotonic() + self.coalesce_seconds
+            while True:
+                subscriber_id, listings, on_sent = batch
+                digests.setdefault(subscriber_id, []).extend(listings)
+                if on_sent is not None:
+                    callbacks.append(on_sent)
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if batch is None:
+                    stopping = True
+                    break
+
+            for subscriber_id, listings in digests.items():
+                self._deliver(listings, subscriber_id)
+            for on_sent in callbacks:
+                try:
+                    on_sent()
+                except Exception as e:
+                    print(f"Error after sending alert digest: {e}")
+            if stopping:
+                break
+
+        self.notifier.close()
+
+    def _deliver(self, listings, subscriber_id=None):
+        try:
+            if subscriber_id is None:
+                delivered, failed = self.notifier.notify(listings)
+            else:
+                delivered, failed = self.notifier.notify_subscriber(subscriber_id, listings)
+        except Exception as e:
+            print(f"Error sending alert digest: {e}")
+            delivered, failed = 0, 1
+
+        self.stats["digests_sent"] += 1
+        self.stats["listings_sent"] += len(listings)
+        self.stats["deliveries"] += delivered
+        self.stats["failed_deliveries"] += failed
+
+
+_alert_dispatcher = None
+
+
+def get_alert_dispatcher():
+    global _alert_dispatcher
+    if _alert_dispatcher is None:
+        from notify import Notifier
+        _alert_dispatcher = AlertDispatcher(Notifier())
+    return _alert_dispatcher
+
+
+def stop_alert_dispatcher(timeout=None):
+    global _alert_dispatcher
+    if _alert_dispatcher is not None:
+        _alert_dispatcher.stop(timeout)
+        _alert_dispatcher = None
@@ -1,39 +1,26 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, send_from_directory
 from flask_cors import CORS
+import atexit
 import threading
-import time
 from datetime import datetime
-import json
 import os
-import psycopg2
 
-from scraper import (
-    scrape_craigslist,
-    scrape_offerup,
-    scrape_mercari,
-    send_email_alert,
-    load_seen_listings,
-    save_seen_listings,
-    ZIP_CODE
-)
+from worker import ScanWorker
+from watchlists import ensure_watchlist_tables
+from history import ensure_listing_tables, listing_filters, page_etag, query_listings
+from metrics import render_metrics
+from profiling import PROFILE_DIR, list_profiles
+from settings import SettingsError, load_settings, save_settings, validate_settings
 
 
 DATABASE_URL = os.getenv('DATABASE_URL')
+# Required as X-Admin-Token on admin endpoints when set
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
 
 def get_db():
-    return psycopg2.connect(DATABASE_URL)
-
-SETTINGS_FILE = "user_settings.json"
-
-def load_settings():
-    if os.path.exists(SETTINGS_FILE):
-        with open(SETTINGS_FILE, 'r') as f:
-            return json.load(f)
-    return None
+    import psycopg2
 
-def save_settings_to_file(settings):
-    with open(SETTINGS_FILE, 'w') as f:
-        json.dump(settings, f, indent=2)
+    return psycopg2.connect(DATABASE_URL)
 
 # Import your scraper functions
 # We'll modify scraper.py to make functions importable
@@ -49,133 +36,113 @@ scraper_state = {
     "items_scanned_today": 0,
     "matches_found_today": 0,
     "recent_activity": [],
-    "settings": {
-        "platforms": {
-            "craigslist": True,
-            "offerup": True,
-            "mercari": True
-        },
-        "zip_code": "95212",
-        "distance": 25,
-        "check_interval": 10,  # minutes
-        "thresholds": {
-            "game boy": 30,
-            "gameboy": 30,
-            "gba": 40,
-            "gba sp": 80,
-            "nintendo ds": 30,
-            "3ds": 110,
-            "3ds xl": 150,
-            "2ds": 100,
-            "2ds xl": 150,
-        },
-        "ai_detection": True,
-        "description_scan": True,
-        "strictness": 2  # 1=lenient, 2=medium, 3=strict
-    }
+    "worker_pid": None,
+    "parse_stats": None,
+    "price_stats": {},
+    "alert_stats": None,
+    "cache_stats": None,
+    "profiling": {"scans_remaining": 0, "last": []},
+    "governor": None,
+    "rate_limits": None,
+    "captchas": [],
+    # Saved settings, or the defaults
+    "settings": load_settings()
 }
 
-# Load saved settings if they exist
-saved = load_settings()
-if saved:
-    scraper_state["settings"] = saved
-
 scraper_thread = None
+scraper_stop_event = None
+scan_worker = ScanWorker()
+atexit.register(scan_worker.terminate)
+# Latest metrics snapshot from the worker process, served at /metrics
+worker_metrics = {}
 
 
-def run_scraper_loop():
-    """Background thread that runs the scraper"""
-    global scraper_state
+def add_activity(message, activity_type=None):
+    entry = {
+        "time": datetime.now().strftime("%H:%M:%S"),
+        "message": message
+    }
+    if activity_type:
+        entry["type"] = activity_type
+    scraper_state["recent_activity"].insert(0, entry)
 
-    # Load seen listings to avoid duplicates
-    seen_listings = load_seen_listings()
+    # Keep only last 50 activities
+    scraper_state["recent_activity"] = scraper_state["recent_activity"][:50]
 
-    while scraper_state["running"]:
-        try:
-            scraper_state["status"] = "running"
-            scraper_state["last_check"] = datetime.now().strftime("%H:%M:%S")
-
-            # Add to activity log
-            scraper_state["recent_activity"].insert(0, {
-                "time": datetime.now().strftime("%H:%M:%S"),
-                "message": "Starting scan..."
-            })
-
-            # Keep only last 50 activities
-            scraper_state["recent_activity"] = scraper_state["recent_activity"][:50]
-
-            # ACTUALLY CALL THE SCRAPER!
-            all_listings = []
-
-            # Get settings from scraper_state
-            platforms = scraper_state["settings"]["platforms"]
-
-            # Scrape enabled platforms
-            if platforms.get("craigslist", True):
-                scraper_state["recent_activity"].insert(0, {
-                    "time": datetime.now().strftime("%H:%M:%S"),
-                    "message": "Checking Craigslist..."
-                })
-                craigslist_listings = scrape_craigslist(ZIP_CODE, debug=False)
-                all_listings.extend(craigslist_listings)
-                scraper_state["items_scanned_today"] += len(craigslist_listings)
-
-            if platforms.get("offerup", True):
-                scraper_state["recent_activity"].insert(0, {
-                    "time": datetime.now().strftime("%H:%M:%S"),
-                    "message": "Checking OfferUp..."
-                })
-                offerup_listings = scrape_offerup(debug=False)
-                all_listings.extend(offerup_listings)
-                scraper_state["items_scanned_today"] += len(offerup_listings)
-
-            if platforms.get("mercari", True):
-                scraper_state["recent_activity"].insert(0, {
-                    "time": datetime.now().strftime("%H:%M:%S"),
-                    "message": "Checking Mercari..."
-                })
-                mercari_listings = scrape_mercari(debug=False)
-                all_listings.extend(mercari_listings)
-                scraper_state["items_scanned_today"] += len(mercari_listings)
-
-            # Filter out already seen listings
-            new_listings = []
-            for listing in all_listings:
-                listing_id = f"{listing['platform']}_{listing['link']}"
-                if listing_id not in seen_listings:
-                    new_listings.append(listing)
-                    seen_listings.append(listing_id)
-
-            # Update matches found
-            scraper_state["matches_found_today"] += len(new_listings)
-
-            if new_listings:
-                scraper_state["recent_activity"].insert(0, {
-                    "time": datetime.now().strftime("%H:%M:%S"),
-                    "message": f"Found {len(new_listings)} new match(es)!",
-                    "type": "success"
-                })
-                send_email_alert(new_listings)
-                save_seen_listings(seen_listings)
-            else:
-                scraper_state["recent_activity"].insert(0, {
-                    "time": datetime.now().strftime("%H:%M:%S"),
-                    "message": "Scan complete. No new matches found.",
-                    "type": "info"
-                })
-
-            # Wait for next check
-            wait_seconds = scraper_state["settings"]["check_interval"] * 60
-            time.sleep(wait_seconds)
-
-        except Exception as e:
-            scraper_state["status"] = "error"
-            scraper_state["recent_activity"].insert(0, {
-                "time": datetime.now().strftime("%H:%M:%S"),
-                "message": f"Error: {str(e)}",
-                "type": "error"
-            })
-            time.sleep(60)  # Wait a minute before retrying
+
+def run_scraper_loop(stop_event):
+    """
+    Background thread that schedules scans on the worker process.
+    The scan itself runs in worker.py; this thread only applies the
+    status events that flow back.
+    """
+    global scraper_state
+
+    consecutive_failures = 0
+    while scraper_state["running"] and not stop_event.is_set():
+        scraper_state["status"] = "running"
+        scraper_state["last_check"] = datetime.now().strftime("%H:%M:%S")
+
+        profiling = scraper_state["profiling"]
+        profile = profiling["scans_remaining"] > 0
+        if profile:
+            profiling["scans_remaining"] -= 1
+
+        job_id = scan_worker.submit(dict(scraper_state["settings"]), profile=profile)
+        scraper_state["worker_pid"] = scan_worker.pid
+
+        failed = False
+        for kind, payload in scan_worker.events(job_id, lambda: not stop_event.is_set()):
+            if kind == "activity":
+                add_activity(payload["message"], payload.get("type"))
+            elif kind == "scanned":
+                scraper_state["items_scanned_today"] += payload
+            elif kind == "matches":
+                scraper_state["matches_found_today"] += payload
+            elif kind == "counters":
+                # The worker keeps the day's totals in its checkpoint, across restarts
+                scraper_state["items_scanned_today"] = payload["scanned"]
+                scraper_state["matches_found_today"] = payload["matches"]
+            elif kind == "parse_stats":
+                scraper_state["parse_stats"] = payload
+            elif kind == "price_stats":
+                scraper_state["price_stats"] = payload
+            elif kind == "alert_stats":
+                scraper_state["alert_stats"] = payload
+            elif kind == "cache_stats":
+                scraper_state["cache_stats"] = payload
+            elif kind == "governor":
+                # Surface anything the governor did since the last scan
+                previous = scraper_state["governor"] or {"events": []}
+                for event in reversed(payload["events"]):
+                    if event not in previous["events"]:
+                        add_activity(f"Resources: {event['message']}", "info")
+                scraper_state["governor"] = payload
+            elif kind == "rate_limits":
+                scraper_state["rate_limits"] = payload
+            elif kind == "captchas":
+                scraper_state["captchas"] = payload
+            elif kind == "profile":
+                scraper_state["profiling"]["last"] = payload
+            elif kind == "metrics":
+                worker_metrics.clear()
+                worker_metrics.update(payload)
+            elif kind == "error":
+                failed = True
+                scraper_state["status"] = "error"
+                add_activity(f"Error: {payload}", "error")
+
+        interval_seconds = scraper_state["settings"]["check_interval"] * 60
+        if failed:
+            # Platform trouble is handled by the worker's circuit breakers; this is
+            # the whole scan failing, so back off 1, 2, 4... minutes up to the interval
+            consecutive_failures += 1
+            wait_seconds = min(60 * 2 ** (consecutive_failures - 1), max(60, interval_seconds))
+        else:
+            consecutive_failures = 0
+            wait_seconds = interval_seconds
+
+        stop_event.wait(wait_seconds)
 
 
 @app.route('/api/status', methods=['GET'])
@@ -184,25 +151,91 @@ def get_status():
     return jsonify(scraper_state)
 
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Scan latency histograms and item/error counters in Prometheus text format"""
+    return Response(render_metrics(dict(worker_metrics)), mimetype='text/plain; version=0.0.4')
+
+
+def is_admin():
+    return not ADMIN_TOKEN or request.headers.get('X-Admin-Token') == ADMIN_TOKEN
+
+
+@app.route('/api/profile', methods=['GET', 'POST'])
+def handle_profile():
+    """Profile the next N scans, or list the saved profiles"""
+    if not is_admin():
+        return jsonify({"success": False, "error": "Admin token required"}), 403
+
+    if request.method == 'POST':
+        body = request.get_json(silent=True)
+        if body is None and not request.get_data():
+            body = {}
+        scans = body.get("scans", 1) if isinstance(body, dict) else None
+        if isinstance(scans, bool) or not isinstance(scans, int):
+            return jsonify({"success": False, "error": "scans must be a whole number"}), 400
+        scraper_state["profiling"]["scans_remaining"] = max(0, min(scans, 10))
+        add_activity(f"Profiling the next {scraper_state['profiling']['scans_remaining']} scan(s)", "info")
+
+    return jsonify({
+        "success": True,
+        "scans_remaining": scraper_state["profiling"]["scans_remaining"],
+        "last": scraper_state["profiling"]["last"],
+        "files": list_profiles()
+    })
+
+
+@app.route('/api/profile/<path:name>', methods=['GET'])
+def download_profile(name):
+    """Download a .pstats or .collapsed profile file"""
+    if not is_admin():
+        return jsonify({"success": False, "error": "Admin token required"}), 403
+    return send_from_directory(os.path.abspath(PROFILE_DIR), name, as_attachment=True)
+
+
+@app.route('/api/captchas', methods=['GET'])
+def get_captchas():
+    """Browsers parked on a CAPTCHA, waiting for an operator, with the DevTools address to solve them at"""
+    return jsonify(scraper_state["captchas"])
+
+
+@app.route('/api/captchas/<int:captcha_id>', methods=['POST'])
+def resolve_captcha(captcha_id):
+    """Tell the worker a parked CAPTCHA was solved, should be retried, or dismissed"""
+    if not is_admin():
+        return jsonify({"success": False, "error": "Admin token required"}), 403
+
+    action = (request.json or {}).get("action", "solved")
+    if action not in ("solved", "retry", "dismiss"):
+        return jsonify({"success": False, "error": "action must be solved, retry or dismiss"}), 400
+
+    entry = next((entry for entry in scraper_state["captchas"] if entry["id"] == captcha_id), None)
+    if entry is None:
+        return jsonify({"success": False, "error": "Unknown CAPTCHA"}), 404
+
+    if not scan_worker.control({"type": "captcha_resolve", "id": captcha_id, "action": action}):
+        return jsonify({"success": False, "error": "Scan worker is not running"}), 409
+
+    # The worker confirms with its next captchas event
+    entry["status"] = "resolving"
+    add_activity(f"CAPTCHA #{captcha_id} ({entry['platform']}): {action}", "info")
+    return jsonify({"success": True, "captcha": entry})
+
+
 @app.route('/api/start', methods=['POST'])
 def start_scraper():
     """Start the scraper"""
-    global scraper_state, scraper_thread
+    global scraper_state, scraper_thread, scraper_stop_event
 
     if not scraper_state["running"]:
         scraper_state["running"] = True
         scraper_state["status"] = "running"
-        scraper_state["items_scanned_today"] = 0
-        scraper_state["matches_found_today"] = 0
 
-        scraper_thread = threading.Thread(target=run_scraper_loop, daemon=True)
+        scraper_stop_event = threading.Event()
+        scraper_thread = threading.Thread(target=run_scraper_loop, args=(scraper_stop_event,), daemon=True)
         scraper_thread.start()
 
-        scraper_state["recent_activity"].insert(0, {
-            "time": datetime.now().strftime("%H:%M:%S"),
-            "message": "Scraper started",
-            "type": "success"
-        })
+        add_activity("Scraper started", "success")
 
     return jsonify({"success": True, "status": scraper_state["status"]})
 
@@ -215,11 +248,14 @@ def stop_scraper():
     scraper_state["running"] = False
     scraper_state["status"] = "stopped"
 
-    scraper_state["recent_activity"].insert(0, {
-        "time": datetime.now().strftime("%H:%M:%S"),
-        "message": "Scraper stopped",
-        "type": "info"
-    })
+    if scraper_stop_event:
+        scraper_stop_event.set()
+
+    # The worker exits after the scan it is on, if any
+    scan_worker.stop()
+    scraper_state["worker_pid"] = None
+
+    add_activity("Scraper stopped", "info")
 
     return jsonify({"success": True, "status": "stopped"})
 
@@ -233,10 +269,152 @@ def handle_settings():
         return jsonify(scraper_state["settings"])
 
     elif request.method == 'POST':
-        new_settings = request.json
-        scraper_state["settings"].update(new_settings)
+        try:
+            new_settings = validate_settings(request.get_json(silent=True), scraper_state["settings"])
+        except SettingsError as e:
+            return jsonify({"success": False, "errors": e.errors}), 400
+
+        save_settings(new_settings)
+        scraper_state["settings"] = new_settings
+        # A running scan picks the new filters up from its next search term
+        if scan_worker.control({"type": "settings", "settings": new_settings}):
+            add_activity("Settings saved, applied to the running scan", "info")
+        else:
+            add_activity("Settings saved", "info")
+
+        return jsonify({"success": True, "settings": new_settings})
 
-        return jsonify({"success": True, "settings": scraper_state["settings"]})
+
+@app.route('/api/watchlists', methods=['GET', 'POST'])
+def handle_watchlists():
+    """List or add/update a user's watchlist entries"""
+    if request.method == 'GET':
+        user_id = request.args.get('user_id')
+        if not user_id:
+            return jsonify({"success": False, "error": "user_id is required"}), 400
+    else:
+        if not is_admin():
+            return jsonify({"success": False, "error": "Admin token required"}), 403
+        entry = request.get_json(silent=True)
+        if not isinstance(entry, dict):
+            return jsonify({"success": False, "error": "Body must be a JSON object"}), 400
+        user_id = entry.get("user_id")
+        keyword = str(entry.get("keyword") or "").strip().lower()
+        if not user_id or not keyword or entry.get("max_price") is None:
+            return jsonify({"success": False, "error": "user_id, keyword and max_price are required"}), 400
+        for name in ("min_price", "max_price"):
+            price = entry.get(name, 0)
+            if isinstance(price, bool) or not isinstance(price, (int, float)) or price < 0:
+                return jsonify({"success": False, "error": f"{name} must be a number of 0 or more"}), 400
+
+    conn = get_db()
+    try:
+        ensure_watchlist_tables(conn)
+        cursor = conn.cursor()
+
+        if request.method == 'POST':
+            cursor.execute('''
+                INSERT INTO watchlists (user_id, keyword, min_price, max_price)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (user_id, keyword)
+                DO UPDATE SET min_price = EXCLUDED.min_price, max_price = EXCLUDED.max_price
+            ''', (user_id, keyword, entry.get("min_price", 0), entry["max_price"]))
+            conn.commit()
+
+        cursor.execute(
+            "SELECT id, keyword, min_price, max_price FROM watchlists WHERE user_id = %s ORDER BY keyword",
+            (user_id,)
+        )
+        watchlist = [
+            {"id": row[0], "keyword": row[1], "min_price": float(row[2]), "max_price": float(row[3])}
+            for row in cursor.fetchall()
+        ]
+        cursor.close()
+    finally:
+        conn.close()
+
+    return jsonify({"success": True, "user_id": user_id, "watchlist": watchlist})
+
+
+@app.route('/api/watchlists/<int:watch_id>', methods=['DELETE'])
+def delete_watchlist_entry(watch_id):
+    """Remove one watchlist entry"""
+    if not is_admin():
+        return jsonify({"success": False, "error": "Admin token required"}), 403
+
+    conn = get_db()
+    try:
+        ensure_watchlist_tables(conn)
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM watchlists WHERE id = %s", (watch_id,))
+        deleted = cursor.rowcount
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+
+    return jsonify({"success": bool(deleted)})
+
+
+@app.route('/api/watchlists/alerts', methods=['GET'])
+def get_watchlist_alerts():
+    """Most recent watchlist alerts for one user"""
+    user_id = request.args.get('user_id')
+    if not user_id:
+        return jsonify({"success": False, "error": "user_id is required"}), 400
+    try:
+        limit = max(1, min(int(request.args.get('limit', 50)), 200))
+    except ValueError:
+        return jsonify({"success": False, "error": "limit must be a whole number"}), 400
+
+    conn = get_db()
+    try:
+        ensure_watchlist_tables(conn)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT title, price, link, platform, console_type, keyword, created_at
+            FROM watch_alerts WHERE user_id = %s
+            ORDER BY created_at DESC LIMIT %s
+        ''', (user_id, limit))
+        alerts = [
+            {
+                "title": row[0], "price": float(row[1]), "link": row[2], "platform": row[3],
+                "console_type": row[4], "keyword": row[5], "created_at": row[6].isoformat()
+            }
+            for row in cursor.fetchall()
+        ]
+        cursor.close()
+    finally:
+        conn.close()
+
+    return jsonify({"success": True, "user_id": user_id, "alerts": alerts})
+
+
+@app.route('/api/listings', methods=['GET'])
+def get_listings():
+    """
+    Listing history, newest first, one keyset page at a time.
+    Pass the next_cursor of a page as cursor to get the one after it.
+    """
+    try:
+        filters = listing_filters(request.args)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    conn = get_db()
+    try:
+        ensure_listing_tables(conn)
+        listings, next_cursor = query_listings(conn, filters)
+    finally:
+        conn.close()
+
+    etag = page_etag(listings, next_cursor)
+    if request.headers.get('If-None-Match') == etag:
+        return Response(status=304, headers={"ETag": etag})
+
+    response = jsonify({"success": True, "listings": listings, "next_cursor": next_cursor})
+    response.headers["ETag"] = etag
+    return response
 
 
 if __name__ == '__main__':
@@ -0,0 +1,125 @@
+"""
+Lean browsing profile for the Selenium platforms.
+
+We only read card text and hrefs, so images, media, fonts and third-party
+trackers are blocked through CDP Network.setBlockedURLs on every driver a
+scraper starts. The block list only applies to the tab it was sent to, so
+it is sent again for every tab opened through open_tab(). A platform that turns out to need one of the patterns
+lists it in PLATFORM_ALLOWLIST and keeps loading it.
+
+Every search page load records its transferred bytes and load time under
+its tab's profile ("lean" or "full"), so /metrics shows what blocking
+saves: compare a run with LEAN_BROWSING=off against the default. The
+bytes come from the page's Resource Timing entries; cross-origin
+resources without Timing-Allow-Origin count as 0, so they are a floor.
+"""
+import os
+
+from metrics import PAGE_BYTES, PAGE_LOAD_SECONDS
+
+LEAN_BROWSING = os.getenv('LEAN_BROWSING', 'on').lower() != 'off'
+
+BLOCK_CATEGORIES = {
+    "images": ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico"],
+    "media": ["*.mp4", "*.webm", "*.m3u8", "*.mp3"],
+    "fonts": ["*.woff", "*.woff2", "*.ttf", "*.otf"],
+    "trackers": [
+        "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+        "*googlesyndication.com*", "*facebook.net*", "*hotjar.com*", "*segment.io*",
+        "*segment.com*", "*amplitude.com*", "*nr-data.net*", "*branch.io*",
+        "*criteo.com*", "*bing.com/bat*", "*tiktok.com/i18n/pixel*",
+    ],
+}
+
+# Patterns a platform still needs, taken out of its block list
+PLATFORM_ALLOWLIST = {
+    "OfferUp": (),
+    "Mercari": (),
+}
+
+PAGE_STATS_JS = """
+const nav = performance.getEntriesByType('navigation')[0];
+const resources = performance.getEntriesByType('resource');
+let bytes = nav ? nav.transferSize : 0;
+for (const entry of resources) bytes += entry.transferSize;
+const loaded = nav && nav.loadEventEnd ? nav.loadEventEnd : performance.now();
+return {bytes: bytes, resources: resources.length, load_ms: loaded};
+"""
+
+
+def blocked_patterns(platform):
+    allowed = set(PLATFORM_ALLOWLIST.get(platform, ()))
+    return [pattern for patterns in BLOCK_CATEGORIES.values() for pattern in patterns if pattern not in allowed]
+
+
+def _block_current_tab(driver, patterns):
+    """Network.setBlockedURLs only reaches the tab in front, so each tab is set up on its own"""
+    handle = driver.current_window_handle
+    driver.browsing_profiles[handle] = "full"
+    if not LEAN_BROWSING:
+        return
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {"urls": patterns})
+        driver.browsing_profiles[handle] = "lean"
+    except Exception as e:
+        print(f"  Could not enable lean browsing for {driver.lean_platform}: {e}")
+
+
+def apply_lean_browsing(driver, platform):
+    """
+    Block heavy and tracking requests in every open tab of driver for
+    platform's pages. Tabs opened later through open_tab() get the same.
+    """
+    driver.lean_platform = platform
+    driver.browsing_profiles = {}
+    patterns = blocked_patterns(platform)
+    handles = driver.window_handles
+    front = driver.current_window_handle
+    for handle in handles:
+        if handle != front:
+            driver.switch_to.window(handle)
+            _block_current_tab(driver, patterns)
+    if len(handles) > 1:
+        driver.switch_to.window(front)
+    _block_current_tab(driver, patterns)
+    return driver
+
+
+def open_tab(driver):
+    """Open a tab in front, blocking what the driver's other tabs block; returns its handle"""
+    driver.switch_to.new_window('tab')
+    platform = getattr(driver, 'lean_platform', None)
+    if platform is not None:
+        _block_current_tab(driver, blocked_patterns(platform))
+    return driver.current_window_handle
+
+
+def browsing_profile(driver):
+    """"lean" or "full" for the tab in front"""
+    profiles = getattr(driver, 'browsing_profiles', None)
+    if not profiles:
+        return "full"
+    return profiles.get(driver.current_window_handle, "full")
+
+
+def restore_full_browsing(driver):
+    """Load everything again in the tab in front, e.g. before a human has to look at it"""
+    try:
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {"urls": []})
+        if getattr(driver, 'browsing_profiles', None) is not None:
+            driver.browsing_profiles[driver.current_window_handle] = "full"
+    except Exception:
+        pass
+
+
+def record_page_load(driver, platform):
+    """Observe bytes transferred and load time of the current page; returns the stats"""
+    try:
+        stats = driver.execute_script(PAGE_STATS_JS)
+    except Exception:
+        return None
+    profile = browsing_profile(driver)
+    PAGE_BYTES.observe(stats["bytes"], platform, profile)
+    PAGE_LOAD_SECONDS.observe(stats["load_ms"] / 1000, platform, profile)
+    return stats
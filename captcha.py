@@ -0,0 +1,199 @@
+"""
+CAPTCHA handling that never blocks a scan.
+
+When a page turns out to be a CAPTCHA, the scraper parks the browser on
+the CaptchaDesk and carries on without it; the platform is done for this
+scan and the others are not held up. Parked browsers wait in a "needs
+human" state, listed by the API, until an operator acts on them:
+
+    solved   the operator solved it in the browser; checked, then the
+             browser (and its cookies) is handed to the next scan
+    retry    reload the page and check again
+    dismiss  close the browser
+
+OfferUp runs headless Chrome and Mercari's window sits off-screen, so an
+operator usually has no window to solve the challenge in. Each parked
+entry therefore lists the browser's DevTools address (debugger_address,
+e.g. "localhost:40213") as chromedriver reports it. Chrome only listens
+on the worker host's loopback. From there, or through an SSH tunnel to
+that port, add the address under chrome://inspect > Configure, inspect
+the parked tab and solve the challenge in the DevTools screencast. Then
+POST "solved" as usual.
+
+Parked browsers close by themselves after CAPTCHA_PARK_SECONDS. Detection
+is an element lookup plus a short read of the page text, not a pull of
+the whole page source.
+"""
+import itertools
+import os
+import threading
+import time
+from datetime import datetime
+
+from browsing import apply_lean_browsing, restore_full_browsing
+
+CAPTCHA_PARK_SECONDS = int(os.getenv('CAPTCHA_PARK_SECONDS', 1800))
+
+CAPTCHA_SELECTOR = ", ".join([
+    "#px-captcha",
+    "iframe[src*='captcha']",
+    "iframe[src*='challenges.cloudflare.com']",
+    "div.g-recaptcha",
+    "div.h-captcha",
+    "#challenge-form",
+    "[data-testid*='captcha']",
+])
+CAPTCHA_TEXT = ("verify you are human", "are you a robot", "press & hold")
+
+# Only the start of the visible text is read, that's where the challenge is
+CAPTCHA_TEXT_JS = "return document.body ? document.body.innerText.slice(0, 2000).toLowerCase() : ''"
+
+
+def captcha_present(driver):
+    from selenium.webdriver.common.by import By
+
+    try:
+        if driver.find_elements(By.CSS_SELECTOR, CAPTCHA_SELECTOR):
+            return True
+        text = driver.execute_script(CAPTCHA_TEXT_JS) or ""
+        return any(marker in text for marker in CAPTCHA_TEXT)
+    except Exception:
+        return False
+
+
+def debugger_address(driver):
+    """host:port of the browser's DevTools endpoint, or None if the driver doesn't say"""
+    try:
+        return driver.capabilities.get("goog:chromeOptions", {}).get("debuggerAddress")
+    except Exception:
+        return None
+
+
+class CaptchaDesk:
+    """Browsers parked on a CAPTCHA, one per platform at most"""
+
+    def __init__(self, park_seconds=CAPTCHA_PARK_SECONDS):
+        self.park_seconds = park_seconds
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.entries = {}
+
+    def park(self, platform, driver, url, term):
+        # Whoever solves it needs to see the images
+        restore_full_browsing(driver)
+        address = debugger_address(driver)
+        with self.lock:
+            older = [entry for entry in self.entries.values() if entry["platform"] == platform]
+            captcha_id = next(self.ids)
+            self.entries[captcha_id] = {
+                "id": captcha_id,
+                "platform": platform,
+                "url": url,
+                "term": term,
+                "status": "needs_human",
+                "parked_at": time.time(),
+                "since": datetime.now().strftime("%H:%M:%S"),
+                # Headless browsers can only be solved from chrome://inspect
+                "debugger_address": address,
+                "driver": driver,
+            }
+        # A newer CAPTCHA replaces the one we were still waiting on
+        for entry in older:
+            self._close(entry)
+        print(f"  [captcha] {platform} needs a human (#{captcha_id}, DevTools at {address}), continuing without it")
+        return captcha_id
+
+    def take_solved(self, platform):
+        """A browser an operator got past the CAPTCHA, or None"""
+        with self.lock:
+            for captcha_id, entry in list(self.entries.items()):
+                if entry["platform"] == platform and entry["status"] == "solved":
+                    del self.entries[captcha_id]
+                    return apply_lean_browsing(entry["driver"], platform)
+        return None
+
+    def resolve(self, captcha_id, action):
+        """Apply an operator action; returns the entry's new status, or None if unknown"""
+        with self.lock:
+            entry = self.entries.get(captcha_id)
+        if entry is None:
+            return None
+
+        driver = entry["driver"]
+        if action == "dismiss":
+            self._close(entry)
+            return "dismissed"
+
+        if action == "retry":
+            try:
+                driver.refresh()
+                time.sleep(5)
+            except Exception:
+                self._close(entry)
+                return "dismissed"
+
+        status = "needs_human" if captcha_present(driver) else "solved"
+        with self.lock:
+            entry["status"] = status
+        return status
+
+    def _close(self, entry):
+        with self.lock:
+            self.entries.pop(entry["id"], None)
+        try:
+            entry["driver"].quit()
+        except Exception:
+            pass
+
+    def expire(self):
+        now = time.time()
+        with self.lock:
+            stale = [entry for entry in self.entries.values() if now - entry["parked_at"] > self.park_seconds]
+        for entry in stale:
+            print(f"  [captcha] Closing {entry['platform']} browser, nobody solved #{entry['id']}")
+            self._close(entry)
+
+    def close_all(self):
+        with self.lock:
+            entries = list(self.entries.values())
+        for entry in entries:
+            self._close(entry)
+
+    def summary(self):
+        with self.lock:
+            return [
+                {key: value for key, value in entry.items() if key != "driver"}
+                for entry in self.entries.values()
+            ]
+
+
+_captcha_desk = None
+
+
+def get_captcha_desk():
+    global _captcha_desk
+    if _captcha_desk is None:
+        _captcha_desk = CaptchaDesk()
+    return _captcha_desk
+
+
+def wait_for_captcha_solve(driver, timeout=120):
+    """
+    Block until the CAPTCHA in driver is solved by hand.
+    Only for interactive helpers like test_mercari_only; scans park instead.
+    """
+    print("\n" + "=" * 60)
+    print("CAPTCHA DETECTED!")
+    print("Please solve the CAPTCHA in the browser window.")
+    print("The script will automatically continue once solved.")
+    print("=" * 60 + "\n")
+
+    start_time = time.time()
+    while time.time() - start_time < timeout:
+        if not captcha_present(driver):
+            print("CAPTCHA solved! Continuing...")
+            return True
+        time.sleep(2)
+
+    print("Timeout waiting for CAPTCHA solve.")
+    return False
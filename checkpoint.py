@@ -0,0 +1,242 @@
+"""
+Scan checkpoint journal, so a restarted worker picks up where it died.
+
+Everything a scan would lose in a crash is appended to CHECKPOINT_FILE as
+one JSON record per line:
+
+    scan         a scan started (or resumed an interrupted one)
+    term         a (platform, site, term) was fetched and parsed, with its rows
+    seen         listing keys marked seen, before their alerts are queued
+    alerts       a batch of listings handed to the alert dispatcher
+    alerts_sent  that batch went out
+    counters     items scanned / matches found today
+
+Records are flushed as they are written, so a killed process loses
+nothing; fsync is batched (every CHECKPOINT_FSYNC_RECORDS records or
+CHECKPOINT_FSYNC_SECONDS) except for seen and alerts records, which are
+synced before the alerts can go out. A torn last line is ignored.
+
+On start the worker replays the journal: seen keys go back into the seen
+store, unsent alert batches back into the dispatcher, and the next scan
+reuses the rows of terms the interrupted one had finished (if it started
+less than CHECKPOINT_RESUME_SECONDS ago) instead of fetching them again.
+When a scan ends, completed or failed, the journal is rewritten down to
+the unsent alerts and the counters: only a worker that died mid-scan
+resumes, a scan that raised starts over.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from datetime import date
+
+from listing import Listing
+
+CHECKPOINT_FILE = os.getenv('CHECKPOINT_FILE', 'scan_checkpoint.jsonl')
+CHECKPOINT_FSYNC_RECORDS = int(os.getenv('CHECKPOINT_FSYNC_RECORDS', 50))
+CHECKPOINT_FSYNC_SECONDS = float(os.getenv('CHECKPOINT_FSYNC_SECONDS', 5))
+# Older finished terms are stale, the next scan fetches them again
+CHECKPOINT_RESUME_SECONDS = int(os.getenv('CHECKPOINT_RESUME_SECONDS', 1800))
+
+COUNTERS = ("scanned", "matches")
+
+
+def write_atomically(path, data):
+    """Replace path with data (JSON) via a fsynced temp file, so it is never half written"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=".tmp-", dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            if isinstance(data, str):
+                f.write(data)
+            else:
+                json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class ScanJournal:
+    def __init__(self, path=CHECKPOINT_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.scan = None  # {"job", "started"} of the scan that hasn't completed
+        self.done = {}  # (platform, site, term) -> rows
+        self.seen = []  # seen keys since the journal was last compacted
+        self.alerts = {}  # batch id -> (subscriber id, [listing dicts])
+        self.counters = {"day": date.today().isoformat(), "scanned": 0, "matches": 0}
+        self.next_batch = 1
+        self.file = None
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+        self.recovered = self._recover()
+
+    def _recover(self):
+        """Replay the journal into memory; returns how many records were read"""
+        if not os.path.exists(self.path):
+            return 0
+        count = 0
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A write the crash cut short
+                    break
+                self._apply(record)
+                count += 1
+        return count
+
+    def _apply(self, record):
+        kind = record["type"]
+        if kind == "scan":
+            if not record.get("resumed"):
+                self.done = {}
+            self.scan = {"job": record["job"], "started": record["started"]}
+        elif kind == "term":
+            self.done[(record["platform"], record["site"], record["term"])] = [tuple(row) for row in record["rows"]]
+        elif kind == "seen":
+            self.seen.extend(record["keys"])
+        elif kind == "alerts":
+            self.alerts[record["batch"]] = (record["subscriber"], record["listings"])
+            self.next_batch = max(self.next_batch, record["batch"] + 1)
+        elif kind == "alerts_sent":
+            self.alerts.pop(record["batch"], None)
+        elif kind == "counters":
+            self.counters = {key: record[key] for key in ("day",) + COUNTERS}
+
+    def _append(self, record, sync=False):
+        with self.lock:
+            self._apply(record)
+            if self.file is None:
+                self.file = open(self.path, 'a')
+            self.file.write(json.dumps(record) + "\n")
+            self.file.flush()
+            self.unsynced += 1
+            if sync or self.unsynced >= CHECKPOINT_FSYNC_RECORDS \
+                    or time.monotonic() - self.last_sync >= CHECKPOINT_FSYNC_SECONDS:
+                self._sync()
+
+    def _sync(self):
+        if self.file is not None and self.unsynced:
+            os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def sync(self):
+        with self.lock:
+            self._sync()
+
+    def begin_scan(self, job_id):
+        """Start a scan's checkpoints; returns how many finished terms it resumes"""
+        resumable = self.scan is not None and self.done \
+            and time.time() - self.scan["started"] < CHECKPOINT_RESUME_SECONDS
+        if resumable:
+            self._append({"type": "scan", "job": job_id, "started": self.scan["started"], "resumed": True}, sync=True)
+            return len(self.done)
+        self._append({"type": "scan", "job": job_id, "started": time.time()}, sync=True)
+        return 0
+
+    def resumed(self, platform, term, site=None):
+        """A finished Future with the term's rows if the interrupted scan already had them, else None"""
+        rows = self.done.get((str(platform), site, term))
+        if rows is None:
+            return None
+        future = Future()
+        future.set_result(rows)
+        return future
+
+    def track(self, future, platform, term, site=None):
+        """Checkpoint the term once its parse job has finished"""
+        def finished(future):
+            if future.cancelled() or future.exception() is not None:
+                return
+            self._append({"type": "term", "platform": str(platform), "site": site, "term": term,
+                          "rows": future.result()})
+
+        future.add_done_callback(finished)
+        return future
+
+    def mark_seen(self, keys):
+        if keys:
+            self._append({"type": "seen", "keys": list(keys)}, sync=True)
+
+    def queue_alerts(self, listings, subscriber_id=None):
+        """Checkpoint a batch of alerts before it is queued; returns its batch id"""
+        with self.lock:
+            batch = self.next_batch
+            self.next_batch += 1
+        self._append({"type": "alerts", "batch": batch, "subscriber": subscriber_id,
+                      "listings": [listing.to_dict() for listing in listings]}, sync=True)
+        return batch
+
+    def alerts_sent(self, batch):
+        self._append({"type": "alerts_sent", "batch": batch})
+
+    def pending_alerts(self):
+        """[(batch id, subscriber id, [Listing])] queued but never sent"""
+        return [
+            (batch, subscriber_id, [Listing.from_dict(entry) for entry in listings])
+            for batch, (subscriber_id, listings) in sorted(self.alerts.items())
+        ]
+
+    def count(self, kind, amount):
+        """Add to today's counter; a new day starts from zero"""
+        counters = dict(self.counters)
+        today = date.today().isoformat()
+        if counters["day"] != today:
+            counters = {"day": today, "scanned": 0, "matches": 0}
+        counters[kind] += amount
+        self._append(dict(counters, type="counters"))
+
+    def today(self):
+        """Today's counters, zero if the last ones are from another day"""
+        if self.counters["day"] != date.today().isoformat():
+            return {"scanned": 0, "matches": 0}
+        return {kind: self.counters[kind] for kind in COUNTERS}
+
+    def end_scan(self):
+        """
+        The scan ended and the seen store is saved: keep only the unsent
+        alerts and the counters.
+        """
+        with self.lock:
+            self.scan = None
+            self.done = {}
+            self.seen = []
+            records = [dict(self.counters, type="counters")]
+            records.extend(
+                {"type": "alerts", "batch": batch, "subscriber": subscriber_id, "listings": listings}
+                for batch, (subscriber_id, listings) in sorted(self.alerts.items())
+            )
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            write_atomically(self.path, "".join(json.dumps(record) + "\n" for record in records))
+            self.unsynced = 0
+            self.last_sync = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            self._sync()
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+_journal = None
+
+
+def get_journal():
+    global _journal
+    if _journal is None:
+        _journal = ScanJournal()
+    return _journal
@@ -0,0 +1,176 @@
+"""
+Cross-platform near-duplicate detection.
+
+The same console is often posted to Craigslist, OfferUp and Mercari with a
+slightly different title each time. Titles are turned into character
+shingles, MinHashed, and bucketed with LSH banding, so finding candidate
+duplicates costs a few dict lookups instead of a scan over every listing.
+Candidates are confirmed on estimated title similarity and price.
+
+Only cross-posts are merged: a listing joins a group if it is the same
+link, or if the group has nothing else from its platform. Two posts on
+the same platform with different links are two items (two sellers with
+the same console at a similar price), however alike their titles.
+"""
+import random
+import time
+import zlib
+from collections import deque
+
+from regions import normalize_title
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def shingles(title, size=3):
+    """Character n-grams of the normalized title, hashed to ints"""
+    text = normalize_title(title)
+    if len(text) <= size:
+        return {zlib.crc32(text.encode())}
+    return {zlib.crc32(text[i:i + size].encode()) for i in range(len(text) - size + 1)}
+
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index of recently seen listings.
+    Listings older than window_seconds fall out, so the same item relisted
+    next week is treated as new.
+    """
+
+    def __init__(self, num_perm=32, bands=8, similarity=0.6, price_tolerance=0.15,
+                 window_seconds=24 * 3600, seed=1):
+        assert num_perm % bands == 0
+        rng = random.Random(seed)
+        self.permutations = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.similarity = similarity
+        self.price_tolerance = price_tolerance
+        self.window_seconds = window_seconds
+
+        self.buckets = {}        # (band, band signature) -> set of entry ids
+        self.entries = {}        # entry id -> (signature, price, group id, band keys, platform, link)
+        self.groups = {}         # group id -> {platform: {link: entry count}}
+        self.expiry = deque()    # (added at, entry id), oldest first
+        self.next_id = 0
+
+    def signature(self, title):
+        hashes = shingles(title)
+        return tuple(
+            min(((a * h + b) % _PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self.permutations
+        )
+
+    def _band_keys(self, signature):
+        return [
+            (band, signature[band * self.rows:(band + 1) * self.rows])
+            for band in range(self.bands)
+        ]
+
+    def _expire(self, now):
+        while self.expiry and now - self.expiry[0][0] > self.window_seconds:
+            _, entry_id = self.expiry.popleft()
+            _, _, group_id, band_keys, platform, link = self.entries.pop(entry_id)
+            self._leave_group(group_id, platform, link)
+            for key in band_keys:
+                bucket = self.buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(entry_id)
+                    if not bucket:
+                        del self.buckets[key]
+
+    def _leave_group(self, group_id, platform, link):
+        members = self.groups[group_id]
+        links = members[platform]
+        links[link] -= 1
+        if not links[link]:
+            del links[link]
+            if not links:
+                del members[platform]
+                if not members:
+                    del self.groups[group_id]
+
+    def _can_join(self, group_id, platform, link):
+        """Same link, or a platform the group has no listing from yet"""
+        if platform is None:
+            return True
+        links = self.groups[group_id].get(platform)
+        return not links or link in links
+
+    def _same_price(self, a, b):
+        if not a or not b:
+            return a == b
+        return abs(a - b) <= self.price_tolerance * max(a, b)
+
+    def add(self, title, price, now=None, platform=None, link=None):
+        """
+        Index a listing and return (group id, is new group).
+        A listing joins the group of the closest earlier listing it matches
+        that it can be a cross-post of. Without a platform, only title and
+        price are compared.
+        """
+        now = time.time() if now is None else now
+        self._expire(now)
+
+        signature = self.signature(title)
+        band_keys = self._band_keys(signature)
+
+        candidates = set()
+        for key in band_keys:
+            candidates.update(self.buckets.get(key, ()))
+
+        best_group, best_score = None, self.similarity
+        for entry_id in candidates:
+            other_signature, other_price, group_id, _, _, _ = self.entries[entry_id]
+            if not self._same_price(price, other_price) or not self._can_join(group_id, platform, link):
+                continue
+            score = sum(1 for x, y in zip(signature, other_signature) if x == y) / len(signature)
+            if score >= best_score:
+                best_group, best_score = group_id, score
+
+        entry_id = self.next_id
+        self.next_id += 1
+        is_new_group = best_group is None
+        group_id = entry_id if is_new_group else best_group
+
+        self.entries[entry_id] = (signature, price, group_id, band_keys, platform, link)
+        links = self.groups.setdefault(group_id, {}).setdefault(platform, {})
+        links[link] = links.get(link, 0) + 1
+        self.expiry.append((now, entry_id))
+        for key in band_keys:
+            self.buckets.setdefault(key, set()).add(entry_id)
+
+        return group_id, is_new_group
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def group_near_duplicates(listings, index):
+    """
+    Collapse near-duplicate listings into one alert entry each.
+    Returns (alerts, suppressed). Extra copies found in this batch are
+    attached to their alert as listing.duplicates. Copies of an item
+    already alerted earlier in the window are only counted as suppressed.
+    """
+    alerts = []
+    by_group = {}
+    suppressed = 0
+
+    for listing in listings:
+        group_id, is_new_group = index.add(listing.title, listing.price,
+                                           platform=listing.platform, link=listing.link)
+
+        if is_new_group:
+            by_group[group_id] = listing
+            alerts.append(listing)
+        elif group_id in by_group:
+            first = by_group[group_id]
+            if not first.duplicates:
+                first.duplicates = []
+            first.duplicates.append(listing)
+        else:
+            suppressed += 1
+
+    return alerts, suppressed
@@ -0,0 +1,218 @@
+"""
+Resource governor for the scan worker.
+
+Chrome is what runs a small instance out of memory, so the worker asks
+the governor before it does anything browser-shaped:
+
+    - browser(platform) caps how many Chrome drivers are alive at once
+    - tab_budget() cuts a driver's tab pool to one tab while memory is high
+    - admit_term() sheds low-priority search terms while memory is high
+      and defers them to the front of the next scan
+    - recycle_if_needed() kills a driver whose process tree has grown
+      past DRIVER_MAX_MB (or when the worker is over its hard limit) and
+      starts a fresh one
+
+Memory is the RSS of the worker process plus everything below it (parse
+pool, chromedriver, Chrome and its renderers), read from /proc. Without
+/proc the governor reports nothing and never sheds. What it did is kept
+as events for the status page.
+"""
+import os
+import signal
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+MEMORY_LIMIT_MB = int(os.getenv('MEMORY_LIMIT_MB', 512))
+MEMORY_SOFT_RATIO = 0.75   # Shed low-priority terms above this
+MEMORY_HARD_RATIO = 0.9    # Recycle the browser above this
+DRIVER_MAX_MB = int(os.getenv('DRIVER_MAX_MB', 300))
+MAX_BROWSERS = int(os.getenv('MAX_BROWSERS', 1))
+# The first terms of each platform are never shed
+CORE_TERMS = 2
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def _read_stat(pid):
+    """(ppid, rss bytes) from /proc/<pid>/stat, or None if it's gone"""
+    try:
+        with open(f"/proc/{pid}/stat", 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    # The command name can hold spaces and parens, fields start after the last ')'
+    fields = data[data.rindex(b')') + 2:].split()
+    return int(fields[1]), int(fields[21]) * PAGE_SIZE
+
+
+def process_tree(root_pid):
+    """{pid: rss bytes} for root_pid and all of its descendants"""
+    if not os.path.isdir("/proc"):
+        return {}
+
+    children = {}
+    rss = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        stat = _read_stat(int(name))
+        if stat is None:
+            continue
+        ppid, pid_rss = stat
+        children.setdefault(ppid, []).append(int(name))
+        rss[int(name)] = pid_rss
+
+    tree = {}
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        if pid in tree or pid not in rss:
+            continue
+        tree[pid] = rss[pid]
+        stack.extend(children.get(pid, []))
+    return tree
+
+
+def driver_pid(driver):
+    """chromedriver's pid; Chrome itself runs below it"""
+    service = getattr(driver, 'service', None)
+    process = getattr(service, 'process', None)
+    if process is not None:
+        return process.pid
+    return getattr(driver, 'browser_pid', None)
+
+
+def kill_tree(pid):
+    for child in process_tree(pid):
+        try:
+            os.kill(child, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+class ResourceGovernor:
+    def __init__(self, limit_mb=MEMORY_LIMIT_MB, driver_max_mb=DRIVER_MAX_MB, max_browsers=MAX_BROWSERS):
+        self.limit = limit_mb * 1024 * 1024
+        self.driver_max = driver_max_mb * 1024 * 1024
+        self.browsers = threading.BoundedSemaphore(max_browsers)
+        self.max_browsers = max_browsers
+        self.active_browsers = 0
+        self.lock = threading.Lock()
+        self.deferred = {}  # platform -> terms shed last time, run first next time
+        self.events = deque(maxlen=20)
+        self.stats = {"terms_shed": 0, "drivers_recycled": 0, "browser_waits": 0, "peak_rss_mb": 0}
+
+    def rss(self):
+        total = sum(process_tree(os.getpid()).values())
+        peak = round(total / 1024 / 1024, 1)
+        if peak > self.stats["peak_rss_mb"]:
+            self.stats["peak_rss_mb"] = peak
+        return total
+
+    def pressure(self, rss=None):
+        """'ok', 'high' (over the soft limit) or 'critical' (over the hard limit)"""
+        rss = self.rss() if rss is None else rss
+        if rss >= self.limit * MEMORY_HARD_RATIO:
+            return "critical"
+        if rss >= self.limit * MEMORY_SOFT_RATIO:
+            return "high"
+        return "ok"
+
+    def record(self, message):
+        print(f"  [governor] {message}")
+        self.events.appendleft({"time": datetime.now().strftime("%H:%M:%S"), "message": message})
+
+    @contextmanager
+    def browser(self, platform):
+        """Hold one of the MAX_BROWSERS slots while a driver is alive"""
+        if not self.browsers.acquire(blocking=False):
+            self.stats["browser_waits"] += 1
+            self.record(f"{platform} waiting for a browser slot")
+            self.browsers.acquire()
+        with self.lock:
+            self.active_browsers += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.active_browsers -= 1
+            self.browsers.release()
+
+    def tab_budget(self, tabs):
+        """How many tabs one browser may load at once"""
+        if tabs > 1 and self.pressure() != "ok":
+            return 1
+        return tabs
+
+    def plan_terms(self, platform, terms):
+        """Terms for this scan, last scan's shed terms first"""
+        deferred = [term for term in self.deferred.pop(platform, []) if term in terms]
+        return deferred + [term for term in terms if term not in deferred]
+
+    def admit_term(self, platform, term, priority):
+        """
+        False if the term should be shed for now; it's retried first next scan.
+        priority is the term's place in the platform's own term list.
+        """
+        if priority < CORE_TERMS or self.pressure() == "ok":
+            return True
+        self.deferred.setdefault(platform, []).append(term)
+        self.stats["terms_shed"] += 1
+        self.record(f"Memory high, deferring {platform} '{term}' to the next scan")
+        return False
+
+    def recycle_reason(self, driver):
+        """Why driver should be replaced, or None if it can stay"""
+        pid = driver_pid(driver)
+        if pid is None:
+            return None
+
+        if self.pressure() == "critical":
+            return "worker over hard memory limit"
+        driver_rss = sum(process_tree(pid).values())
+        if driver_rss >= self.driver_max:
+            return f"browser at {driver_rss // 1024 // 1024} MB"
+        return None
+
+    def recycle_if_needed(self, driver, create, platform):
+        """Return driver, or a fresh one if the old one had to be killed"""
+        reason = self.recycle_reason(driver)
+        if reason is None:
+            return driver
+
+        pid = driver_pid(driver)
+        self.record(f"Recycling {platform} driver ({reason})")
+        self.stats["drivers_recycled"] += 1
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        kill_tree(pid)
+        time.sleep(1)
+        return create()
+
+    def summary(self):
+        rss = self.rss()
+        return dict(
+            self.stats,
+            rss_mb=round(rss / 1024 / 1024, 1),
+            limit_mb=round(self.limit / 1024 / 1024),
+            pressure=self.pressure(rss),
+            active_browsers=self.active_browsers,
+            max_browsers=self.max_browsers,
+            deferred={platform: list(terms) for platform, terms in self.deferred.items()},
+            events=list(self.events),
+        )
+
+
+_governor = None
+
+
+def get_governor():
+    global _governor
+    if _governor is None:
+        _governor = ResourceGovernor()
+    return _governor
@@ -0,0 +1,189 @@
+"""
+Listing history: every new listing a scan finds, browsable through /api/listings.
+
+Pages are keyset paginated, newest first, on (created_at, id): a page's
+cursor is the last row it returned and the next page starts strictly
+below it, so page 500 costs the same as page 1 and rows inserted while
+someone pages don't shift what they see. Each filter combination the
+dashboard uses has a composite index ending in (created_at DESC, id DESC),
+so Postgres walks the index in order and stops after limit rows; the
+price range is checked on the rows the index walk visits.
+
+Listings are never updated once written, so a page is identified by the
+ids it holds; that is its ETag.
+"""
+import base64
+import hashlib
+from datetime import datetime
+
+from listing import Platform
+
+LISTINGS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS listings (
+        id SERIAL PRIMARY KEY,
+        title TEXT NOT NULL,
+        price NUMERIC NOT NULL,
+        link TEXT NOT NULL,
+        platform TEXT NOT NULL,
+        created_at TIMESTAMP NOT NULL DEFAULT NOW()
+    );
+    ALTER TABLE listings ADD COLUMN IF NOT EXISTS console_type TEXT;
+    CREATE INDEX IF NOT EXISTS listings_created ON listings (created_at DESC, id DESC);
+    CREATE INDEX IF NOT EXISTS listings_platform_created ON listings (platform, created_at DESC, id DESC);
+    CREATE INDEX IF NOT EXISTS listings_console_created ON listings (console_type, created_at DESC, id DESC);
+    CREATE INDEX IF NOT EXISTS listings_platform_console_created
+        ON listings (platform, console_type, created_at DESC, id DESC);
+"""
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+_schema_ready = False
+
+
+def ensure_listing_tables(conn):
+    """Create the table and indexes once per process"""
+    global _schema_ready
+    if _schema_ready:
+        return
+    cursor = conn.cursor()
+    cursor.execute(LISTINGS_SCHEMA)
+    conn.commit()
+    cursor.close()
+    _schema_ready = True
+
+
+def save_listings(database_url, listings):
+    """Append a scan's new listings to the history; no-op without a database"""
+    if not database_url or not listings:
+        return 0
+
+    import psycopg2
+    from psycopg2.extras import execute_values
+
+    conn = psycopg2.connect(database_url)
+    try:
+        ensure_listing_tables(conn)
+        cursor = conn.cursor()
+        execute_values(cursor, '''
+            INSERT INTO listings (title, price, link, platform, console_type, created_at)
+            VALUES %s
+        ''', [(listing.title, listing.price, listing.link, listing.platform.value, listing.console_type)
+              for listing in listings], template="(%s, %s, %s, %s, %s, NOW())")
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+    return len(listings)
+
+
+def encode_cursor(created_at, listing_id):
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{listing_id}".encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(value):
+    try:
+        created_at, listing_id = base64.urlsafe_b64decode(value.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(created_at), int(listing_id)
+    except (ValueError, UnicodeError):
+        raise ValueError("cursor is not one this API returned")
+
+
+def _timestamp(value, name):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO date or timestamp")
+
+
+def _price(value, name):
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number")
+
+
+def listing_filters(args):
+    """
+    Filters from /api/listings query args:
+    platform, console_type, min_price, max_price, since, until, cursor, limit.
+    Raises ValueError with a message for the client.
+    """
+    filters = {}
+    if args.get('platform'):
+        names = {platform.value.lower(): platform.value for platform in Platform}
+        platform = names.get(args['platform'].lower())
+        if platform is None:
+            raise ValueError(f"platform must be one of {', '.join(names.values())}")
+        filters['platform'] = platform
+    if args.get('console_type'):
+        filters['console_type'] = args['console_type'].lower().strip()
+    for name in ('min_price', 'max_price'):
+        if args.get(name):
+            filters[name] = _price(args[name], name)
+    for name in ('since', 'until'):
+        if args.get(name):
+            filters[name] = _timestamp(args[name], name)
+    if args.get('cursor'):
+        filters['cursor'] = decode_cursor(args['cursor'])
+
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("limit must be a whole number")
+    filters['limit'] = max(1, min(limit, MAX_PAGE_SIZE))
+    return filters
+
+
+def query_listings(conn, filters):
+    """
+    One page of history, newest first.
+    Returns (listings, next cursor or None when this is the last page).
+    """
+    conditions = []
+    params = []
+    for column, key, operator in (
+        ("platform", "platform", "="),
+        ("console_type", "console_type", "="),
+        ("price", "min_price", ">="),
+        ("price", "max_price", "<="),
+        ("created_at", "since", ">="),
+        ("created_at", "until", "<"),
+    ):
+        if key in filters:
+            conditions.append(f"{column} {operator} %s")
+            params.append(filters[key])
+    if 'cursor' in filters:
+        # Row comparison, so the (created_at, id) indexes can seek straight to the cursor
+        conditions.append("(created_at, id) < (%s, %s)")
+        params.extend(filters['cursor'])
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    limit = filters['limit']
+    cursor = conn.cursor()
+    # One extra row says whether there is a next page
+    cursor.execute(f'''
+        SELECT id, title, price, link, platform, console_type, created_at
+        FROM listings {where}
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s
+    ''', params + [limit + 1])
+    rows = cursor.fetchall()
+    cursor.close()
+
+    listings = [
+        {
+            "id": row[0], "title": row[1], "price": float(row[2]), "link": row[3], "platform": row[4],
+            "console_type": row[5], "created_at": row[6].isoformat()
+        }
+        for row in rows[:limit]
+    ]
+    next_cursor = encode_cursor(rows[limit - 1][6], rows[limit - 1][0]) if len(rows) > limit else None
+    return listings, next_cursor
+
+
+def page_etag(listings, next_cursor):
+    """Listings never change once written, so a page is its ids and where it ends"""
+    digest = hashlib.sha1(",".join(str(listing["id"]) for listing in listings).encode('utf-8'))
+    digest.update((next_cursor or "").encode('utf-8'))
+    return f'"{digest.hexdigest()[:20]}"'
@@ -0,0 +1,272 @@
+"""
+On-disk HTTP cache for scraper fetches.
+
+Bodies are stored once per content hash under CACHE_DIR/blobs, and a small
+SQLite index maps each URL (or an explicit cache key) to its blob, expiry
+and last access time. TTLs come from the first matching rule in
+CACHE_TTL_RULES; a TTL of 0 means never cache. Once the blobs outgrow
+CACHE_MAX_BYTES the least recently used entries are evicted. Hits,
+misses, bypasses, stores and evictions are counted in stats and on
+/metrics.
+
+Works for requests (cached_get / cached_post_json) and for Selenium,
+where the caller stores driver.page_source with store_page().
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import requests
+
+from metrics import HTTP_CACHE_EVENTS
+
+CACHE_DIR = os.getenv('HTTP_CACHE_DIR', '.http_cache')
+CACHE_MAX_BYTES = int(os.getenv('HTTP_CACHE_MAX_MB', 200)) * 1024 * 1024
+CACHE_ENABLED = os.getenv('HTTP_CACHE', 'on').lower() != 'off'
+# No longer than the shortest check_interval, so every scheduled scan sees new results;
+# a scan re-run or retried within it reads them from the cache
+SEARCH_TTL = int(os.getenv('HTTP_CACHE_SEARCH_SECONDS', 60))
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+# First match wins
+CACHE_TTL_RULES = [
+    (re.compile(r'^vision:'), 30 * DAY),                               # Vision results per image
+    (re.compile(r'\.(jpe?g|png|webp|gif)(\?|$)', re.I), 7 * DAY),      # Listing images
+    (re.compile(r'/search'), SEARCH_TTL),                              # Search results
+    (re.compile(r'craigslist\.org/.+/d/|/item/'), 6 * HOUR),           # Listing pages
+]
+DEFAULT_TTL = 0
+
+
+def ttl_for(key):
+    for pattern, ttl in CACHE_TTL_RULES:
+        if pattern.search(key):
+            return ttl
+    return DEFAULT_TTL
+
+
+class CachedResponse:
+    """The parts of a requests.Response the scrapers use"""
+
+    def __init__(self, content, status_code=200, from_cache=True):
+        self.content = content
+        self.status_code = status_code
+        self.from_cache = from_cache
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class HTTPCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "evictions": 0,
+                      "bytes_served": 0}
+
+        os.makedirs(os.path.join(directory, "blobs"), exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False)
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                status INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        ''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)')
+        self.db.commit()
+
+    def _count(self, event):
+        # Callers hold self.lock
+        self.stats[event] += 1
+        HTTP_CACHE_EVENTS.inc(event)
+
+    def count_bypass(self):
+        """A fetch that skipped the cache because its TTL is 0"""
+        with self.lock:
+            self._count("bypassed")
+
+    def _blob_path(self, content_hash):
+        return os.path.join(self.directory, "blobs", content_hash[:2], content_hash)
+
+    def get(self, key):
+        """Return a CachedResponse for a fresh entry, or None"""
+        now = time.time()
+        with self.lock:
+            row = self.db.execute(
+                'SELECT content_hash, status, expires_at FROM entries WHERE key = ?', (key,)
+            ).fetchone()
+
+            if row is None or row[2] < now:
+                self._count("misses")
+                return None
+
+            try:
+                with open(self._blob_path(row[0]), 'rb') as f:
+                    content = f.read()
+            except FileNotFoundError:
+                self.db.execute('DELETE FROM entries WHERE key = ?', (key,))
+                self.db.commit()
+                self._count("misses")
+                return None
+
+            self.db.execute('UPDATE entries SET last_access = ? WHERE key = ?', (now, key))
+            self.db.commit()
+            self._count("hits")
+            self.stats["bytes_served"] += len(content)
+
+        return CachedResponse(content, row[1])
+
+    def put(self, key, content, ttl, status=200):
+        if ttl <= 0:
+            return
+
+        content_hash = hashlib.sha256(content).hexdigest()
+        path = self._blob_path(content_hash)
+        now = time.time()
+
+        with self.lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp_path = f"{path}.{os.getpid()}.tmp"
+                with open(temp_path, 'wb') as f:
+                    f.write(content)
+                os.replace(temp_path, path)
+
+            old = self.db.execute('SELECT content_hash FROM entries WHERE key = ?', (key,)).fetchone()
+            self.db.execute('''
+                INSERT OR REPLACE INTO entries (key, content_hash, size, status, expires_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (key, content_hash, len(content), status, now + ttl, now))
+            if old and old[0] != content_hash:
+                self._drop_blob_if_unused(old[0])
+            self.db.commit()
+            self._count("stores")
+
+            self._evict()
+
+    def _drop_blob_if_unused(self, content_hash):
+        in_use = self.db.execute(
+            'SELECT 1 FROM entries WHERE content_hash = ? LIMIT 1', (content_hash,)
+        ).fetchone()
+        if in_use:
+            return False
+        try:
+            os.remove(self._blob_path(content_hash))
+        except FileNotFoundError:
+            pass
+        return True
+
+    def _total_bytes(self):
+        # Identical bodies share one blob, so count each hash once
+        return self.db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT content_hash, size FROM entries)'
+        ).fetchone()[0]
+
+    def _evict(self):
+        total = self._total_bytes()
+        if total <= self.max_bytes:
+            return
+
+        # Expired entries go first, then least recently used
+        now = time.time()
+        rows = self.db.execute(
+            'SELECT key, content_hash, size FROM entries ORDER BY expires_at < ? DESC, last_access ASC', (now,)
+        ).fetchall()
+        target = self.max_bytes * 0.9
+        for key, content_hash, size in rows:
+            if total <= target:
+                break
+            self.db.execute('DELETE FROM entries WHERE key = ?', (key,))
+            if self._drop_blob_if_unused(content_hash):
+                total -= size
+            self._count("evictions")
+        self.db.commit()
+
+    def summary(self):
+        with self.lock:
+            entries, size = self.db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries'
+            ).fetchone()
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return dict(self.stats, entries=entries, bytes_indexed=size,
+                        hit_rate=round(self.stats["hits"] / lookups, 3) if lookups else None)
+
+
+_http_cache = None
+
+
+def get_http_cache():
+    global _http_cache
+    if _http_cache is None:
+        _http_cache = HTTPCache()
+    return _http_cache
+
+
+def cached_get(url, ttl=None, **kwargs):
+    """requests.get through the cache; only 200 responses are stored"""
+    ttl = ttl_for(url) if ttl is None else ttl
+    if not CACHE_ENABLED or ttl <= 0:
+        if CACHE_ENABLED:
+            get_http_cache().count_bypass()
+        return requests.get(url, **kwargs)
+
+    cache = get_http_cache()
+    cached = cache.get(url)
+    if cached is not None:
+        return cached
+
+    response = requests.get(url, **kwargs)
+    if response.status_code == 200:
+        cache.put(url, response.content, ttl)
+    return response
+
+
+def cached_post_json(url, payload, cache_key, ttl=None, **kwargs):
+    """
+    requests.post(json=payload) through the cache under cache_key.
+    The key is explicit so secrets in the URL never end up in the index.
+    """
+    ttl = ttl_for(cache_key) if ttl is None else ttl
+    if not CACHE_ENABLED or ttl <= 0:
+        if CACHE_ENABLED:
+            get_http_cache().count_bypass()
+        return requests.post(url, json=payload, **kwargs)
+
+    cache = get_http_cache()
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    response = requests.post(url, json=payload, **kwargs)
+    if response.status_code == 200:
+        cache.put(cache_key, response.content, ttl)
+    return response
+
+
+def get_cached_page(url):
+    """HTML previously captured from Selenium for this URL, or None"""
+    if not CACHE_ENABLED or ttl_for(url) <= 0:
+        return None
+    cached = get_http_cache().get(url)
+    return cached.text if cached is not None else None
+
+
+def store_page(url, page_source):
+    """Capture driver.page_source so the next visit to url is a local read"""
+    if CACHE_ENABLED:
+        get_http_cache().put(url, page_source.encode('utf-8'), ttl_for(url))
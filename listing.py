@@ -0,0 +1,72 @@
+"""
+The listing record passed through the scan pipeline.
+
+Scrapers turn parsed rows into Listing objects, and filters, dedup,
+alerts, watchlists and the DB writer all read the same fields. A Listing
+has __slots__ instead of a per-item dict of repeated keys. Its platform
+is a Platform member and its console type an interned string, so neither
+is copied per item. key, the "<platform>_<link>" id used for seen-listing
+and watchlist dedup, is computed once when the listing is built.
+
+Console types stay strings rather than an enum because they are the
+user's threshold keys, which can change with the settings.
+"""
+import sys
+from enum import Enum
+
+
+class Platform(str, Enum):
+    CRAIGSLIST = "Craigslist"
+    OFFERUP = "OfferUp"
+    MERCARI = "Mercari"
+
+    def __str__(self):
+        return self.value
+
+
+class Listing:
+    __slots__ = ("title", "price", "link", "platform", "console_type", "threshold", "deal_score",
+                 "key", "duplicates")
+
+    def __init__(self, title, price, link, platform, console_type=None, threshold=None, deal_score=None):
+        self.title = title
+        self.price = price
+        self.link = link
+        self.platform = Platform(platform)
+        self.console_type = sys.intern(console_type) if console_type is not None else None
+        self.threshold = threshold
+        self.deal_score = deal_score
+        self.key = f"{self.platform.value}_{link}"
+        # Cross-posts of the same item, filled in by dedup for alerted listings
+        self.duplicates = ()
+
+    def __repr__(self):
+        return f"Listing({self.platform.value}, {self.title!r}, {self.price})"
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a listing from to_dict() output, e.g. out of the scan checkpoint"""
+        listing = cls(data['title'], data['price'], data['link'], data['platform'],
+                      data.get('console_type'), data.get('threshold'), data.get('deal_score'))
+        listing.duplicates = tuple(
+            cls(duplicate['title'], duplicate['price'], duplicate['link'], duplicate['platform'])
+            for duplicate in data.get('duplicates', ())
+        )
+        return listing
+
+    def to_dict(self):
+        """Plain JSON-ready fields, for webhooks and the API"""
+        return {
+            'title': self.title,
+            'price': self.price,
+            'link': self.link,
+            'platform': self.platform.value,
+            'console_type': self.console_type,
+            'threshold': self.threshold,
+            'deal_score': self.deal_score,
+            'duplicates': [
+                {'title': duplicate.title, 'price': duplicate.price, 'link': duplicate.link,
+                 'platform': duplicate.platform.value}
+                for duplicate in self.duplicates
+            ],
+        }
@@ -0,0 +1,171 @@
+"""
+Prometheus-style metrics for the scan hot paths.
+
+The worker process records histograms and counters while it scans and
+sends a snapshot back as a "metrics" event after every scan; the API
+keeps the latest one and serves it at /metrics in the text exposition
+format. Recording is a bisect and a few adds under a per-metric lock, and
+the per-row hot loops aggregate locally and record once per page, so the
+cost stays out of the way of the scan itself.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Seconds; covers a cached parse up to a slow Selenium page load
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Bytes transferred for one browser page load
+SIZE_BUCKETS = (50_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000, 10_000_000, 25_000_000)
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        # label values -> [count per bucket..., +Inf count, sum]
+        self.series = {}
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *label_values):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def snapshot(self):
+        with self.lock:
+            series = [[list(labels), list(values)] for labels, values in self.series.items()]
+        return {"type": "histogram", "help": self.help, "labels": list(self.labels),
+                "buckets": list(self.buckets), "series": series}
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.series[label_values] = self.series.get(label_values, 0) + amount
+
+    def snapshot(self):
+        with self.lock:
+            series = [[list(labels), value] for labels, value in self.series.items()]
+        return {"type": "counter", "help": self.help, "labels": list(self.labels), "series": series}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        if name not in self.metrics:
+            self.metrics[name] = Histogram(name, help, labels, buckets)
+        return self.metrics[name]
+
+    def counter(self, name, help, labels=()):
+        if name not in self.metrics:
+            self.metrics[name] = Counter(name, help, labels)
+        return self.metrics[name]
+
+    def snapshot(self):
+        """Plain dicts and lists, so it can cross the worker's event queue"""
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+
+registry = MetricsRegistry()
+
+FETCH_SECONDS = registry.histogram(
+    "pixelflip_fetch_seconds", "Time to fetch one search results page", ("platform",))
+PARSE_SECONDS = registry.histogram(
+    "pixelflip_parse_seconds", "Time to parse and filter one results page in the parse pool", ("platform",))
+FILTER_SECONDS = registry.histogram(
+    "pixelflip_filter_stage_seconds", "Time spent in one filter stage for one page or scan", ("stage",))
+DRIVER_STARTUP_SECONDS = registry.histogram(
+    "pixelflip_driver_startup_seconds", "Time to start a Chrome driver", ("driver",))
+VISION_SECONDS = registry.histogram(
+    "pixelflip_vision_seconds", "Google Vision call latency, cache hits included", ("result",))
+ALERT_SEND_SECONDS = registry.histogram(
+    "pixelflip_alert_send_seconds", "Time to deliver one digest to one subscriber", ("channel", "result"))
+PLATFORM_SCAN_SECONDS = registry.histogram(
+    "pixelflip_platform_scan_seconds", "Wall time of one platform within a scan", ("platform",))
+PAGE_LOAD_SECONDS = registry.histogram(
+    "pixelflip_page_load_seconds", "Browser load time of one search page", ("platform", "profile"))
+PAGE_BYTES = registry.histogram(
+    "pixelflip_page_bytes", "Bytes transferred for one search page in the browser", ("platform", "profile"),
+    buckets=SIZE_BUCKETS)
+SCAN_SECONDS = registry.histogram(
+    "pixelflip_scan_seconds", "Wall time of a full scan cycle")
+
+ITEMS = registry.counter(
+    "pixelflip_items_total", "Parsed listings by filter outcome", ("platform", "outcome"))
+MATCHES = registry.counter(
+    "pixelflip_matches_total", "Under-threshold listings by what happened to them", ("platform", "outcome"))
+HTTP_CACHE_EVENTS = registry.counter(
+    "pixelflip_http_cache_events_total", "HTTP cache hits, misses, bypasses, stores and evictions", ("event",))
+ERRORS = registry.counter(
+    "pixelflip_errors_total", "Errors caught in the scan, by platform and exception type", ("platform", "error"))
+
+
+def record_error(platform, error):
+    ERRORS.inc(platform, type(error).__name__)
+
+
+def count_outcomes(platform, outcomes, counter=ITEMS):
+    """Add a {outcome: count} dict built up in a hot loop"""
+    for outcome, count in outcomes.items():
+        if count:
+            counter.inc(platform, outcome, amount=count)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def render_metrics(snapshot):
+    """Prometheus text format for a registry snapshot"""
+    lines = []
+    for name, metric in sorted(snapshot.items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        labels = metric["labels"]
+
+        if metric["type"] == "counter":
+            for values, value in metric["series"]:
+                lines.append(f"{name}{_label_text(labels, values)} {value}")
+            continue
+
+        for values, counts in metric["series"]:
+            cumulative = 0
+            for bound, count in zip(metric["buckets"] + ["+Inf"], counts):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{name}_bucket{_label_text(labels, values, le)} {cumulative}")
+            lines.append(f"{name}_sum{_label_text(labels, values)} {counts[-1]:.6f}")
+            lines.append(f"{name}_count{_label_text(labels, values)} {cumulative}")
+
+    return "\n".join(lines) + "\n"
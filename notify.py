@@ -0,0 +1,183 @@
+"""
+Notification fan-out.
+
+Each subscriber gets the part of a digest that matches its own filters,
+over its own channel: email, a webhook URL (JSON POST) or an ntfy-style
+push topic (plain text POST). Subscribers are read from SUBSCRIBERS_FILE:
+
+    [
+        {"id": "me", "type": "email", "target": "me@example.com"},
+        {"id": "bob", "type": "webhook", "target": "https://example.com/hook",
+         "consoles": ["3ds", "3ds xl"], "max_price": 100},
+        {"id": "phone", "type": "ntfy", "target": "https://ntfy.sh/my-topic",
+         "min_deal_score": 0.5}
+    ]
+
+A subscriber whose id is a watchlist user_id also gets that user's
+watchlist matches; "watchlist_only": true limits it to those.
+
+Without the file there is one email subscriber, EMAIL_ADDRESS, with no
+filters, which is the old single-recipient behaviour.
+"""
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from alerts import EMAIL_ADDRESS, default_transport, render_alert
+from metrics import ALERT_SEND_SECONDS, record_error
+from tracing import start_span
+
+SUBSCRIBERS_FILE = os.getenv('SUBSCRIBERS_FILE', 'subscribers.json')
+NOTIFY_WORKERS = int(os.getenv('NOTIFY_WORKERS', 4))
+NOTIFY_TIMEOUT = 10
+NOTIFY_MAX_RETRIES = 3
+NOTIFY_BACKOFF_SECONDS = 2
+
+
+def load_subscribers(path=SUBSCRIBERS_FILE):
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    if EMAIL_ADDRESS:
+        return [{"id": "default", "type": "email", "target": EMAIL_ADDRESS}]
+    return [{"id": "default", "type": "email", "target": None}]
+
+
+class SubscriberIndex:
+    """
+    Subscribers keyed by console_type, so a digest is matched against
+    everyone in one pass over its listings.
+    """
+
+    def __init__(self, subscribers):
+        self.subscribers = {subscriber["id"]: subscriber for subscriber in subscribers}
+        self.by_console = {}
+        self.any_console = []
+
+        for subscriber in subscribers:
+            # Watchlist users only hear about their own matches
+            if subscriber.get("watchlist_only"):
+                continue
+            consoles = subscriber.get("consoles")
+            if consoles:
+                # "3DS" and "3ds" are one key, or the subscriber would get each listing twice
+                for console_type in {console_type.lower() for console_type in consoles}:
+                    self.by_console.setdefault(console_type, []).append(subscriber)
+            else:
+                self.any_console.append(subscriber)
+
+    def match(self, listings):
+        """Return {subscriber id: [listings]} for every subscriber with a match"""
+        matches = {}
+        for listing in listings:
+            price = listing.price
+            deal_score = listing.deal_score
+
+            for subscriber in self.by_console.get(listing.console_type, []) + self.any_console:
+                max_price = subscriber.get("max_price")
+                if max_price is not None and price > max_price:
+                    continue
+                min_deal_score = subscriber.get("min_deal_score")
+                if min_deal_score and (deal_score is None or deal_score < min_deal_score):
+                    continue
+                matches.setdefault(subscriber["id"], []).append(listing)
+
+        return matches
+
+
+class Notifier:
+    """Delivers a digest to every matching subscriber with bounded concurrency"""
+
+    def __init__(self, subscribers=None, email_transport=None, workers=NOTIFY_WORKERS,
+                 max_retries=NOTIFY_MAX_RETRIES, backoff_seconds=NOTIFY_BACKOFF_SECONDS):
+        self.index = SubscriberIndex(subscribers if subscribers is not None else load_subscribers())
+        self.email_transport = email_transport or default_transport()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="notify")
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.session = requests.Session()
+
+    def notify(self, listings):
+        """Fan a digest out; returns (delivered, failed) subscriber counts"""
+        matches = self.index.match(listings)
+        # Email subscribers whose filters matched the same listings share one render
+        renders = {}
+        futures = []
+        for subscriber_id, matched in matches.items():
+            subscriber = self.index.subscribers[subscriber_id]
+            rendered = None
+            if subscriber.get("type", "email") == "email":
+                digest = tuple(id(listing) for listing in matched)
+                if digest not in renders:
+                    renders[digest] = render_alert(matched)
+                rendered = renders[digest]
+            futures.append(self.executor.submit(self._deliver_with_retry, subscriber, matched, rendered))
+        results = [future.result() for future in futures]
+        delivered = sum(1 for ok in results if ok)
+        return delivered, len(results) - delivered
+
+    def notify_subscriber(self, subscriber_id, listings):
+        """Deliver listings to one subscriber, skipping its filters"""
+        subscriber = self.index.subscribers.get(subscriber_id)
+        if subscriber is None:
+            return 0, 0
+        ok = self.executor.submit(self._deliver_with_retry, subscriber, listings).result()
+        return (1, 0) if ok else (0, 1)
+
+    def _deliver_with_retry(self, subscriber, listings, rendered=None):
+        channel = subscriber.get("type", "email")
+        with start_span("alert", subscriber=subscriber["id"], channel=channel, listings=len(listings)) as span:
+            for attempt in range(self.max_retries + 1):
+                started = time.perf_counter()
+                try:
+                    self._deliver(subscriber, listings, rendered)
+                    ALERT_SEND_SECONDS.observe(time.perf_counter() - started, channel, "ok")
+                    span.set_attribute("attempts", attempt + 1)
+                    return True
+                except Exception as e:
+                    ALERT_SEND_SECONDS.observe(time.perf_counter() - started, channel, "error")
+                    record_error(f"alert_{channel}", e)
+                    if attempt == self.max_retries:
+                        span.record_exception(e)
+                        print(f"Giving up on alert for {subscriber['id']}: {e}")
+                        return False
+                    delay = self.backoff_seconds * (2 ** attempt)
+                    span.add_event("retry", attempt=attempt + 1, error=str(e), delay=delay)
+                    print(f"Alert for {subscriber['id']} failed ({e}), retrying in {delay}s")
+                    time.sleep(delay)
+
+    def _deliver(self, subscriber, listings, rendered=None):
+        """rendered is render_alert(listings), if the caller already has it"""
+        kind = subscriber.get("type", "email")
+
+        if kind == "email":
+            subject, text, html = rendered or render_alert(listings)
+            self.email_transport.send(subscriber["target"], subject, text, html)
+
+        elif kind == "webhook":
+            response = self.session.post(subscriber["target"], json={
+                "subscriber": subscriber["id"],
+                "count": len(listings),
+                "listings": [listing.to_dict() for listing in listings]
+            }, timeout=NOTIFY_TIMEOUT)
+            response.raise_for_status()
+
+        elif kind == "ntfy":
+            best = listings[0]
+            body = "\n".join(f"${listing.price:.2f} {listing.title} ({listing.platform})"
+                             for listing in listings)
+            response = self.session.post(subscriber["target"], data=body.encode('utf-8'), headers={
+                "Title": f"{len(listings)} console deal(s)",
+                "Click": best.link,
+            }, timeout=NOTIFY_TIMEOUT)
+            response.raise_for_status()
+
+        else:
+            raise ValueError(f"Unknown subscriber type: {kind}")
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.email_transport.close()
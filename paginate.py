@@ -0,0 +1,119 @@
+"""
+Scroll-and-harvest pagination for the Selenium platforms.
+
+OfferUp and Mercari load more cards as the page scrolls. harvest_cards()
+scrolls a screen at a time and after each step a small script hands back
+only the cards the page hasn't returned before (it keeps the hrefs it
+has handed out in the page itself), so each step costs the new cards'
+HTML rather than a full page_source. The harvested cards are returned as
+one HTML fragment for the parse pool.
+
+A term stops when it hits STOP_AFTER_SEEN cards in a row that an earlier
+scan of the same term already harvested (results are sorted newest
+first, so the rest is old news), when it has PAGE_ITEM_BUDGET cards, or
+when scrolling stops turning up anything.
+"""
+import os
+import time
+from collections import OrderedDict
+
+from parsing import CARD_SELECTORS, MAX_CARDS_PER_PAGE
+from tracing import current_span, debug_log
+
+PAGINATE_MAX_STEPS = int(os.getenv('PAGINATE_MAX_STEPS', 8))
+SCROLL_PAUSE = float(os.getenv('SCROLL_PAUSE', 1.5))
+STOP_AFTER_SEEN = 3
+# hrefs remembered per (platform, term)
+HISTORY_SIZE = 500
+
+HARVEST_JS = """
+const selectors = arguments[0];
+const seen = window.__pixelflipSeen || (window.__pixelflipSeen = new Set());
+let selector = window.__pixelflipSelector;
+if (!selector) {
+    selector = selectors.find(s => document.querySelector(s));
+    if (!selector) return [[], document.body.scrollHeight];
+    window.__pixelflipSelector = selector;
+}
+const fresh = [];
+for (const card of document.querySelectorAll(selector)) {
+    const href = card.getAttribute('href');
+    if (!href || seen.has(href)) continue;
+    seen.add(href);
+    fresh.push([href, card.outerHTML]);
+}
+return [fresh, document.body.scrollHeight];
+"""
+
+_history = {}
+
+
+def previous_hrefs(platform, term):
+    return _history.get((platform, term), OrderedDict())
+
+
+def remember_hrefs(platform, term, hrefs):
+    history = _history.setdefault((platform, term), OrderedDict())
+    for href in hrefs:
+        history[href] = None
+        history.move_to_end(href)
+    while len(history) > HISTORY_SIZE:
+        history.popitem(last=False)
+
+
+def harvest_cards(driver, platform, term, budget=MAX_CARDS_PER_PAGE, debug=False):
+    """
+    Scroll the loaded search page and collect new cards.
+    Returns {"html", "cards", "steps", "stopped"}; html is a fragment
+    holding just the harvested cards.
+    """
+    known = previous_hrefs(platform, term)
+    harvested = []
+    fragments = []
+    seen_in_a_row = 0
+    last_height = None
+    stopped = "end_of_results"
+
+    step = 0
+    for step in range(1, PAGINATE_MAX_STEPS + 1):
+        fresh, height = driver.execute_script(HARVEST_JS, CARD_SELECTORS[platform])
+
+        for href, html in fresh:
+            if href in known:
+                seen_in_a_row += 1
+                if seen_in_a_row >= STOP_AFTER_SEEN:
+                    stopped = "seen"
+                    break
+                continue
+            seen_in_a_row = 0
+            harvested.append(href)
+            fragments.append(html)
+            if len(harvested) >= budget:
+                stopped = "budget"
+                break
+        else:
+            # Nothing new and the page stopped growing: no more results
+            if not fresh and height == last_height:
+                break
+            last_height = height
+            driver.execute_script("window.scrollBy(0, window.innerHeight);")
+            time.sleep(SCROLL_PAUSE)
+            continue
+        break
+    else:
+        stopped = "max_steps"
+
+    remember_hrefs(platform, term, harvested)
+
+    span = current_span()
+    span.set_attribute("cards", len(harvested))
+    span.set_attribute("scroll_steps", step)
+    span.set_attribute("stopped", stopped)
+    debug_log(debug, f"    [{term}] Harvested {len(harvested)} new {platform} cards in {step} step(s) ({stopped})")
+
+    return {
+        "html": "<div>" + "".join(fragments) + "</div>",
+        "cards": len(harvested),
+        "steps": step,
+        "stopped": stopped,
+    }
@@ -0,0 +1,293 @@
+"""
+Parse stage for fetched pages.
+
+Scrapers only fetch: Craigslist hands over the raw response bytes, OfferUp
+and Mercari hand over driver.page_source. The HTML parsing and filter
+evaluation run in a ProcessPoolExecutor so several pages are parsed at
+once on separate cores. Workers send back compact row tuples, never soup
+objects:
+
+    (title, price, link, console_type, threshold, passed)
+"""
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import nullcontext
+from urllib.parse import urljoin
+
+from metrics import FILTER_SECONDS, PARSE_SECONDS
+from settings import get_filters
+from tracing import NOOP_SPAN, current_context, debug_log, start_span, tracing_enabled
+
+# 0 parses inline in the calling process (handy with debug=True).
+# Each worker is ~35 MB and cpu_count() is the host's on shared instances,
+# so the default stays small; set PARSE_WORKERS to use more.
+PARSE_WORKERS = int(os.getenv('PARSE_WORKERS', min(2, os.cpu_count() or 1)))
+
+# Cards parsed per Selenium page; also what one term may harvest while scrolling
+MAX_CARDS_PER_PAGE = int(os.getenv('PAGE_ITEM_BUDGET', 60))
+
+CARD_SELECTORS = {
+    "OfferUp": [
+        "a[data-testid*='listing']",
+        "div[class*='MuiGrid-root'] a[href*='/item/']",
+        "a[href*='/item/']",
+    ],
+    "Mercari": [
+        "a[href*='/item/']",
+    ],
+}
+
+
+def parse_craigslist_page(content, base_url, debug=False):
+    """Extract (title, price, link) from a Craigslist search results page"""
+    from bs4 import BeautifulSoup
+    from scraper import extract_price
+
+    soup = BeautifulSoup(content, 'html.parser')
+    items = soup.find_all('li', class_='cl-static-search-result')
+
+    debug_log(debug, f"    Found {len(items)} raw items on Craigslist")
+
+    rows = []
+    for item in items:
+        try:
+            title_elem = item.find('div', class_='title')
+            if not title_elem:
+                title_elem = item.get('title')
+                title = title_elem if title_elem else None
+            else:
+                title = title_elem.text.strip()
+
+            if not title:
+                continue
+
+            link_elem = item.find('a')
+            link = link_elem['href'] if link_elem else None
+
+            if link and not link.startswith('http'):
+                link = base_url + link
+
+            price_elem = item.find('div', class_='price')
+            price_text = price_elem.text.strip() if price_elem else None
+            price = extract_price(price_text)
+
+            if len(rows) < 3:
+                debug_log(debug, f"      - {title[:50]}... | Price: {price}")
+
+            rows.append((title, price, link))
+
+        except Exception as e:
+            debug_log(debug, f"      Error parsing item: {e}")
+            continue
+
+    return rows
+
+
+def parse_card_page(page_source, base_url, platform, debug=False):
+    """Extract (title, price, link) from item cards in a Selenium page source"""
+    from bs4 import BeautifulSoup
+    from scraper import extract_price
+
+    soup = BeautifulSoup(page_source, 'html.parser')
+
+    cards = []
+    for selector in CARD_SELECTORS[platform]:
+        cards = soup.select(selector)
+        if cards:
+            debug_log(debug, f"      Found {len(cards)} items with selector: {selector}")
+            break
+
+    debug_log(debug, f"    Found {len(cards)} raw items on {platform}")
+
+    rows = []
+    for card in cards[:MAX_CARDS_PER_PAGE]:
+        try:
+            href = card.get('href')
+            link = urljoin(base_url, href) if href else None
+
+            text = card.get_text("\n", strip=True)
+            title = card.get('aria-label') or text
+
+            price_elem = card.select_one("[class*='price']")
+            price_text = price_elem.get_text(" ", strip=True) if price_elem else text
+            price = extract_price(price_text)
+
+            if len(rows) < 3:
+                debug_log(debug, f"      - {title[:50]}... | Price: {price}")
+
+            rows.append((title, price, link))
+
+        except Exception:
+            continue
+
+    return rows
+
+
+def evaluate_rows(rows, debug=False, timings=None, filters=None):
+    """
+    Run the console/exclusion filters over parsed rows.
+    passed only covers those filters, the price threshold is compared
+    later so every real console price can feed the price index.
+    With a timings dict, the seconds spent in each filter are added to it.
+    filters is a settings FilterBundle, the current one if not given.
+    """
+    from scraper import check_price_threshold, is_likely_console, is_excluded_listing
+
+    filters = filters or get_filters()
+    strictness = filters.strictness
+
+    clock = time.perf_counter
+    threshold_seconds = console_seconds = excluded_seconds = 0.0
+
+    # Per-item spans only when tracing, the loop stays lean otherwise
+    tracing = tracing_enabled()
+
+    evaluated = []
+    for title, price, link in rows:
+        console_type = threshold = None
+        passed = False
+
+        with start_span("filter_item", title=title, price=price) if tracing else nullcontext(NOOP_SPAN) as span:
+            if price and link and title:
+                started = clock()
+                _, console_type, threshold = check_price_threshold(title, price, filters)
+                checked = clock()
+                threshold_seconds += checked - started
+
+                if console_type is not None:
+                    likely = is_likely_console(title, price, debug=debug, strictness=strictness)
+                    started = clock()
+                    console_seconds += started - checked
+                    if likely:
+                        passed = not is_excluded_listing(title, price, console_type, debug=debug)
+                        excluded_seconds += clock() - started
+
+            if tracing:
+                span.set_attribute("console_type", console_type)
+                span.set_attribute("passed", passed)
+
+        evaluated.append((title, price, link, console_type, threshold, passed))
+
+    if timings is not None:
+        timings["price_threshold"] = timings.get("price_threshold", 0.0) + threshold_seconds
+        timings["likely_console"] = timings.get("likely_console", 0.0) + console_seconds
+        timings["excluded"] = timings.get("excluded", 0.0) + excluded_seconds
+
+    return evaluated
+
+
+def parse_page(platform, content, base_url, debug=False, trace_context=None, filters=None):
+    """Pool task: parse one page and filter its rows with the given FilterBundle"""
+    started = time.perf_counter()
+
+    with start_span("parse_page", parent=trace_context, platform=platform) as span:
+        if platform == "Craigslist":
+            rows = parse_craigslist_page(content, base_url, debug=debug)
+        else:
+            rows = parse_card_page(content, base_url, platform, debug=debug)
+
+        timings = {"html_parse": time.perf_counter() - started}
+        rows = evaluate_rows(rows, debug=debug, timings=timings, filters=filters)
+        span.set_attribute("rows", len(rows))
+
+    return os.getpid(), time.perf_counter() - started, rows, timings
+
+
+class ParsePool:
+    """
+    Process pool for the parse stage, with queue depth and per-worker
+    timings for the status page.
+    """
+
+    def __init__(self, workers=PARSE_WORKERS):
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+        self.lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.worker_stats = {}
+
+    def submit(self, platform, content, base_url, debug=False):
+        """Queue a page for parsing; the future resolves to a list of rows"""
+        with self.lock:
+            self.submitted += 1
+
+        # The page's span lives in the pool process, under the caller's span
+        trace_context = current_context()
+        # Settings changed mid-scan apply from this page on
+        filters = get_filters()
+        if self.executor is None:
+            task = Future()
+            try:
+                task.set_result(parse_page(platform, content, base_url, debug, trace_context, filters))
+            except Exception as e:
+                task.set_exception(e)
+        else:
+            task = self.executor.submit(parse_page, platform, content, base_url, debug, trace_context, filters)
+
+        rows = Future()
+        task.add_done_callback(lambda done: self._record(done, rows, platform))
+        return rows
+
+    def _record(self, task, rows, platform):
+        try:
+            pid, elapsed, parsed, timings = task.result()
+        except Exception as e:
+            with self.lock:
+                self.completed += 1
+                self.failed += 1
+            rows.set_exception(e)
+            return
+
+        with self.lock:
+            self.completed += 1
+            stats = self.worker_stats.setdefault(pid, {"pages": 0, "rows": 0, "seconds": 0.0})
+            stats["pages"] += 1
+            stats["rows"] += len(parsed)
+            stats["seconds"] += elapsed
+
+        PARSE_SECONDS.observe(elapsed, platform)
+        for stage, seconds in timings.items():
+            FILTER_SECONDS.observe(seconds, stage)
+        rows.set_result(parsed)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "workers": self.workers,
+                "queue_depth": self.submitted - self.completed,
+                "pages_parsed": self.completed,
+                "failed": self.failed,
+                "per_worker": {
+                    str(pid): {
+                        "pages": stats["pages"],
+                        "rows": stats["rows"],
+                        "avg_ms": round(stats["seconds"] * 1000 / stats["pages"], 2)
+                    }
+                    for pid, stats in self.worker_stats.items()
+                }
+            }
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_parse_pool = None
+
+
+def get_parse_pool():
+    global _parse_pool
+    if _parse_pool is None:
+        _parse_pool = ParsePool()
+    return _parse_pool
+
+
+def shutdown_parse_pool():
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown()
+        _parse_pool = None
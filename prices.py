@@ -0,0 +1,202 @@
+"""
+Rolling price statistics per console_type.
+
+Every scanned listing that looks like a real console feeds the index, not
+just the ones under threshold. Each console_type keeps a window of recent
+prices in a sorted list, a cached summary (median and percentiles) that is
+refreshed on every insert, and a P-squared streaming median over all time.
+Reading the summary is a dict lookup; a deal score is one bisect.
+
+A listing counts once however many scans it stays up for: the index
+remembers the keys it has observed, so long-lived (often overpriced)
+listings don't crowd the window.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict, deque
+
+from sortedcontainers import SortedList
+
+from checkpoint import write_atomically
+
+PRICE_HISTORY_FILE = "price_history.json"
+
+# Recent prices kept per console_type
+PRICE_WINDOW = int(os.getenv('PRICE_WINDOW', 500))
+
+# No deal score until a console_type has this many prices
+MIN_SAMPLES = 5
+
+# Listing keys remembered as already observed, most recently seen kept
+OBSERVED_KEYS = int(os.getenv('PRICE_OBSERVED_KEYS', 20000))
+
+
+class P2Quantile:
+    """P-squared streaming estimate of one quantile (Jain & Chlamtac)"""
+
+    def __init__(self, quantile=0.5):
+        self.p = quantile
+        self.initial = []
+        self.heights = None
+        self.positions = None
+        self.desired = None
+        self.increments = (0, quantile / 2, quantile, (1 + quantile) / 2, 1)
+
+    def add(self, x):
+        if self.heights is None:
+            self.initial.append(x)
+            if len(self.initial) == 5:
+                self.heights = sorted(self.initial)
+                self.positions = [0, 1, 2, 3, 4]
+                p = self.p
+                self.desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+            return
+
+        q, n = self.heights, self.positions
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= x < q[i + 1])
+
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                candidate = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if not q[i - 1] < candidate < q[i + 1]:
+                    candidate = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = candidate
+                n[i] += d
+
+    def value(self):
+        if self.heights is not None:
+            return self.heights[2]
+        if not self.initial:
+            return None
+        ordered = sorted(self.initial)
+        return ordered[int(self.p * (len(ordered) - 1))]
+
+
+class ConsolePrices:
+    """Price window and summary for one console_type"""
+
+    def __init__(self, window=PRICE_WINDOW):
+        self.recent = deque()
+        self.sorted = SortedList()
+        self.window = window
+        self.lifetime_median = P2Quantile(0.5)
+        self.count = 0
+        self.summary = {}
+
+    def add(self, price):
+        self.recent.append(price)
+        self.sorted.add(price)
+        if len(self.recent) > self.window:
+            self.sorted.remove(self.recent.popleft())
+
+        self.lifetime_median.add(price)
+        self.count += 1
+        self.summary = self._summarize()
+
+    def _percentile(self, p):
+        return self.sorted[int(p * (len(self.sorted) - 1))]
+
+    def _summarize(self):
+        return {
+            "samples": len(self.sorted),
+            "seen": self.count,
+            "min": self.sorted[0],
+            "p10": self._percentile(0.10),
+            "p25": self._percentile(0.25),
+            "median": self._percentile(0.50),
+            "p75": self._percentile(0.75),
+            "lifetime_median": round(self.lifetime_median.value(), 2),
+        }
+
+    def deal_score(self, price):
+        """Share of recent listings priced above this one (1.0 = cheapest seen)"""
+        if len(self.sorted) < MIN_SAMPLES:
+            return None
+        return round(1 - self.sorted.bisect_left(price) / len(self.sorted), 2)
+
+
+class PriceIndex:
+    """Per console_type price statistics, fed by every scan"""
+
+    def __init__(self):
+        self.consoles = {}
+        self.observed = OrderedDict()  # listing key -> None
+        self.lock = threading.Lock()
+
+    def observe(self, console_type, price, key=None):
+        """Add a price; with a listing key, only the first time that listing is seen"""
+        if not console_type or not price:
+            return
+        with self.lock:
+            if key is not None:
+                if key in self.observed:
+                    self.observed.move_to_end(key)
+                    return
+                self.observed[key] = None
+                if len(self.observed) > OBSERVED_KEYS:
+                    self.observed.popitem(last=False)
+            prices = self.consoles.get(console_type)
+            if prices is None:
+                prices = self.consoles[console_type] = ConsolePrices()
+            prices.add(price)
+
+    def stats(self, console_type):
+        prices = self.consoles.get(console_type)
+        return prices.summary if prices else None
+
+    def deal_score(self, console_type, price):
+        prices = self.consoles.get(console_type)
+        return prices.deal_score(price) if prices else None
+
+    def summary(self):
+        return {console_type: prices.summary for console_type, prices in self.consoles.items()}
+
+    def save(self, path=PRICE_HISTORY_FILE):
+        with self.lock:
+            data = {
+                "consoles": {console_type: list(prices.recent) for console_type, prices in self.consoles.items()},
+                "observed": list(self.observed),
+            }
+        write_atomically(path, data)
+
+    def load(self, path=PRICE_HISTORY_FILE):
+        if not os.path.exists(path):
+            return
+        with open(path, 'r') as f:
+            data = json.load(f)
+        # Files from before observed keys were saved are just the price windows
+        consoles = data["consoles"] if "observed" in data else data
+        for console_type, recent in consoles.items():
+            for price in recent:
+                self.observe(console_type, price)
+        for key in data.get("observed", ()):
+            self.observed[key] = None
+
+
+_price_index = None
+
+
+def get_price_index():
+    global _price_index
+    if _price_index is None:
+        _price_index = PriceIndex()
+        _price_index.load()
+    return _price_index
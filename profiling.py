@@ -0,0 +1,131 @@
+"""
+On-demand profiling of scan cycles.
+
+Arm it with POST /api/profile {"scans": N}; the next N scans run with a
+ScanProfiler that splits the scan into sections (one per platform, plus
+the post-processing). Each section produces two files under PROFILE_DIR:
+
+    <stamp>_job<id>_<section>.pstats     cProfile of the scan thread
+    <stamp>_job<id>_<section>.collapsed  sampled stacks of every thread
+
+The .collapsed files are "frame;frame;frame count" lines, ready for
+flamegraph.pl or speedscope. The sampler is what sees the Craigslist
+region threads and the alert/notify threads; cProfile only sees the
+thread that runs the scan. Parse pool processes are not profiled, their
+timings are in /metrics.
+"""
+import cProfile
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', 0.005))
+# Old profiles are pruned past this many files
+PROFILE_KEEP_FILES = 60
+
+
+class StackSampler:
+    """Samples every thread's stack on a timer into collapsed-stack counts"""
+
+    def __init__(self, interval=PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                frames.append(names.get(thread_id, str(thread_id)))
+                key = ";".join(reversed(frames))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+
+
+class ScanProfiler:
+    """Profiles one scan, section by section"""
+
+    def __init__(self, job_id, directory=PROFILE_DIR):
+        self.job_id = job_id
+        self.directory = directory
+        self.stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.files = []
+        os.makedirs(directory, exist_ok=True)
+
+    @contextmanager
+    def section(self, name):
+        profiler = cProfile.Profile()
+        sampler = StackSampler()
+        started = time.perf_counter()
+        sampler.start()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            sampler.stop()
+            self._save(name, profiler, sampler, time.perf_counter() - started)
+
+    def _save(self, name, profiler, sampler, elapsed):
+        base = os.path.join(self.directory, f"{self.stamp}_job{self.job_id}_{name.lower()}")
+        profiler.dump_stats(f"{base}.pstats")
+        sampler.write(f"{base}.collapsed")
+        self.files.append({
+            "section": name,
+            "seconds": round(elapsed, 3),
+            "samples": sampler.samples,
+            "pstats": os.path.basename(f"{base}.pstats"),
+            "collapsed": os.path.basename(f"{base}.collapsed"),
+        })
+
+
+def section(profiler, name):
+    """profiler.section(name), or a no-op when the scan isn't being profiled"""
+    return profiler.section(name) if profiler is not None else nullcontext()
+
+
+def list_profiles(directory=PROFILE_DIR):
+    """Profile files, newest first"""
+    if not os.path.isdir(directory):
+        return []
+    files = []
+    for name in os.listdir(directory):
+        if name.endswith(('.pstats', '.collapsed')):
+            path = os.path.join(directory, name)
+            files.append({"name": name, "size": os.path.getsize(path), "modified": os.path.getmtime(path)})
+    files.sort(key=lambda entry: entry["modified"], reverse=True)
+    return files
+
+
+def prune_profiles(directory=PROFILE_DIR, keep=PROFILE_KEEP_FILES):
+    for entry in list_profiles(directory)[keep:]:
+        try:
+            os.remove(os.path.join(directory, entry["name"]))
+        except FileNotFoundError:
+            pass
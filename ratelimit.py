@@ -0,0 +1,205 @@
+"""
+Per-host rate limiting and per-platform circuit breakers.
+
+Every page fetch first takes a token from its host's bucket. A bucket
+refills at the host's rate from HOST_RATES; a 429/403/503 or a CAPTCHA
+halves that rate (and honours Retry-After), and each clean response
+wins back a little of it, so we slow down as soon as a site pushes back
+and creep back up once it stops.
+
+Repeated trouble on one platform trips its circuit breaker: the platform
+is skipped for a cooldown that doubles on every trip, then gets a single
+trial term (half-open) before it is let back in. The other platforms
+keep scanning at full speed meanwhile.
+"""
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+# Requests per second once a host is behaving, and how many can go back to back
+HOST_RATES = {
+    "craigslist.org": (0.5, 1),
+    "offerup.com": (0.1, 1),
+    "mercari.com": (0.1, 1),
+}
+DEFAULT_RATE = (0.5, 1)
+MIN_RATE_FACTOR = 1 / 16       # Never slow below 1/16th of the base rate
+RECOVERY_STEP = 0.1            # Share of the base rate won back per clean response
+
+BLOCKED_STATUS_CODES = {403, 429, 503}
+
+BREAKER_FAILURES = int(os.getenv('BREAKER_FAILURES', 3))
+BREAKER_COOLDOWN = int(os.getenv('BREAKER_COOLDOWN', 300))
+BREAKER_MAX_COOLDOWN = 3600
+
+
+def host_key(url):
+    """craigslist subdomains share one budget"""
+    host = urlparse(url).netloc.lower()
+    for known in HOST_RATES:
+        if host == known or host.endswith("." + known):
+            return known
+    return host
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Block until a request may go out; returns the seconds waited"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(delay)
+            waited += delay
+
+    def try_acquire(self):
+        """Take a token if one is free right now, without waiting"""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now >= self.blocked_until and self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def penalize(self, retry_after=None):
+        with self.lock:
+            self.rate = max(self.base_rate * MIN_RATE_FACTOR, self.rate / 2)
+            self.tokens = 0
+            pause = retry_after if retry_after is not None else 1 / self.rate
+            self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+
+    def reward(self):
+        with self.lock:
+            self.rate = min(self.base_rate, self.rate + self.base_rate * RECOVERY_STEP)
+
+
+class RateLimiter:
+    def __init__(self, rates=HOST_RATES):
+        self.rates = rates
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    def bucket(self, url):
+        key = host_key(url)
+        with self.lock:
+            if key not in self.buckets:
+                self.buckets[key] = TokenBucket(*self.rates.get(key, DEFAULT_RATE))
+            return self.buckets[key]
+
+    def acquire(self, url):
+        return self.bucket(url).acquire()
+
+    def try_acquire(self, url):
+        return self.bucket(url).try_acquire()
+
+    def penalize(self, url, retry_after=None):
+        self.bucket(url).penalize(retry_after)
+
+    def reward(self, url):
+        self.bucket(url).reward()
+
+    def summary(self):
+        with self.lock:
+            return {
+                host: {"rate": round(bucket.rate, 3), "base_rate": bucket.base_rate,
+                       "blocked_for": round(max(0.0, bucket.blocked_until - time.monotonic()), 1)}
+                for host, bucket in self.buckets.items()
+            }
+
+
+class CircuitBreaker:
+    """closed -> open after BREAKER_FAILURES failures in a row -> half_open after the cooldown"""
+
+    def __init__(self, failures=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN):
+        self.max_failures = failures
+        self.base_cooldown = cooldown
+        self.lock = threading.Lock()
+        self.platforms = {}
+
+    def _state(self, platform):
+        return self.platforms.setdefault(platform, {
+            "state": "closed", "failures": 0, "trips": 0, "opened_at": None,
+            "cooldown": self.base_cooldown, "last_error": None,
+        })
+
+    def allow(self, platform):
+        """Whether platform may be scanned right now"""
+        with self.lock:
+            state = self._state(platform)
+            if state["state"] == "open" and time.time() - state["opened_at"] >= state["cooldown"]:
+                state["state"] = "half_open"
+            return state["state"] != "open"
+
+    def retry_in(self, platform):
+        with self.lock:
+            state = self._state(platform)
+            if state["state"] != "open":
+                return 0
+            return max(0, int(state["opened_at"] + state["cooldown"] - time.time()))
+
+    def record_success(self, platform):
+        with self.lock:
+            state = self._state(platform)
+            if state["state"] == "half_open":
+                print(f"  [breaker] {platform} recovered, closing circuit")
+            state.update(state="closed", failures=0, cooldown=self.base_cooldown)
+
+    def record_failure(self, platform, reason):
+        with self.lock:
+            state = self._state(platform)
+            state["failures"] += 1
+            state["last_error"] = reason
+            # A failed trial re-opens at once, for twice as long
+            if state["state"] == "half_open":
+                state["cooldown"] = min(state["cooldown"] * 2, BREAKER_MAX_COOLDOWN)
+            elif state["failures"] < self.max_failures or state["state"] == "open":
+                return
+            state.update(state="open", opened_at=time.time())
+            state["trips"] += 1
+            print(f"  [breaker] {platform} tripped ({reason}), skipping it for {state['cooldown']}s")
+
+    def summary(self):
+        with self.lock:
+            return {
+                platform: dict(state, retry_in=max(0, int(state["opened_at"] + state["cooldown"] - time.time()))
+                               if state["state"] == "open" else 0)
+                for platform, state in self.platforms.items()
+            }
+
+
+_rate_limiter = None
+_circuit_breaker = None
+
+
+def get_rate_limiter():
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter()
+    return _rate_limiter
+
+
+def get_circuit_breaker():
+    global _circuit_breaker
+    if _circuit_breaker is None:
+        _circuit_breaker = CircuitBreaker()
+    return _circuit_breaker
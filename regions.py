@@ -0,0 +1,104 @@
+"""
+Scan regions.
+
+A region is one Craigslist subdomain searched around one zip code:
+
+    {"craigslist": "stockton", "zip_code": "95212", "distance": 25}
+
+Regions come from settings["regions"], or the SCAN_REGIONS environment
+variable as a JSON list. Without either, one region is built from the
+zip_code/distance settings, so a single-area setup behaves as before.
+"""
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+DEFAULT_CRAIGSLIST_SITE = os.getenv('CRAIGSLIST_SITE', 'stockton')
+DEFAULT_DISTANCE = 25
+
+# How many requests may be in flight to the same host at once
+HOST_CONCURRENCY = int(os.getenv('HOST_CONCURRENCY', 1))
+
+# How many regions are fetched side by side
+REGION_WORKERS = int(os.getenv('REGION_WORKERS', 3))
+
+
+def load_regions(settings, default_zip):
+    """Return the list of regions to scan for these settings"""
+    regions = settings.get("regions")
+
+    if not regions and os.getenv('SCAN_REGIONS'):
+        regions = json.loads(os.getenv('SCAN_REGIONS'))
+
+    if not regions:
+        regions = [{
+            "craigslist": DEFAULT_CRAIGSLIST_SITE,
+            "zip_code": settings.get("zip_code") or default_zip,
+            "distance": settings.get("distance", DEFAULT_DISTANCE),
+        }]
+
+    normalized = []
+    seen = set()
+    for region in regions:
+        site = (region.get("craigslist") or DEFAULT_CRAIGSLIST_SITE).strip().lower()
+        zip_code = str(region.get("zip_code") or default_zip).strip()
+        distance = int(region.get("distance") or DEFAULT_DISTANCE)
+
+        # The same area listed twice would just fetch the same pages twice
+        if (site, zip_code, distance) in seen:
+            continue
+        seen.add((site, zip_code, distance))
+
+        normalized.append({"craigslist": site, "zip_code": zip_code, "distance": distance})
+
+    return normalized
+
+
+class HostLimiter:
+    """Caps concurrent requests per host across all region threads"""
+
+    def __init__(self, limit=HOST_CONCURRENCY):
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.semaphores = {}
+
+    @contextmanager
+    def slot(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            semaphore = self.semaphores.setdefault(host, threading.BoundedSemaphore(self.limit))
+        with semaphore:
+            yield
+
+
+def normalize_title(title):
+    return re.sub(r'[^a-z0-9]+', ' ', title.lower()).strip()
+
+
+def merge_region_rows(row_batches):
+    """
+    Merge parsed rows from overlapping regions, dropping duplicates.
+    The same post shows up under several subdomains with the same link,
+    and reposts in neighbouring cities carry the same title and price.
+    """
+    merged = []
+    seen_links = set()
+    seen_posts = set()
+
+    for rows in row_batches:
+        for row in rows:
+            title, price, link = row[0], row[1], row[2]
+            post_key = (normalize_title(title), price) if title else None
+
+            if link in seen_links or (post_key and post_key in seen_posts):
+                continue
+
+            seen_links.add(link)
+            if post_key:
+                seen_posts.add(post_key)
+            merged.append(row)
+
+    return merged
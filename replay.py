@@ -0,0 +1,58 @@
+"""
+Record/replay of fetched pages.
+
+SCRAPER_REPLAY=record saves every page the scrapers fetch (Craigslist
+response bodies, OfferUp/Mercari page sources) under FIXTURE_DIR, one file
+per platform and search term. SCRAPER_REPLAY=replay serves those files
+instead of touching the network or starting Chrome, so scans and
+benchmarks can run offline and give repeatable numbers.
+"""
+import os
+import re
+
+FIXTURE_DIR = os.getenv('FIXTURE_DIR', 'fixtures')
+
+
+def replay_mode():
+    """'record', 'replay' or '' (off); read each call so it can be switched at runtime"""
+    return os.getenv('SCRAPER_REPLAY', '').lower()
+
+
+def is_replaying():
+    return replay_mode() == 'replay'
+
+
+def is_recording():
+    return replay_mode() == 'record'
+
+
+def fixture_path(platform, term, variant=None):
+    name = term if not variant else f"{variant}_{term}"
+    slug = re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-')
+    return os.path.join(os.getenv('FIXTURE_DIR', FIXTURE_DIR), platform.lower(), f"{slug}.html")
+
+
+def region_variant(region):
+    """Craigslist pages differ per region, so they are recorded per region"""
+    return f"{region['craigslist']}-{region['zip_code']}-{region['distance']}"
+
+
+def record_page(platform, term, content, variant=None):
+    """Save a fetched page when recording; bytes or str"""
+    if not is_recording():
+        return
+    path = fixture_path(platform, term, variant)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+def load_page(platform, term, variant=None):
+    """Recorded page bytes, or None if nothing was recorded for this term"""
+    path = fixture_path(platform, term, variant)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return f.read()
@@ -1,25 +1,41 @@
 import time
 import json
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import contextvars
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 import re
 import os
-import platform
-import requests
 from dotenv import load_dotenv
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
-import undetected_chromedriver as uc
-import psycopg2
+# Selenium, undetected_chromedriver, BeautifulSoup and psycopg2 are imported
+# where they are used, so a Craigslist-only scan never loads the browser stack
+
+from alerts import get_alert_dispatcher
+from tracing import debug_log, start_span
+from metrics import (
+    DRIVER_STARTUP_SECONDS, FETCH_SECONDS, FILTER_SECONDS, MATCHES, VISION_SECONDS, count_outcomes, record_error
+)
+from http_cache import cached_get, cached_post_json, get_cached_page, store_page
+from parsing import get_parse_pool
+from prices import get_price_index
+from governor import get_governor
+from ratelimit import BLOCKED_STATUS_CODES, get_circuit_breaker, get_rate_limiter
+from captcha import captcha_present, get_captcha_desk, wait_for_captcha_solve
+from paginate import harvest_cards
+from tabs import TabPool
+from browsing import apply_lean_browsing, record_page_load
+from listing import Listing, Platform
+from settings import get_filters
+from checkpoint import get_journal, write_atomically
+from history import save_listings
+from replay import is_replaying, load_page, record_page, region_variant
+from regions import (
+    DEFAULT_CRAIGSLIST_SITE,
+    DEFAULT_DISTANCE,
+    REGION_WORKERS,
+    HostLimiter,
+    merge_region_rows
+)
 
 load_dotenv()
 
@@ -29,36 +45,6 @@ EMAIL_ADDRESS = os.getenv('EMAIL_ADDRESS')
 GOOGLE_VISION_API_KEY = os.getenv('GOOGLE_VISION_API_KEY')
 ZIP_CODE = os.getenv('ZIP_CODE', '95212')
 
-PRICE_THRESHOLDS = {
-    "game boy": 150,
-    "gameboy": 50,
-    "game boy color": 40,
-    "gameboy color": 40,
-    "gbc": 50,
-    "game boy advance": 60,
-    "gameboy advance": 60,
-    "gba": 60,
-    "game boy advance sp": 90,
-    "gameboy advance sp": 90,
-    "gba sp": 90,
-    "nintendo ds": 35,
-    "ds lite": 35,
-    "3ds": 100,
-    "3ds xl": 120,
-    "new 3ds": 120,
-    "new 3ds xl": 120,
-    "2ds": 100,
-    "2ds xl": 160,
-    "nes": 60,
-    "snes": 70,
-    "super nintendo": 60,
-    "n64": 40,
-    "nintendo 64": 40,
-    "gamecube": 50,
-    "game cube": 50,
-    "wii": 50,
-}
-
 EXCLUSION_KEYWORDS = {
     "general": [
         "shell only",
@@ -105,33 +91,34 @@ MINIMUM_PRICES = {
     "2ds xl": 30,
 }
 
+CRAIGSLIST_SEARCH_TERMS = ["gameboy", "game boy", "nintendo ds", "3ds", "2ds", "retro console", "nes", "snes",
+                           "n64", "gamecube"]
+OFFERUP_SEARCH_TERMS = ["gameboy", "nintendo ds", "3ds", "retro console"]
+MERCARI_SEARCH_TERMS = ["gameboy", "nintendo ds", "3ds", "retro console"]
+
 SEEN_LISTINGS_FILE = "seen_listings.json"
 
 
 def save_listing(listing):
-    conn = psycopg2.connect(DATABASE_URL)
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        INSERT INTO listings (title, price, link, platform, created_at)
-        VALUES (%s, %s, %s, %s, NOW())
-    ''', (listing['title'], listing['price'], listing['link'], listing['platform']))
-
-    conn.commit()
-    cursor.close()
-    conn.close()
-    
-    
+    save_listings(DATABASE_URL, [listing])
+
+
 def load_seen_listings():
     if os.path.exists(SEEN_LISTINGS_FILE):
         with open(SEEN_LISTINGS_FILE, 'r') as f:
-            return json.load(f)
+            seen_listings = json.load(f)
+        # OfferUp listings used to be saved under the Craigslist label
+        return [
+            "OfferUp_" + listing_id[len("Craigslist_"):]
+            if listing_id.startswith("Craigslist_https://offerup.com") else listing_id
+            for listing_id in seen_listings
+        ]
     return []
 
 
 def save_seen_listings(seen_listings):
-    with open(SEEN_LISTINGS_FILE, 'w') as f:
-        json.dump(seen_listings, f)
+    # The scan checkpoint drops its seen keys once this is saved, so never leave half a file
+    write_atomically(SEEN_LISTINGS_FILE, seen_listings)
 
 
 def extract_price(price_text):
@@ -146,18 +133,17 @@ def extract_price(price_text):
     return None
 
 
-def check_price_threshold(title, price):
-    title_lower = title.lower()
-    for console, threshold in sorted(PRICE_THRESHOLDS.items(), key=lambda x: len(x[0]), reverse=True):
-        if console in title_lower:
-            if price <= threshold:
-                return True, console, threshold
-            else:
-                return False, console, threshold
-    return False, None, None
+def check_price_threshold(title, price, filters=None):
+    """Thresholds come from the settings' FilterBundle, the current one unless given"""
+    filters = filters or get_filters()
+    console, threshold = filters.price_threshold(title.lower())
+    if console is None:
+        return False, None, None
+    return price <= threshold, console, threshold
 
 
-def is_likely_console(title, price, debug=False):
+def is_likely_console(title, price, debug=False, strictness=2):
+    """strictness 1 skips the low-price heuristics, 3 also drops ambiguous titles"""
     title_lower = title.lower()
 
     exclude_keywords = [
@@ -172,8 +158,7 @@ def is_likely_console(title, price, debug=False):
 
     for keyword in exclude_keywords:
         if keyword in title_lower:
-            if debug:
-                print(f"          Filtered: Contains '{keyword}' (likely a game/accessory)")
+            debug_log(debug, f"          Filtered: Contains '{keyword}' (likely a game/accessory)")
             return False
 
     inclusion_keywords = [
@@ -183,24 +168,28 @@ def is_likely_console(title, price, debug=False):
 
     for keyword in inclusion_keywords:
         if keyword in title_lower:
-            if debug:
-                print(f"          Confirmed: Contains '{keyword}' (definitely a console)")
+            debug_log(debug, f"          Confirmed: Contains '{keyword}' (definitely a console)")
             return True
 
+    if strictness <= 1:
+        debug_log(debug, f"          Lenient - including")
+        return True
+
     if any(x in title_lower for x in ["game boy", "gameboy", "gba", "gbc"]):
         if price < 25 and "sp" not in title_lower:
-            if debug:
-                print(f"          Filtered: Price ${price} too low for Game Boy console (likely a game)")
+            debug_log(debug, f"          Filtered: Price ${price} too low for Game Boy console (likely a game)")
             return False
 
     if any(x in title_lower for x in ["ds", "3ds", "2ds"]):
         if price < 20:
-            if debug:
-                print(f"          Filtered: Price ${price} too low for DS/3DS console (likely a game)")
+            debug_log(debug, f"          Filtered: Price ${price} too low for DS/3DS console (likely a game)")
             return False
 
-    if debug:
-        print(f"          Ambiguous but passed filters - including")
+    if strictness >= 3:
+        debug_log(debug, f"          Ambiguous, strict mode - excluding")
+        return False
+
+    debug_log(debug, f"          Ambiguous but passed filters - including")
     return True
 
 
@@ -213,24 +202,21 @@ def is_excluded_listing(title, price, console_type, debug=False):
 
     # Filter out $0 or unrealistic prices
     if price == 0 or price < 5:
-        if debug:
-            print(f"          ❌ Excluded: Price ${price} is $0 or too low (trade/free)")
+        debug_log(debug, f"          ❌ Excluded: Price ${price} is $0 or too low (trade/free)")
         return True
 
     # Check exclusion keywords
     for category, keywords in EXCLUSION_KEYWORDS.items():
         for keyword in keywords:
             if keyword in title_lower:
-                if debug:
-                    print(f"          ❌ Excluded: Contains '{keyword}' ({category})")
+                debug_log(debug, f"          ❌ Excluded: Contains '{keyword}' ({category})")
                 return True
 
     # Check minimum price (catch shells/parts with suspiciously low prices)
     if console_type in MINIMUM_PRICES:
         min_price = MINIMUM_PRICES[console_type]
         if price < min_price:
-            if debug:
-                print(f"          ❌ Excluded: Price ${price} below minimum ${min_price} for {console_type}")
+            debug_log(debug, f"          ❌ Excluded: Price ${price} below minimum ${min_price} for {console_type}")
             return True
 
     # Additional pattern checks
@@ -252,13 +238,11 @@ def is_excluded_listing(title, price, console_type, debug=False):
     for pattern in suspicious_patterns:
         if re.search(pattern, title_lower):
             matched = re.search(pattern, title_lower).group(0)
-            if debug:
-                print(f"          ❌ Excluded: Matched pattern '{matched}'")
+            debug_log(debug, f"          ❌ Excluded: Matched pattern '{matched}'")
             return True
 
     # Passed all filters
-    if debug:
-        print(f"          ✅ Passed exclusion filters")
+    debug_log(debug, f"          ✅ Passed exclusion filters")
     return False
 
 def check_description_for_games(description, debug=False):
@@ -283,12 +267,10 @@ def check_description_for_games(description, debug=False):
     for phrase in game_only_phrases:
         if phrase in desc_lower:
             game_count += 1
-            if debug:
-                print(f"          Description contains: '{phrase}'")
+            debug_log(debug, f"          Description contains: '{phrase}'")
 
     if game_count >= 2:
-        if debug:
-            print(f"          Description scan: {game_count} game-only indicators - filtering out")
+        debug_log(debug, f"          Description scan: {game_count} game-only indicators - filtering out")
         return False
 
     game_listing_patterns = [
@@ -302,19 +284,16 @@ def check_description_for_games(description, debug=False):
 
     for pattern in game_listing_patterns:
         if re.search(pattern, desc_lower):
-            if debug:
-                print(f"          Description scan: Matched pattern '{pattern}' - filtering out")
+            debug_log(debug, f"          Description scan: Matched pattern '{pattern}' - filtering out")
             return False
 
-    if debug:
-        print(f"          Description scan: Passed")
+    debug_log(debug, f"          Description scan: Passed")
     return True
 
 
 def check_image_with_ai(image_url, debug=False):
     if not GOOGLE_VISION_API_KEY:
-        if debug:
-            print(f"          Google Vision API key not configured - skipping AI check")
+        debug_log(debug, f"          Google Vision API key not configured - skipping AI check")
         return True
 
     try:
@@ -342,7 +321,17 @@ def check_image_with_ai(image_url, debug=False):
             ]
         }
 
-        response = requests.post(url, json=payload, timeout=10)
+        # Keyed by image, so the API key never reaches the cache index
+        started = time.perf_counter()
+        with start_span("vision", image_url=image_url) as span:
+            try:
+                response = cached_post_json(url, payload, cache_key=f"vision:{image_url}", timeout=10)
+            except Exception:
+                VISION_SECONDS.observe(time.perf_counter() - started, "error")
+                raise
+            VISION_SECONDS.observe(time.perf_counter() - started, str(response.status_code))
+            span.set_attribute("status_code", response.status_code)
+            span.set_attribute("from_cache", getattr(response, "from_cache", False))
 
         if response.status_code == 200:
             result = response.json()
@@ -360,8 +349,7 @@ def check_image_with_ai(image_url, debug=False):
 
             all_detected = labels + objects
 
-            if debug:
-                print(f"          AI Detected: {', '.join(all_detected[:5])}")
+            debug_log(debug, f"          AI Detected: {', '.join(all_detected[:5])}")
 
             console_keywords = [
                 'game console', 'video game console', 'handheld game console',
@@ -387,62 +375,78 @@ def check_image_with_ai(image_url, debug=False):
             ])
 
             if game_score > 0 and not has_specific_console:
-                if debug:
-                    print(f"          AI: Detected game indicators without specific console - filtering out")
+                debug_log(debug, f"          AI: Detected game indicators without specific console - filtering out")
                 return False
             elif has_specific_console and console_score >= 2 and console_score > game_score:
-                if debug:
-                    print(
-                        f"          AI: Confirmed CONSOLE with specific identifiers (score: {console_score} vs {game_score})")
+                debug_log(
+                    debug, f"          AI: Confirmed CONSOLE with specific identifiers (score: {console_score} vs {game_score})")
                 return True
             elif game_score > 0:
-                if debug:
-                    print(
-                        f"          AI: Detected GAME/CARTRIDGE keywords (score: {game_score} vs {console_score}) - filtering out")
+                debug_log(
+                    debug, f"          AI: Detected GAME/CARTRIDGE keywords (score: {game_score} vs {console_score}) - filtering out")
                 return False
             elif has_specific_console and console_score >= 3:
-                if debug:
-                    print(f"          AI: Strong specific console signals (score: {console_score}) - including")
+                debug_log(debug, f"          AI: Strong specific console signals (score: {console_score}) - including")
                 return True
             else:
-                if debug:
-                    print(
-                        f"          AI: Insufficient signals (console: {console_score}, game: {game_score}) - filtering out")
+                debug_log(
+                    debug, f"          AI: Insufficient signals (console: {console_score}, game: {game_score}) - filtering out")
                 return False
         else:
-            if debug:
-                print(f"          AI check failed (status {response.status_code}) - defaulting to include")
+            debug_log(debug, f"          AI check failed (status {response.status_code}) - defaulting to include")
             return True
 
     except Exception as e:
-        if debug:
-            print(f"          AI check error: {e} - defaulting to include")
+        record_error("Vision", e)
+        debug_log(debug, f"          AI check error: {e} - defaulting to include")
         return True
 
 
-def wait_for_captcha_solve(driver, timeout=120):
-    """
-    Wait for user to manually solve CAPTCHA.
-    Checks every 2 seconds if CAPTCHA is gone.
-    """
-    print("\n" + "=" * 60)
-    print("CAPTCHA DETECTED!")
-    print("Please solve the CAPTCHA in the browser window.")
-    print("The script will automatically continue once solved.")
-    print("=" * 60 + "\n")
-
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        page_source = driver.page_source.lower()
-
-        if "verify you are human" not in page_source and "captcha" not in page_source:
-            print("CAPTCHA solved! Continuing...")
-            return True
+# Where each platform's listing page keeps the seller's description
+DESCRIPTION_SELECTORS = {
+    "OfferUp": [
+        "div[data-testid='description']",
+        "div[class*='description']",
+        "p[class*='description']",
+        "div[class*='Details']",
+    ],
+    "Mercari": [
+        "div[data-testid='ItemDescription']",
+        "div[class*='item-description']",
+        "div[class*='ItemDescription']",
+        "p[itemprop='description']",
+    ],
+}
 
-        time.sleep(2)
 
-    print("Timeout waiting for CAPTCHA solve.")
-    return False
+def load_listing_page(driver, listing_url, platform):
+    """Open a listing page in driver and capture it for the page cache"""
+    with start_span("fetch", platform=platform, url=listing_url, kind="description"):
+        driver.get(listing_url)
+    time.sleep(3)
+    page_source = driver.page_source
+    store_page(listing_url, page_source)
+    return page_source
+
+
+def read_listing_page(page_source, platform):
+    """(description, image_url) from an OfferUp/Mercari listing page; either may be None"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(page_source, 'html.parser')
+    description = None
+    for selector in DESCRIPTION_SELECTORS[platform]:
+        desc_elem = soup.select_one(selector)
+        if desc_elem:
+            description = desc_elem.get_text(" ", strip=True)
+            if description and len(description) > 10:
+                break
+
+    # The main photo; lean browsing blocks the image itself, not its URL
+    image_elem = soup.select_one("meta[property='og:image']")
+    image_url = image_elem.get('content') if image_elem else None
+    return description, image_url
+
 
 def get_listing_description(driver, listing_url, platform, debug=False):
     """
@@ -451,49 +455,81 @@ def get_listing_description(driver, listing_url, platform, debug=False):
     Returns the description text or None if unable to extract.
     """
     try:
-        driver.get(listing_url)
-        time.sleep(3)
+        # A listing page seen in an earlier scan is read from the cache
+        page_source = get_cached_page(listing_url)
+        if page_source is None:
+            page_source = load_listing_page(driver, listing_url, platform)
+        description, _ = read_listing_page(page_source, platform)
+
+        if description:
+            debug_log(debug, f"        Description found: {description[:100]}...")
+        else:
+            debug_log(debug, f"        Could not extract description")
 
-        description = None
+        return description
 
-        if platform == "OfferUp":
-            possible_selectors = [
-                "div[data-testid='description']",
-                "div[class*='description']",
-                "p[class*='description']",
-                "div[class*='Details']",
-            ]
-        elif platform == "Mercari":
-            possible_selectors = [
-                "div[data-testid='ItemDescription']",
-                "div[class*='item-description']",
-                "div[class*='ItemDescription']",
-                "p[itemprop='description']",
-            ]
+    except Exception as e:
+        debug_log(debug, f"        Error getting description: {e}")
+        return None
+
+
+def screen_listings(listings, platform, create, debug=False, filters=None):
+    """
+    The settings' description_scan and ai_detection switches: drop
+    OfferUp/Mercari listings whose description or main photo shows games
+    rather than a console. Only listings under their threshold get here.
+    Listing pages come from the page cache where possible, so a listing
+    seen in an earlier scan costs no page load; otherwise a driver is
+    started with create() on the first miss. A listing that can't be
+    checked is kept, as check_image_with_ai does.
+    """
+    filters = filters or get_filters()
+    if not listings or not (filters.description_scan or filters.ai_detection):
+        return listings
 
-        for selector in possible_selectors:
+    started = time.perf_counter()
+    kept = []
+    screened_out = 0
+    driver = None
+    with ExitStack() as stack:
+        for listing in listings:
             try:
-                desc_elem = driver.find_element(By.CSS_SELECTOR, selector)
-                description = desc_elem.text
-                if description and len(description) > 10:
-                    break
-            except:
+                page_source = get_cached_page(listing.link)
+                if page_source is None:
+                    if driver is None:
+                        # Holds a browser slot like the scan's own drivers
+                        stack.enter_context(get_governor().browser(platform))
+                        driver = create() or False
+                        if driver:
+                            stack.callback(driver.quit)
+                    if not driver:
+                        raise RuntimeError(f"no {platform} driver to open listing pages")
+                    page_source = load_listing_page(driver, listing.link, platform)
+                description, image_url = read_listing_page(page_source, platform)
+            except Exception as e:
+                record_error(platform, e)
+                debug_log(debug, f"        Could not screen {listing.link}: {e}")
+                kept.append(listing)
                 continue
 
-        if debug and description:
-            print(f"        Description found: {description[:100]}...")
-        elif debug:
-            print(f"        Could not extract description")
+            debug_log(debug, f"      Screening: {listing.title[:50]}")
+            if filters.description_scan and not check_description_for_games(description, debug=debug):
+                screened_out += 1
+            elif filters.ai_detection and image_url and not check_image_with_ai(image_url, debug=debug):
+                screened_out += 1
+            else:
+                kept.append(listing)
 
-        return description
+    count_outcomes(platform, {"screened_out": screened_out}, MATCHES)
+    FILTER_SECONDS.observe(time.perf_counter() - started, "screening")
+    return kept
 
-    except Exception as e:
-        if debug:
-            print(f"        Error getting description: {e}")
-        return None
 
+def create_driver(platform=None):
+    """Headless Chrome; with a platform, set up for lean browsing of its pages"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
 
-def create_driver():
     chrome_options = Options()
     chrome_options.add_argument('--headless=new')
     chrome_options.add_argument('--no-sandbox')
@@ -501,6 +537,9 @@ def create_driver():
     chrome_options.add_argument('--disable-gpu')
     chrome_options.add_argument('--disable-software-rasterizer')
     chrome_options.add_argument('--window-size=1920,1080')
+    # Background tabs of the tab pool keep loading at full speed
+    chrome_options.add_argument('--disable-background-timer-throttling')
+    chrome_options.add_argument('--disable-renderer-backgrounding')
 
     # Required for Render
     chrome_options.binary_location = '/usr/bin/google-chrome'
@@ -512,12 +551,16 @@ def create_driver():
     chrome_options.add_argument('--disable-blink-features=AutomationControlled')
 
     try:
-        driver = webdriver.Chrome(options=chrome_options)
-        driver.execute_cdp_cmd('Network.setUserAgentOverride', {
-            "userAgent": 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        })
+        with DRIVER_STARTUP_SECONDS.time("chrome"):
+            driver = webdriver.Chrome(options=chrome_options)
+            driver.execute_cdp_cmd('Network.setUserAgentOverride', {
+                "userAgent": 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+            })
+        if platform:
+            apply_lean_browsing(driver, platform)
         return driver
     except Exception as e:
+        record_error("driver", e)
         print(f"Error creating driver: {e}")
         return None
 
@@ -526,6 +569,8 @@ def create_undetected_driver(headless=True):
     Create an undetected ChromeDriver.
     Set headless=False to manually solve CAPTCHAs.
     """
+    import undetected_chromedriver as uc
+
     try:
         options = uc.ChromeOptions()
 
@@ -537,205 +582,325 @@ def create_undetected_driver(headless=True):
         options.add_argument('--disable-dev-shm-usage')
         options.add_argument('--disable-blink-features=AutomationControlled')
 
-        driver = uc.Chrome(options=options, version_main=None)
+        with DRIVER_STARTUP_SECONDS.time("undetected"):
+            driver = uc.Chrome(options=options, version_main=None)
         return driver
     except Exception as e:
+        record_error("driver", e)
         print(f"Error creating undetected driver: {e}")
         return None
-def scrape_craigslist(zip_code, debug=False):
-    """Scrape Craigslist for gaming consoles (no Selenium needed)"""
+
+
+def rows_to_listings(rows, platform, candidates=None):
+    """
+    Turn parsed rows under their price threshold into Listings.
+    Every row that passed the console filters also feeds the price index,
+    and each listing gets a deal score against it. If a candidates list is
+    given, every console listing is added to it whatever its price, for
+    matching against user watchlists. So are rows that match none of the
+    operator's console types, since a user may watch a console the
+    operator doesn't price; only rows the console filters rejected are
+    left out.
+    """
+    started = time.perf_counter()
+    price_index = get_price_index()
     listings = []
+    outcomes = {"not_console": 0, "filtered": 0, "over_threshold": 0, "under_threshold": 0}
+    for title, price, link, console_type, threshold, passed in rows:
+        if not passed:
+            outcomes["filtered" if console_type else "not_console"] += 1
+            if candidates is not None and console_type is None and title and price and link:
+                candidates.append(Listing(title, price, link, platform))
+            continue
+
+        # Scored against the other listings, then added if this one is new to the index
+        listing = Listing(title, price, link, platform, console_type, threshold,
+                          price_index.deal_score(console_type, price))
+        price_index.observe(console_type, price, listing.key)
+        if candidates is not None:
+            candidates.append(listing)
+        if price <= threshold:
+            listings.append(listing)
+            outcomes["under_threshold"] += 1
+        else:
+            outcomes["over_threshold"] += 1
 
-    search_terms = ["gameboy", "game boy", "nintendo ds", "3ds", "2ds", "retro console", "nes", "snes", "n64",
-                    "gamecube"]
+    count_outcomes(platform, outcomes)
+    FILTER_SECONDS.observe(time.perf_counter() - started, "price_index")
+    return listings
 
-    for term in search_terms:
-        url = f"https://stockton.craigslist.org/search/vga?query={term.replace(' ', '+')}&sort=date&postal={zip_code}&search_distance=25"
 
+def collect_parsed(pending, platform, debug=False, candidates=None):
+    """Wait for queued parse jobs and merge their listings in term order"""
+    return rows_to_listings(collect_rows(pending, platform, debug=debug), platform, candidates)
+
+
+def collect_rows(pending, platform, debug=False):
+    """Wait for queued parse jobs and return their rows in term order"""
+    rows = []
+    for term, rows_future in pending:
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            response = requests.get(url, headers=headers, timeout=10)
-            soup = BeautifulSoup(response.content, 'html.parser')
-
-            items = soup.find_all('li', class_='cl-static-search-result')
-
-            if debug:
-                print(f"    [{term}] Found {len(items)} raw items on Craigslist")
-
-            for item in items:
-                try:
-                    title_elem = item.find('div', class_='title')
-                    if not title_elem:
-                        title_elem = item.get('title')
-                        title = title_elem if title_elem else None
-                    else:
-                        title = title_elem.text.strip()
-
-                    if not title:
-                        continue
-
-                    link_elem = item.find('a')
-                    link = link_elem['href'] if link_elem else None
-
-                    if link and not link.startswith('http'):
-                        link = 'https://stockton.craigslist.org' + link
-
-                    price_elem = item.find('div', class_='price')
-                    price_text = price_elem.text.strip() if price_elem else None
-                    price = extract_price(price_text)
-
-                    if debug and len(listings) < 3:
-                        print(f"      - {title[:50]}... | Price: {price}")
-
-                    if price and link:
-                        meets_threshold, console_type, threshold = check_price_threshold(title, price)
-                        if meets_threshold:
-                            # Check if it's likely a console (not a game)
-                            if not is_likely_console(title, price, debug=debug):
-                                continue
-
-                            # NEW: Check exclusion filters
-                            if is_excluded_listing(title, price, console_type, debug=debug):
-                                continue
-
-                            # Passed all filters!
-                            listing_data = {
-                                'title': title,
-                                'price': price,
-                                'link': link,
-                                'platform': 'Craigslist',  # or OfferUp/Mercari
-                                'console_type': console_type,
-                                'threshold': threshold
-                            }
-                            listings.append(listing_data)
-
-                except Exception as e:
-                    if debug:
-                        print(f"      Error parsing item: {e}")
+            rows.extend(rows_future.result())
+        except Exception as e:
+            record_error(platform, e)
+            debug_log(debug, f"    Error parsing {platform} results for '{term}': {e}")
+    return rows
+
+
+def replay_card_pages(platform, search_terms, base_url, parse_pool, debug=False):
+    """Queue recorded OfferUp/Mercari pages for parsing instead of starting Chrome"""
+    journal = get_journal()
+    pending = []
+    for term in search_terms:
+        resumed = journal.resumed(platform, term)
+        if resumed is not None:
+            pending.append((term, resumed))
+            continue
+        with start_span("term", platform=platform, term=term, replayed=True):
+            content = load_page(platform, term)
+            if content is None:
+                debug_log(debug, f"    [{term}] No recorded {platform} page")
+                continue
+            pending.append((term, journal.track(parse_pool.submit(platform, content, base_url, debug),
+                                                platform, term)))
+    return pending
+
+
+def retry_after(response):
+    """Seconds from a Retry-After header, if the response has a usable one"""
+    value = getattr(response, 'headers', {}).get('Retry-After')
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def fetch_craigslist_region(region, parse_pool, host_limiter, debug=False):
+    """Fetch every search term for one region and queue the pages for parsing"""
+    site = region["craigslist"]
+    base_url = f"https://{site}.craigslist.org"
+    pending = []
+
+    variant = region_variant(region)
+    limiter = get_rate_limiter()
+    breaker = get_circuit_breaker()
+    journal = get_journal()
+
+    for term in CRAIGSLIST_SEARCH_TERMS:
+        # Finished before the worker restarted
+        resumed = journal.resumed("Craigslist", term, site)
+        if resumed is not None:
+            pending.append((term, resumed))
+            continue
+
+        # Another region may have tripped the breaker meanwhile
+        if not breaker.allow("Craigslist"):
+            debug_log(debug, f"    [{site}] Craigslist circuit open, skipping remaining terms")
+            break
+
+        with start_span("term", platform="Craigslist", term=term, site=site):
+            if is_replaying():
+                content = load_page("Craigslist", term, variant)
+                if content is not None:
+                    pending.append((term, journal.track(parse_pool.submit("Craigslist", content, base_url, debug),
+                                                        "Craigslist", term, site)))
+                continue
+
+            url = (f"{base_url}/search/vga?query={term.replace(' ', '+')}&sort=date"
+                   f"&postal={region['zip_code']}&search_distance={region['distance']}")
+
+            try:
+                headers = {
+                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+                }
+                with host_limiter.slot(url):
+                    limiter.acquire(url)
+                    with FETCH_SECONDS.time("Craigslist"), start_span("fetch", url=url) as span:
+                        response = cached_get(url, headers=headers, timeout=10)
+                        span.set_attribute("status_code", response.status_code)
+                        span.set_attribute("from_cache", getattr(response, "from_cache", False))
+
+                if response.status_code in BLOCKED_STATUS_CODES:
+                    limiter.penalize(url, retry_after(response))
+                    breaker.record_failure("Craigslist", f"HTTP {response.status_code}")
+                    debug_log(debug, f"    [{site}] [{term}] Craigslist answered {response.status_code}, backing off")
                     continue
 
-            time.sleep(2)
+                limiter.reward(url)
+                breaker.record_success("Craigslist")
 
-        except Exception as e:
-            if debug:
-                print(f"    Error scraping Craigslist for '{term}': {e}")
+                debug_log(debug, f"    [{site} {region['zip_code']}] [{term}] Fetched Craigslist results")
 
-    return listings
+                record_page("Craigslist", term, response.content, variant)
+
+                # Parsing happens in the pool while we fetch the next term
+                pending.append((term, journal.track(parse_pool.submit("Craigslist", response.content, base_url, debug),
+                                                    "Craigslist", term, site)))
+
+            except Exception as e:
+                record_error("Craigslist", e)
+                limiter.penalize(url)
+                breaker.record_failure("Craigslist", type(e).__name__)
+                debug_log(debug, f"    Error scraping Craigslist ({site}) for '{term}': {e}")
 
+    return collect_rows(pending, 'Craigslist', debug=debug)
 
-def scrape_mercari(debug=False):
+
+def scrape_craigslist_regions(regions, debug=False, candidates=None):
     """
-    Scrape Mercari for gaming consoles using Selenium.
-    Mercari is similar to OfferUp - needs JavaScript rendering.
+    Scrape Craigslist across several regions at once.
+    Regions run side by side, limited per host, and the rows are merged
+    and deduplicated before they become listings.
     """
-    listings = []
-    driver = None
+    parse_pool = get_parse_pool()
+    host_limiter = HostLimiter()
+
+    with ThreadPoolExecutor(max_workers=max(1, min(REGION_WORKERS, len(regions)))) as executor:
+        # Each region thread runs in a copy of this context, so its spans nest under ours
+        futures = [
+            executor.submit(contextvars.copy_context().run,
+                            fetch_craigslist_region, region, parse_pool, host_limiter, debug)
+            for region in regions
+        ]
+        row_batches = []
+        for region, future in zip(regions, futures):
+            try:
+                row_batches.append(future.result())
+            except Exception as e:
+                record_error("Craigslist", e)
+                debug_log(debug, f"    Error scraping Craigslist region {region}: {e}")
 
-    search_terms = ["gameboy", "nintendo ds", "3ds", "retro console"]
+    rows = merge_region_rows(row_batches)
 
-    try:
-        driver = create_undetected_driver(headless=False)
-        if not driver:
-            return listings
+    debug_log(debug, f"    {sum(len(batch) for batch in row_batches)} Craigslist rows, {len(rows)} after dedup")
+
+    return rows_to_listings(rows, Platform.CRAIGSLIST, candidates)
+
+
+def scrape_craigslist(zip_code, debug=False, site=DEFAULT_CRAIGSLIST_SITE, distance=DEFAULT_DISTANCE):
+    """Scrape Craigslist for gaming consoles (no Selenium needed)"""
+    region = {"craigslist": site, "zip_code": zip_code, "distance": distance}
+    return scrape_craigslist_regions([region], debug=debug)
 
-        for term in search_terms:
+
+def scan_terms_in_tabs(platform, driver, search_terms, search_url, base_url, create, settle, pending, debug=False):
+    """
+    Load and harvest a Selenium platform's search terms in a TabPool on
+    driver, queueing the harvested cards for parsing on pending. The
+    driver is quit when done, unless it was parked on a CAPTCHA.
+    """
+    governor = get_governor()
+    limiter = get_rate_limiter()
+    breaker = get_circuit_breaker()
+    parse_pool = get_parse_pool()
+    journal = get_journal()
+    pool = TabPool(driver, platform, limiter)
+
+    def start(term):
+        # Finished before the worker restarted
+        resumed = journal.resumed(platform, term)
+        if resumed is not None:
+            pending.append((term, resumed))
+            return None
+
+        if not breaker.allow(platform):
+            debug_log(debug, f"    {platform} circuit open, skipping remaining terms")
+            pool.stop()
+            return None
+
+        # Low-priority terms wait for the next scan while memory is high
+        if not governor.admit_term(platform, term, search_terms.index(term)):
+            return None
+
+        debug_log(debug, f"    [{term}] Loading {platform}...")
+        return search_url(term)
+
+    def harvest(term, url):
+        with start_span("term", platform=platform, term=term, url=url):
             try:
-                # Mercari search URL
-                url = f"https://www.mercari.com/search/?keyword={term.replace(' ', '%20')}"
-
-                if debug:
-                    print(f"    [{term}] Loading Mercari...")
-
-                driver.get(url)
-                time.sleep(7)
-
-                # Check for CAPTCHA and wait for manual solve
-                if "verify you are human" in driver.page_source.lower():
-                    if not wait_for_captcha_solve(driver):
-                        print("Failed to solve CAPTCHA, skipping Mercari")
-                        return listings
-                    time.sleep(3)
-
-                # Scroll to load more items
-                driver.execute_script("window.scrollTo(0, document.body.scrollHeight/2);")
-                time.sleep(2)
-
-                # Mercari uses different selectors - these may need adjustment
-                # Mercari items - use the selector we know works
-                items = driver.find_elements(By.CSS_SELECTOR, "a[href*='/item/']")
-
-                if debug:
-                    print(f"      Found {len(items)} items")
-
-                if debug:
-                    print(f"    [{term}] Found {len(items)} raw items on Mercari")
-
-                parsed_count = 0
-                for item in items[:20]:
-                    try:
-                        link = item.get_attribute('href')
-
-                        # Get title - Mercari structure varies
-                        title = item.get_attribute('aria-label') or item.text
-
-                        # Extract price from item text
-                        price_text = item.text
-                        price = extract_price(price_text)
-
-                        if debug and parsed_count < 3:
-                            print(f"      - {title[:50]}... | Price: {price}")
-                            parsed_count += 1
-
-                        if price and link and title:
-                            meets_threshold, console_type, threshold = check_price_threshold(title, price)
-                            meets_threshold, console_type, threshold = check_price_threshold(title, price)
-                            if meets_threshold:
-                                # Check if it's likely a console (not a game)
-                                if not is_likely_console(title, price, debug=debug):
-                                    continue
-
-                                # NEW: Check exclusion filters
-                                if is_excluded_listing(title, price, console_type, debug=debug):
-                                    continue
-
-                                # Passed all filters!
-                                listing_data = {
-                                    'title': title,
-                                    'price': price,
-                                    'link': link,
-                                    'platform': 'Mercari',  # or OfferUp/Mercari
-                                    'console_type': console_type,
-                                    'threshold': threshold
-                                }
-                                listings.append(listing_data)
-
-                    except Exception as e:
-                        continue
-
-                time.sleep(3)
+                # Park the browser for an operator and move on without it
+                if captcha_present(pool.driver):
+                    limiter.penalize(url)
+                    breaker.record_failure(platform, "captcha")
+                    get_captcha_desk().park(platform, pool.driver, url, term)
+                    pool.detach()
+                    return
+
+                # Scroll through the results, taking only cards not harvested before
+                cards = harvest_cards(pool.driver, platform, term, debug=debug)
+                record_page_load(pool.driver, platform)
+                record_page(platform, term, cards["html"])
+                pending.append((term, journal.track(parse_pool.submit(platform, cards["html"], base_url, debug),
+                                                    platform, term)))
+
+                limiter.reward(url)
+                breaker.record_success(platform)
 
             except Exception as e:
-                if debug:
-                    print(f"    Error scraping Mercari for '{term}': {e}")
-                continue
+                record_error(platform, e)
+                breaker.record_failure(platform, type(e).__name__)
+                debug_log(debug, f"    Error scraping {platform} for '{term}': {e}")
 
-    except Exception as e:
-        print(f"Error in Mercari scraper: {e}")
+    # A browser that has bloated is replaced once its loading tabs are harvested
+    def idle(current):
+        return governor.recycle_if_needed(current, create, platform)
 
+    try:
+        pool.run(governor.plan_terms(platform, search_terms), start, harvest, settle, idle,
+                 idle_due=lambda current: governor.recycle_reason(current) is not None)
     finally:
-        if driver:
-            driver.quit()
+        if pool.driver:
+            pool.driver.quit()
 
-    return listings
 
+def scrape_mercari(debug=False, candidates=None):
+    """
+    Scrape Mercari for gaming consoles using Selenium.
+    Mercari is similar to OfferUp - needs JavaScript rendering.
+    """
+    listings = []
+    parse_pool = get_parse_pool()
+    pending = []
+
+    governor = get_governor()
+    breaker = get_circuit_breaker()
+
+    if is_replaying():
+        pending = replay_card_pages("Mercari", MERCARI_SEARCH_TERMS, "https://www.mercari.com", parse_pool, debug)
+        return collect_parsed(pending, Platform.MERCARI, debug=debug, candidates=candidates)
 
-def create_undetected_driver(headless=False):
+    with governor.browser("Mercari"):
+        try:
+            # A browser an operator got past a CAPTCHA keeps its cookies
+            driver = get_captcha_desk().take_solved("Mercari") or create_undetected_driver(headless=False, platform="Mercari")
+            if not driver:
+                breaker.record_failure("Mercari", "driver")
+                return listings
+
+            # Mercari search URL, newest first so harvesting can stop at known listings
+            scan_terms_in_tabs(
+                "Mercari", driver, MERCARI_SEARCH_TERMS,
+                lambda term: f"https://www.mercari.com/search/?keyword={term.replace(' ', '%20')}&sortBy=2",
+                "https://www.mercari.com", lambda: create_undetected_driver(headless=False, platform="Mercari"),
+                settle=7, pending=pending, debug=debug)
+
+        except Exception as e:
+            record_error("Mercari", e)
+            print(f"Error in Mercari scraper: {e}")
+
+    listings.extend(collect_parsed(pending, Platform.MERCARI, debug=debug, candidates=candidates))
+    return screen_listings(listings, "Mercari", lambda: create_undetected_driver(headless=False, platform="Mercari"),
+                           debug=debug)
+
+
+def create_undetected_driver(headless=False, platform=None):
     """
     Create an undetected ChromeDriver.
     Set headless=False to avoid CAPTCHAs but minimize the window.
+    With a platform, the driver is set up for lean browsing of its pages.
     """
+    import undetected_chromedriver as uc
+
     try:
         options = uc.ChromeOptions()
 
@@ -749,161 +914,60 @@ def create_undetected_driver(headless=False):
         options.add_argument('--no-sandbox')
         options.add_argument('--disable-dev-shm-usage')
         options.add_argument('--disable-blink-features=AutomationControlled')
-
-        driver = uc.Chrome(options=options, version_main=None)
+        # Background tabs of the tab pool keep loading at full speed
+        options.add_argument('--disable-background-timer-throttling')
+        options.add_argument('--disable-renderer-backgrounding')
+
+        with DRIVER_STARTUP_SECONDS.time("undetected"):
+            driver = uc.Chrome(options=options, version_main=None)
+        if platform:
+            apply_lean_browsing(driver, platform)
         return driver
     except Exception as e:
+        record_error("driver", e)
         print(f"Error creating undetected driver: {e}")
         return None
 
-def scrape_offerup(debug=False):
+def scrape_offerup(debug=False, distance=DEFAULT_DISTANCE, candidates=None):
     """Scrape OfferUp for gaming consoles using Selenium"""
     listings = []
-    driver = None
-
-    search_terms = ["gameboy", "nintendo ds", "3ds", "retro console"]
+    parse_pool = get_parse_pool()
+    pending = []
 
-    try:
-        driver = create_driver()
-        if not driver:
-            return listings
+    governor = get_governor()
+    breaker = get_circuit_breaker()
 
-        for term in search_terms:
-            try:
-                url = f"https://offerup.com/search/?q={term.replace(' ', '%20')}&radius=25"
-
-                if debug:
-                    print(f"    [{term}] Loading OfferUp...")
-
-                driver.get(url)
-                time.sleep(5)
-                driver.execute_script("window.scrollTo(0, document.body.scrollHeight/2);")
-                time.sleep(2)
-
-                possible_selectors = [
-                    "a[data-testid*='listing']",
-                    "div[class*='MuiGrid-root'] a[href*='/item/']",
-                    "a[href*='/item/']",
-                ]
-
-                items = []
-                for selector in possible_selectors:
-                    try:
-                        items = driver.find_elements(By.CSS_SELECTOR, selector)
-                        if items:
-                            if debug:
-                                print(f"      Found {len(items)} items with selector: {selector}")
-                            break
-                    except:
-                        continue
-
-                if debug:
-                    print(f"    [{term}] Found {len(items)} raw items on OfferUp")
-
-                parsed_count = 0
-                for item in items[:20]:
-                    try:
-                        link = item.get_attribute('href')
-                        title = item.get_attribute('aria-label') or item.text
-
-                        try:
-                            price_elem = item.find_element(By.CSS_SELECTOR, "[class*='price']")
-                            price_text = price_elem.text
-                        except:
-                            price_text = item.text
-
-                        price = extract_price(price_text)
-
-                        if debug and parsed_count < 3:
-                            print(f"      - {title[:50]}... | Price: {price}")
-                            parsed_count += 1
-
-                        if price and link and title:
-                            meets_threshold, console_type, threshold = check_price_threshold(title, price)
-                            if meets_threshold:
-                                # Check if it's likely a console (not a game)
-                                if not is_likely_console(title, price, debug=debug):
-                                    continue
-
-                                # NEW: Check exclusion filters
-                                if is_excluded_listing(title, price, console_type, debug=debug):
-                                    continue
-
-                                # Passed all filters!
-                                listing_data = {
-                                    'title': title,
-                                    'price': price,
-                                    'link': link,
-                                    'platform': 'Craigslist',  # or OfferUp/Mercari
-                                    'console_type': console_type,
-                                    'threshold': threshold
-                                }
-                                listings.append(listing_data)
-
-                    except Exception as e:
-                        continue
-
-                time.sleep(3)
+    if is_replaying():
+        pending = replay_card_pages("OfferUp", OFFERUP_SEARCH_TERMS, "https://offerup.com", parse_pool, debug)
+        return collect_parsed(pending, Platform.OFFERUP, debug=debug, candidates=candidates)
 
-            except Exception as e:
-                if debug:
-                    print(f"    Error scraping OfferUp for '{term}': {e}")
-                continue
+    with governor.browser("OfferUp"):
+        try:
+            driver = get_captcha_desk().take_solved("OfferUp") or create_driver("OfferUp")
+            if not driver:
+                breaker.record_failure("OfferUp", "driver")
+                return listings
 
-    except Exception as e:
-        print(f"Error in OfferUp scraper: {e}")
+            scan_terms_in_tabs(
+                "OfferUp", driver, OFFERUP_SEARCH_TERMS,
+                lambda term: f"https://offerup.com/search/?q={term.replace(' ', '%20')}&radius={distance}&sort=-posted",
+                "https://offerup.com", lambda: create_driver("OfferUp"),
+                settle=5, pending=pending, debug=debug)
 
-    finally:
-        if driver:
-            driver.quit()
+        except Exception as e:
+            record_error("OfferUp", e)
+            print(f"Error in OfferUp scraper: {e}")
 
-    return listings
+    listings.extend(collect_parsed(pending, Platform.OFFERUP, debug=debug, candidates=candidates))
+    return screen_listings(listings, "OfferUp", lambda: create_driver("OfferUp"), debug=debug)
 
 
-def send_email_alert(listings):
+def send_email_alert(listings, on_sent=None):
+    """Queue listings for the alert dispatcher; sending happens off the scan"""
     if not listings:
         return
 
-    subject = f"Found {len(listings)} Gaming Console Deal(s)!"
-
-    html_content = """
-    <html>
-    <body style="font-family: Arial, sans-serif;">
-        <h2 style="color: #2c3e50;">New Gaming Console Deals Found!</h2>
-        <p>Found {} listing(s) that meet your criteria:</p>
-    """.format(len(listings))
-
-    for listing in listings:
-        html_content += f"""
-        <div style="border: 1px solid #ddd; padding: 15px; margin: 10px 0; border-radius: 5px;">
-            <h3 style="color: #27ae60; margin: 0;">{listing['title']}</h3>
-            <p style="margin: 5px 0;"><strong>Price:</strong> ${listing['price']:.2f} 
-               <span style="color: #e74c3c;">(Threshold: ${listing['threshold']})</span></p>
-            <p style="margin: 5px 0;"><strong>Platform:</strong> {listing['platform']}</p>
-            <p style="margin: 5px 0;"><strong>Console Type:</strong> {listing['console_type']}</p>
-            <a href="{listing['link']}" style="display: inline-block; padding: 10px 20px; 
-               background-color: #3498db; color: white; text-decoration: none; 
-               border-radius: 5px; margin-top: 10px;">View Listing</a>
-        </div>
-        """
-
-    html_content += """
-        <p style="margin-top: 20px; color: #7f8c8d; font-size: 12px;">
-            This alert was generated by your GameBoy Retreat scraper.
-        </p>
-    </body>
-    </html>
-    """
-
-    print(f"\n{'=' * 60}")
-    print(f"EMAIL ALERT WOULD BE SENT:")
-    print(f"To: {EMAIL_ADDRESS}")
-    print(f"Subject: {subject}")
-    print(f"Listings found: {len(listings)}")
-    for listing in listings:
-        print(f"  - {listing['title']} - ${listing['price']} on {listing['platform']}")
-        print(f"    {listing['link']}")
-    print(f"{'=' * 60}\n")
+    get_alert_dispatcher().submit(listings, on_sent=on_sent)
 
 
 def main():
@@ -951,10 +1015,9 @@ def main():
 
             new_listings = []
             for listing in all_listings:
-                listing_id = f"{listing['platform']}_{listing['link']}"
-                if listing_id not in seen_listings:
+                if listing.key not in seen_listings:
                     new_listings.append(listing)
-                    seen_listings.append(listing_id)
+                    seen_listings.append(listing.key)
 
             if new_listings:
                 print(f"\n  Found {len(new_listings)} NEW listing(s)!")
@@ -975,95 +1038,10 @@ def main():
             time.sleep(600)
 
 
-def wait_for_captcha_solve(driver, timeout=120):
-    """
-    Wait for user to manually solve CAPTCHA.
-    Checks every 2 seconds if CAPTCHA is gone.
-    """
-    print("\n" + "=" * 60)
-    print("CAPTCHA DETECTED!")
-    print("Please solve the CAPTCHA in the browser window.")
-    print("The script will automatically continue once solved.")
-    print("=" * 60 + "\n")
-
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        # Check if CAPTCHA is still present
-        page_source = driver.page_source.lower()
-
-        if "verify you are human" not in page_source and "captcha" not in page_source:
-            print("CAPTCHA solved! Continuing...")
-            return True
-
-        time.sleep(2)
-
-    print("Timeout waiting for CAPTCHA solve.")
-    return False
-
-
-def diagnose_mercari():
-    """Test Mercari with undetected chromedriver"""
-    driver = create_undetected_driver()
-    if not driver:
-        return
-
-    try:
-        url = "https://www.mercari.com/search/?keyword=nintendo"
-        print(f"Loading: {url}")
-        driver.get(url)
-
-        # Wait much longer for JavaScript to execute
-        print("Waiting 10 seconds for page to fully load...")
-        time.sleep(10)
-
-        # Scroll to trigger lazy loading
-        print("Scrolling page...")
-        driver.execute_script("window.scrollTo(0, 500);")
-        time.sleep(3)
-        driver.execute_script("window.scrollTo(0, 1000);")
-        time.sleep(3)
-
-        # Save the HTML after scrolling
-        with open('mercari_after_scroll.html', 'w', encoding='utf-8') as f:
-            f.write(driver.page_source)
-        print("Saved to mercari_after_scroll.html")
-
-        # Count total elements
-        all_elements = driver.find_elements(By.CSS_SELECTOR, "*")
-        print(f"\nTotal HTML elements on page: {len(all_elements)}")
-
-        # Look for spans with prices (items always have prices)
-        price_elements = driver.find_elements(By.CSS_SELECTOR, "span")
-        prices_found = []
-        for span in price_elements:
-            text = span.text
-            if text and '$' in text:
-                prices_found.append(text)
-
-        print(f"Found {len(prices_found)} elements with $ signs")
-        if prices_found:
-            print(f"Sample prices: {prices_found[:5]}")
-
-        # Try to find ANY links
-        all_links = driver.find_elements(By.TAG_NAME, "a")
-        print(f"\nTotal <a> tags: {len(all_links)}")
-
-        # Show first 10 links
-        print("First 10 links:")
-        for i, link in enumerate(all_links[:10]):
-            href = link.get_attribute('href')
-            text = link.text[:40] if link.text else "[no text]"
-            print(f"  {i + 1}. {text} -> {href}")
-
-    finally:
-        try:
-            driver.quit()
-        except:
-            pass
-
-
 def test_mercari_only():
     """Test just Mercari with one search term"""
+    from selenium.webdriver.common.by import By
+
     print("Testing Mercari scraper...")
     print("A browser window will open - solve the CAPTCHA when it appears\n")
 
@@ -1083,7 +1061,7 @@ def test_mercari_only():
         time.sleep(5)
 
         # Check for CAPTCHA
-        if "verify you are human" in driver.page_source.lower():
+        if captcha_present(driver):
             print("\nCAPTCHA detected! Solve it in the browser window...")
             if not wait_for_captcha_solve(driver):
                 print("Failed to solve CAPTCHA")
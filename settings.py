@@ -0,0 +1,268 @@
+"""
+User settings: validation, persistence and the compiled filter bundle.
+
+POST /api/settings goes through validate_settings(), which checks every
+field and returns a complete new settings dict (nothing is merged into
+the live one in place). save_settings() writes it atomically, a temp
+file fsynced and renamed over SETTINGS_FILE, so a crash never leaves half
+a file behind.
+
+The scan reads settings through a FilterBundle: thresholds sorted once,
+strictness and the other filter switches, frozen. The API sends new
+settings to the worker on its control queue and set_filters() swaps the
+bundle in one assignment. Each page is handed to the parse pool with the
+bundle current at that moment, so a change applies from the next search
+term on, mid-scan, and nothing is rebuilt per item. Pool processes keep
+one copy per bundle version.
+"""
+import copy
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from types import MappingProxyType
+
+SETTINGS_FILE = os.getenv('SETTINGS_FILE', 'user_settings.json')
+
+# What the scan has always used; the UI's threshold list starts from these
+DEFAULT_THRESHOLDS = {
+    "game boy": 150,
+    "gameboy": 50,
+    "game boy color": 40,
+    "gameboy color": 40,
+    "gbc": 50,
+    "game boy advance": 60,
+    "gameboy advance": 60,
+    "gba": 60,
+    "game boy advance sp": 90,
+    "gameboy advance sp": 90,
+    "gba sp": 90,
+    "nintendo ds": 35,
+    "ds lite": 35,
+    "3ds": 100,
+    "3ds xl": 120,
+    "new 3ds": 120,
+    "new 3ds xl": 120,
+    "2ds": 100,
+    "2ds xl": 160,
+    "nes": 60,
+    "snes": 70,
+    "super nintendo": 60,
+    "n64": 40,
+    "nintendo 64": 40,
+    "gamecube": 50,
+    "game cube": 50,
+    "wii": 50,
+}
+
+DEFAULT_SETTINGS = {
+    "platforms": {
+        "craigslist": True,
+        "offerup": True,
+        "mercari": True
+    },
+    "zip_code": "95212",
+    "distance": 25,
+    "regions": [],  # [{"craigslist": "stockton", "zip_code": "95212", "distance": 25}, ...]
+    "check_interval": 10,  # minutes
+    "thresholds": DEFAULT_THRESHOLDS,
+    "ai_detection": True,
+    "description_scan": True,
+    "strictness": 2,  # 1=lenient, 2=medium, 3=strict
+    "min_deal_score": 0  # 0-1, share of recent listings a deal must undercut
+}
+
+# The part of the settings the filters read, and so what a bundle is compiled from
+FILTER_FIELDS = ("thresholds", "strictness", "ai_detection", "description_scan", "min_deal_score")
+
+ZIP_CODE_PATTERN = re.compile(r'^\d{5}$')
+SITE_PATTERN = re.compile(r'^[a-z0-9]+$')
+
+
+class SettingsError(ValueError):
+    def __init__(self, errors):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+
+def _number(value, name, errors, low, high, integer=False):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or (integer and not isinstance(value, int)):
+        errors.append(f"{name} must be {'a whole number' if integer else 'a number'}")
+    elif not low <= value <= high:
+        errors.append(f"{name} must be between {low} and {high}")
+    return value
+
+
+def _check_region(region, index, errors):
+    if not isinstance(region, dict):
+        errors.append(f"regions[{index}] must be an object")
+        return
+    unknown = set(region) - {"craigslist", "zip_code", "distance"}
+    if unknown:
+        errors.append(f"regions[{index}] has unknown field(s) {', '.join(sorted(unknown))}")
+    if not SITE_PATTERN.match(str(region.get("craigslist", ""))):
+        errors.append(f"regions[{index}].craigslist must be a Craigslist subdomain like 'stockton'")
+    if "zip_code" in region and not ZIP_CODE_PATTERN.match(str(region["zip_code"])):
+        errors.append(f"regions[{index}].zip_code must be 5 digits")
+    if "distance" in region:
+        _number(region["distance"], f"regions[{index}].distance", errors, 1, 500, integer=True)
+
+
+def validate_settings(update, current=None):
+    """
+    Apply a settings update on top of current and return the new settings.
+    Raises SettingsError listing everything wrong with the update.
+    """
+    if not isinstance(update, dict):
+        raise SettingsError(["settings must be a JSON object"])
+
+    errors = []
+    unknown = set(update) - set(DEFAULT_SETTINGS)
+    if unknown:
+        errors.append(f"unknown setting(s) {', '.join(sorted(unknown))}")
+
+    settings = copy.deepcopy(current if current is not None else DEFAULT_SETTINGS)
+    for key, value in update.items():
+        if key in DEFAULT_SETTINGS:
+            settings[key] = copy.deepcopy(value)
+
+    platforms = settings["platforms"]
+    if not isinstance(platforms, dict) or set(platforms) - set(DEFAULT_SETTINGS["platforms"]) \
+            or not all(isinstance(enabled, bool) for enabled in platforms.values()):
+        errors.append("platforms must map craigslist/offerup/mercari to true or false")
+
+    if not ZIP_CODE_PATTERN.match(str(settings["zip_code"])):
+        errors.append("zip_code must be 5 digits")
+    _number(settings["distance"], "distance", errors, 1, 500, integer=True)
+    _number(settings["check_interval"], "check_interval", errors, 1, 1440, integer=True)
+
+    if not isinstance(settings["regions"], list):
+        errors.append("regions must be a list")
+    else:
+        for index, region in enumerate(settings["regions"]):
+            _check_region(region, index, errors)
+
+    thresholds = settings["thresholds"]
+    if not isinstance(thresholds, dict) or not thresholds:
+        errors.append("thresholds must map console names to prices")
+    else:
+        # Titles are matched lowercased, so keys are too
+        settings["thresholds"] = {str(console).lower().strip(): price for console, price in thresholds.items()}
+        for console, price in settings["thresholds"].items():
+            if not console:
+                errors.append("threshold console names can't be empty")
+            _number(price, f"thresholds['{console}']", errors, 1, 10000)
+
+    for key in ("ai_detection", "description_scan"):
+        if not isinstance(settings[key], bool):
+            errors.append(f"{key} must be true or false")
+    if settings["strictness"] not in (1, 2, 3) or isinstance(settings["strictness"], bool):
+        errors.append("strictness must be 1, 2 or 3")
+    _number(settings["min_deal_score"], "min_deal_score", errors, 0, 1)
+
+    if errors:
+        raise SettingsError(errors)
+    return settings
+
+
+def load_settings(path=SETTINGS_FILE):
+    """Saved settings on top of the defaults; the defaults if there are none or they don't validate"""
+    if not os.path.exists(path):
+        return copy.deepcopy(DEFAULT_SETTINGS)
+    try:
+        with open(path, 'r') as f:
+            return validate_settings(json.load(f))
+    except (OSError, ValueError) as e:
+        print(f"Ignoring saved settings in {path}: {e}")
+        return copy.deepcopy(DEFAULT_SETTINGS)
+
+
+def save_settings(settings, path=SETTINGS_FILE):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=".settings-", dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(settings, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class FilterBundle:
+    """The filter settings of one settings version, compiled once and never changed"""
+
+    __slots__ = ("version", "source", "thresholds", "ordered_thresholds", "strictness",
+                 "ai_detection", "description_scan", "min_deal_score")
+
+    def __init__(self, source):
+        source = {key: source.get(key, DEFAULT_SETTINGS[key]) for key in FILTER_FIELDS}
+        object.__setattr__(self, "source", source)
+        object.__setattr__(self, "version", hashlib.sha1(
+            json.dumps(source, sort_keys=True).encode('utf-8')).hexdigest()[:12])
+        object.__setattr__(self, "thresholds", MappingProxyType(dict(source["thresholds"])))
+        # Longest name first, so "3ds xl" wins over "3ds"
+        object.__setattr__(self, "ordered_thresholds", tuple(
+            sorted(source["thresholds"].items(), key=lambda item: len(item[0]), reverse=True)))
+        for key in ("strictness", "ai_detection", "description_scan", "min_deal_score"):
+            object.__setattr__(self, key, source[key])
+
+    def __setattr__(self, name, value):
+        raise AttributeError("FilterBundle is immutable")
+
+    def __reduce__(self):
+        # Pool processes rebuild each version once, not once per page
+        return _bundle_for_version, (self.version, self.source)
+
+    def price_threshold(self, title_lower):
+        """(console type, threshold) of the longest console name in the title, or (None, None)"""
+        for console, threshold in self.ordered_thresholds:
+            if console in title_lower:
+                return console, threshold
+        return None, None
+
+
+_bundles = {}
+
+
+def _bundle_for_version(version, source):
+    bundle = _bundles.get(version)
+    if bundle is None:
+        bundle = _bundles[version] = FilterBundle(source)
+    return bundle
+
+
+def compile_filters(settings):
+    bundle = FilterBundle(settings)
+    if len(_bundles) > 32:
+        _bundles.clear()
+    return _bundles.setdefault(bundle.version, bundle)
+
+
+_filters = None
+_filters_lock = threading.Lock()
+
+
+def get_filters():
+    """The current FilterBundle; read it once per term or page and keep using that one"""
+    global _filters
+    if _filters is None:
+        with _filters_lock:
+            if _filters is None:
+                _filters = compile_filters(load_settings())
+    return _filters
+
+
+def set_filters(bundle):
+    """Swap in a new bundle; a page already being filtered finishes with the old one"""
+    global _filters
+    previous = _filters
+    _filters = bundle
+    return previous is None or previous.version != bundle.version
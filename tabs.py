@@ -0,0 +1,139 @@
+"""
+Tab pool: several search terms loading at once in one browser.
+
+A second Chrome per platform costs hundreds of MB; a second tab in the
+same Chrome costs a renderer. TabPool starts a term in every free tab
+(navigation through window.location, so nothing blocks on the load),
+then polls the tabs and harvests whichever one has finished loading and
+settled, and refills it with the next term.
+
+Tabs only start when the host's rate limiter has a token, so the pool
+never fetches faster than the platform's rate; it just stops the browser
+from idling while a page loads. While memory is high the governor cuts
+the pool to one tab. TAB_POOL_SIZE=1 is the old one-term-at-a-time scan.
+
+The browser can only be swapped with no tab loading. After each harvest
+the pool asks idle_due() whether it should be; if so it starts no more
+tabs, harvests the ones still loading, then calls idle().
+"""
+import os
+import time
+from collections import deque
+
+from browsing import open_tab
+from governor import get_governor
+from metrics import FETCH_SECONDS
+
+TAB_POOL_SIZE = int(os.getenv('TAB_POOL_SIZE', 2))
+TAB_POLL_SECONDS = 0.5
+# A tab still loading after this is harvested as it is
+TAB_LOAD_TIMEOUT = 30
+
+
+class TabPool:
+    def __init__(self, driver, platform, limiter, size=TAB_POOL_SIZE):
+        self.driver = driver
+        self.platform = platform
+        self.limiter = limiter
+        self.size = max(1, size)
+        self.handles = [driver.current_window_handle]
+        self.stopped = False
+
+    def stop(self):
+        """Start no more terms; tabs already loading are abandoned"""
+        self.stopped = True
+
+    def detach(self):
+        """Give up the driver (e.g. parked on a CAPTCHA) and stop"""
+        self.driver = None
+        self.stop()
+
+    def _tab(self, index):
+        while len(self.handles) <= index:
+            # Each tab needs its own block list
+            self.handles.append(open_tab(self.driver))
+        self.driver.switch_to.window(self.handles[index])
+
+    def run(self, items, start, harvest, settle, idle=None, idle_due=None):
+        """
+        start(item) -> url to load, or None to skip the item
+        harvest(item, url) runs with the item's tab in front once its page
+            has loaded and then settled for settle seconds
+        idle(driver) -> driver, called between harvests with no tab
+            loading; may swap the driver for a fresh one (None ends the run)
+        idle_due(driver) -> bool, asked after each harvest whether to drain
+            the tabs and call idle(); without it idle() runs whenever the
+            tabs happen to be empty after a harvest
+        Returns the driver the pool ends up with, None if it was detached.
+        """
+        pending = deque(items)
+        admitted = deque()  # (item, url) waiting for a rate limit token
+        busy = {}  # tab index -> [item, url, started, loaded]
+        draining = False
+
+        while not self.stopped and (pending or admitted or busy):
+            if draining and not busy:
+                draining = False
+                self.driver = idle(self.driver)
+                if self.driver is None:
+                    break
+                self.handles = [self.driver.current_window_handle]
+
+            capacity = get_governor().tab_budget(self.size)
+            free = [index for index in range(self.size) if index not in busy]
+
+            while free and len(busy) < capacity and not draining and not self.stopped:
+                if not admitted:
+                    if not pending:
+                        break
+                    item = pending.popleft()
+                    url = start(item)
+                    if url is not None:
+                        admitted.append((item, url))
+                    continue
+
+                item, url = admitted[0]
+                # With tabs still loading, don't sit waiting on the limiter
+                if busy:
+                    if not self.limiter.try_acquire(url):
+                        break
+                else:
+                    self.limiter.acquire(url)
+                admitted.popleft()
+
+                index = free.pop(0)
+                self._tab(index)
+                self.driver.execute_script("window.location.href = arguments[0];", url)
+                busy[index] = [item, url, time.monotonic(), None]
+
+            if self.stopped or not busy:
+                continue
+
+            index = self._next_ready(busy, settle)
+            if index is None:
+                time.sleep(TAB_POLL_SECONDS)
+                continue
+
+            item, url, _, _ = busy.pop(index)
+            self._tab(index)
+            harvest(item, url)
+
+            # A detached pool has no driver to recycle
+            if idle is not None and self.driver is not None and (pending or admitted) and not draining:
+                draining = idle_due(self.driver) if idle_due is not None else not busy
+
+        return self.driver
+
+    def _next_ready(self, busy, settle):
+        now = time.monotonic()
+        for index, tab in busy.items():
+            _, _, started, loaded = tab
+            if loaded is None:
+                self._tab(index)
+                state = self.driver.execute_script("return document.readyState")
+                if state == "complete" or now - started > TAB_LOAD_TIMEOUT:
+                    tab[3] = loaded = now
+                    FETCH_SECONDS.observe(now - started, self.platform)
+            if loaded is not None and now - loaded >= settle:
+                return index
+        return None
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def pytest_addoption(parser):
+    parser.addoption("--budgets", action="store_true",
+                     help="Fail benchmarks and import probes that go over their wall-clock budget")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "budget: asserts a wall-clock budget, only runs with --budgets")
+
+
+def pytest_collection_modifyitems(config, items):
+    # On a loaded machine a fixed budget fails at random, so it's opt-in
+    if config.getoption("--budgets"):
+        return
+    skip = pytest.mark.skip(reason="wall-clock budget, run with --budgets")
+    for item in items:
+        if "budget" in item.keywords:
+            item.add_marker(skip)
@@ -0,0 +1,138 @@
+"""
+Synthetic listings and fixture pages shared by the tests.
+
+Nothing here touches the network or starts Chrome; write_fixtures records
+pages through replay.py so a scan can run from them offline.
+"""
+import os
+import random
+
+BENCH_CONSOLES = ["gameboy", "gba sp", "nintendo ds", "3ds", "3ds xl", "2ds"]
+ITEMS_PER_PAGE = 120
+
+
+def make_listings(count, seed=7):
+    from listing import Listing, Platform
+
+    rng = random.Random(seed)
+    consoles = BENCH_CONSOLES
+    platforms = list(Platform)
+    listings = []
+    for i in range(count):
+        console_type = rng.choice(consoles)
+        listings.append(Listing(
+            f"Nintendo {console_type.upper()} console <{i}> & charger",
+            round(rng.uniform(20, 150), 2),
+            f"https://example.com/item/{i}",
+            rng.choice(platforms),
+            console_type,
+            120,
+            round(rng.random(), 2),
+        ))
+    return listings
+
+
+def make_titles(count, seed=7):
+    """(title, price) pairs, some cheap consoles, some accessories, some reposts"""
+    rng = random.Random(seed)
+    extras = ["console", "handheld system", "with charger", "bundle", "case only", "games lot", "for parts"]
+    titles = []
+    for i in range(count):
+        if titles and rng.random() < 0.1:
+            titles.append(rng.choice(titles))
+            continue
+        console_type = rng.choice(BENCH_CONSOLES)
+        titles.append((f"Nintendo {console_type} {rng.choice(extras)} #{i}", float(rng.randint(15, 180))))
+    return titles
+
+
+def craigslist_fixture(count, seed=7):
+    items = "".join(
+        f'<li class="cl-static-search-result" title="{title}"><a href="/vid/d/item/{i}.html">'
+        f'<div class="title">{title}</div><div class="price">${price:.0f}</div></a></li>'
+        for i, (title, price) in enumerate(make_titles(count, seed))
+    )
+    return f'<html><body><ol class="cl-static-search-results">{items}</ol></body></html>'
+
+
+def card_fixture(count, seed=7):
+    cards = "".join(
+        f'<a href="/item/m{seed}{i}/" aria-label="{title}"><div><span>{title}</span>'
+        f'<span class="price">${price:.0f}</span></div></a>'
+        for i, (title, price) in enumerate(make_titles(count, seed))
+    )
+    return f'<html><body><div id="results">{cards}</div></body></html>'
+
+
+def write_fixtures(directory, regions):
+    """Record synthetic pages for every platform/term the scrapers ask for; returns the rows they parse to"""
+    from parsing import MAX_CARDS_PER_PAGE
+    from replay import record_page, region_variant
+    from scraper import CRAIGSLIST_SEARCH_TERMS, OFFERUP_SEARCH_TERMS, MERCARI_SEARCH_TERMS
+
+    previous = {name: os.environ.get(name) for name in ('FIXTURE_DIR', 'SCRAPER_REPLAY')}
+    os.environ['FIXTURE_DIR'] = directory
+    os.environ['SCRAPER_REPLAY'] = 'record'
+    try:
+        for region in regions:
+            variant = region_variant(region)
+            for seed, term in enumerate(CRAIGSLIST_SEARCH_TERMS):
+                record_page("Craigslist", term, craigslist_fixture(ITEMS_PER_PAGE, seed), variant)
+        for seed, term in enumerate(OFFERUP_SEARCH_TERMS):
+            record_page("OfferUp", term, card_fixture(ITEMS_PER_PAGE, seed))
+        for seed, term in enumerate(MERCARI_SEARCH_TERMS):
+            record_page("Mercari", term, card_fixture(ITEMS_PER_PAGE, seed + 100))
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    card_rows = min(ITEMS_PER_PAGE, MAX_CARDS_PER_PAGE)
+    return (len(regions) * len(CRAIGSLIST_SEARCH_TERMS) * ITEMS_PER_PAGE
+            + (len(OFFERUP_SEARCH_TERMS) + len(MERCARI_SEARCH_TERMS)) * card_rows)
+
+
+def legacy_render_html(listings):
+    """The alert HTML as send_email_alert used to build it, kept as a baseline"""
+    html_content = """
+    <html>
+    <body style="font-family: Arial, sans-serif;">
+        <h2 style="color: #2c3e50;">New Gaming Console Deals Found!</h2>
+        <p>Found {} listing(s) that meet your criteria:</p>
+    """.format(len(listings))
+
+    for listing in listings:
+        html_content += f"""
+        <div style="border: 1px solid #ddd; padding: 15px; margin: 10px 0; border-radius: 5px;">
+            <h3 style="color: #27ae60; margin: 0;">{listing.title}</h3>
+            <p style="margin: 5px 0;"><strong>Price:</strong> ${listing.price:.2f}
+               <span style="color: #e74c3c;">(Threshold: ${listing.threshold})</span></p>
+            <p style="margin: 5px 0;"><strong>Platform:</strong> {listing.platform}</p>
+            <p style="margin: 5px 0;"><strong>Console Type:</strong> {listing.console_type}</p>
+            <a href="{listing.link}" style="display: inline-block; padding: 10px 20px;
+               background-color: #3498db; color: white; text-decoration: none;
+               border-radius: 5px; margin-top: 10px;">View Listing</a>
+        </div>
+        """
+
+    html_content += """
+        <p style="margin-top: 20px; color: #7f8c8d; font-size: 12px;">
+            This alert was generated by your GameBoy Retreat scraper.
+        </p>
+    </body>
+    </html>
+    """
+    return html_content
+
+
+class NullNotifier:
+    def notify(self, listings):
+        return 0, 0
+
+    def notify_subscriber(self, subscriber_id, listings):
+        return 0, 0
+
+    def close(self):
+        pass
@@ -0,0 +1,157 @@
+import socketserver
+import threading
+
+import pytest
+
+from alerts import AlertDispatcher, SMTPTransport
+from sample_data import make_listings
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: greets, accepts every command and keeps each DATA body"""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply("220 localhost SMTP stand-in")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                body = []
+                for data_line in iter(self.rfile.readline, b""):
+                    if data_line == b".\r\n":
+                        break
+                    body.append(data_line)
+                server.messages.append(b"".join(body).decode())
+                self.reply("250 OK")
+                if server.drop_after_message:
+                    # Hang up like a server closing an idle connection
+                    server.drop_after_message = False
+                    return
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+@pytest.fixture
+def smtp_server():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SMTPHandler)
+    server.daemon_threads = True
+    server.connections = 0
+    server.messages = []
+    server.drop_after_message = False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def smtp_transport(server):
+    host, port = server.server_address
+    return SMTPTransport(host=host, port=port, user=None, starttls=False, sender="scraper@example.com")
+
+
+class RecordingNotifier:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.digests = []
+        self.closed = False
+
+    def notify(self, listings):
+        if self.fail:
+            raise ConnectionError("transport down")
+        self.digests.append((None, list(listings)))
+        return 1, 0
+
+    def notify_subscriber(self, subscriber_id, listings):
+        self.digests.append((subscriber_id, list(listings)))
+        return 1, 0
+
+    def close(self):
+        self.closed = True
+
+
+def test_burst_goes_out_as_one_digest():
+    notifier = RecordingNotifier()
+    dispatcher = AlertDispatcher(notifier, coalesce_seconds=0.5)
+    listings = make_listings(6)
+    sent = []
+
+    for i in range(0, 6, 2):
+        dispatcher.submit(listings[i:i + 2], on_sent=lambda: sent.append(len(notifier.digests)))
+    dispatcher.stop(timeout=5)
+
+    assert notifier.digests == [(None, listings)]
+    # Callbacks run once the digest is delivered, not when it is queued
+    assert sent == [1, 1, 1]
+    assert notifier.closed
+    assert dispatcher.stats["digests_sent"] == 1 and dispatcher.stats["listings_sent"] == 6
+
+
+def test_subscriber_matches_get_their_own_digest():
+    notifier = RecordingNotifier()
+    dispatcher = AlertDispatcher(notifier, coalesce_seconds=0.5)
+    listings = make_listings(3)
+
+    dispatcher.submit(listings[:2])
+    dispatcher.submit(listings[2:], subscriber_id="user-7")
+    dispatcher.stop(timeout=5)
+
+    assert sorted(notifier.digests, key=lambda digest: str(digest[0])) == [
+        (None, listings[:2]), ("user-7", listings[2:])]
+
+
+def test_failed_delivery_is_counted_not_raised():
+    dispatcher = AlertDispatcher(RecordingNotifier(fail=True), coalesce_seconds=0)
+    dispatcher.submit(make_listings(2))
+    dispatcher.stop(timeout=5)
+
+    assert not dispatcher.thread.is_alive()
+    assert dispatcher.stats["failed_deliveries"] == 1 and dispatcher.stats["deliveries"] == 0
+
+
+def test_smtp_connection_is_reused_between_digests(smtp_server):
+    transport = smtp_transport(smtp_server)
+    transport.send("buyer@example.com", "First digest", "text", "<p>html</p>")
+    transport.send("buyer@example.com", "Second digest", "text", "<p>html</p>")
+    transport.close()
+
+    assert smtp_server.connections == 1
+    assert len(smtp_server.messages) == 2
+    assert "Subject: First digest" in smtp_server.messages[0]
+    assert "Subject: Second digest" in smtp_server.messages[1]
+
+
+def test_smtp_reconnects_after_server_hangs_up(smtp_server):
+    transport = smtp_transport(smtp_server)
+    smtp_server.drop_after_message = True
+    transport.send("buyer@example.com", "First digest", "text", "<p>html</p>")
+    transport.send("buyer@example.com", "Second digest", "text", "<p>html</p>")
+    transport.close()
+
+    assert smtp_server.connections == 2
+    assert [message.count("Subject:") for message in smtp_server.messages] == [1, 1]
+
+
+def test_html_part_is_autoescaped_and_text_part_is_not():
+    from alerts import render_alert
+    from listing import Listing
+
+    listing = Listing('3DS "XL" <b>boxed</b> & charger', 90.0, 'https://example.com/a?x=1&y="2"', "Mercari",
+                      "3ds xl", 120)
+    subject, text, html = render_alert([listing])
+
+    assert '3DS &#34;XL&#34; &lt;b&gt;boxed&lt;/b&gt; &amp; charger' in html
+    assert 'href="https://example.com/a?x=1&amp;y=&#34;2&#34;"' in html
+    assert '<b>boxed</b>' not in html
+    assert '3DS "XL" <b>boxed</b> & charger - $90.00 on Mercari' in text
@@ -0,0 +1,215 @@
+"""
+Offline benchmarks for the scraper pipeline, run with pytest-benchmark.
+
+A plain run times each benchmark and checks its results, nothing more.
+With --budgets each one also has to stay under a fixed budget, several
+times what the code needs on a laptop, so a regression that makes a hot
+path many times slower fails; leave it off on shared CI runners, where
+load alone can blow a budget. Compare runs with --benchmark-autosave and
+--benchmark-compare; --benchmark-disable runs each body once, untimed.
+"""
+import os
+
+import pytest
+
+from sample_data import (ITEMS_PER_PAGE, NullNotifier, card_fixture, craigslist_fixture,
+                         legacy_render_html, make_listings, make_titles, write_fixtures)
+
+# Best-of-rounds seconds allowed per benchmark
+BUDGETS = {
+    "render": 0.1,
+    "parse_craigslist": 3.0,
+    "parse_cards": 3.0,
+    "parse_pool": 3.0,
+    "filter": 0.5,
+    "merge_regions": 0.1,
+    "near_duplicates": 5.0,
+    "seen_check": 0.05,
+    "scan": 10.0,
+}
+
+
+@pytest.fixture
+def within_budget(benchmark, pytestconfig):
+    """Benchmark func; with --budgets, fail if its best round is over BUDGETS[name]"""
+    enforce = pytestconfig.getoption("--budgets")
+
+    def run(name, func, rounds=3):
+        result = benchmark.pedantic(func, rounds=rounds, warmup_rounds=1)
+        if enforce and not benchmark.disabled:
+            best = benchmark.stats.stats.min
+            assert best < BUDGETS[name], f"{name} took {best:.3f}s, budget is {BUDGETS[name]}s"
+        return result
+
+    return run
+
+
+@pytest.mark.benchmark(group="render")
+def test_render_legacy(benchmark):
+    """Baseline only: the alert HTML as send_email_alert used to build it"""
+    listings = make_listings(1000)
+    benchmark.pedantic(legacy_render_html, args=(listings,), rounds=5)
+
+
+@pytest.mark.benchmark(group="render")
+def test_render_templates(within_budget):
+    from alerts import render_alert
+
+    listings = make_listings(1000)
+    subject, text, html = within_budget("render", lambda: render_alert(listings), rounds=5)
+    assert html.count("View Listing") == len(listings)
+    assert "&lt;0&gt; &amp; charger" in html
+
+
+@pytest.mark.benchmark(group="parse")
+def test_parse_craigslist_inline(within_budget):
+    from parsing import parse_page
+
+    content = craigslist_fixture(ITEMS_PER_PAGE).encode('utf-8')
+    pages = within_budget(
+        "parse_craigslist",
+        lambda: [parse_page("Craigslist", content, "https://x.craigslist.org", False) for _ in range(20)])
+    assert len(pages) == 20
+
+
+@pytest.mark.benchmark(group="parse")
+def test_parse_cards_inline(within_budget):
+    from parsing import parse_page
+
+    cards = card_fixture(ITEMS_PER_PAGE)
+    pages = within_budget(
+        "parse_cards",
+        lambda: [parse_page("Mercari", cards, "https://www.mercari.com", False) for _ in range(20)])
+    assert len(pages) == 20
+
+
+@pytest.mark.benchmark(group="parse")
+def test_parse_pool(within_budget):
+    from parsing import get_parse_pool
+
+    content = craigslist_fixture(ITEMS_PER_PAGE).encode('utf-8')
+    pool = get_parse_pool()
+
+    def parse_all():
+        futures = [pool.submit("Craigslist", content, "https://x.craigslist.org") for _ in range(20)]
+        return [future.result() for future in futures]
+
+    assert len(within_budget("parse_pool", parse_all)) == 20
+
+
+@pytest.mark.benchmark(group="filter")
+def test_evaluate_rows(within_budget):
+    from parsing import evaluate_rows
+
+    rows = [(title, price, f"https://example.com/item/{i}") for i, (title, price) in enumerate(make_titles(5000))]
+    within_budget("filter", lambda: evaluate_rows(rows), rounds=5)
+
+
+@pytest.mark.benchmark(group="dedup")
+def test_merge_region_rows(within_budget):
+    from regions import merge_region_rows
+
+    count = 2000
+    rows = [(title, price, f"https://example.com/item/{i % (count // 2)}")
+            for i, (title, price) in enumerate(make_titles(count))]
+    batches = [rows[i:i + 500] for i in range(0, count, 500)]
+    merged = within_budget("merge_regions", lambda: merge_region_rows(batches), rounds=5)
+    assert len(merged) <= count // 2
+
+
+@pytest.mark.benchmark(group="dedup")
+def test_near_duplicate_index(within_budget):
+    from dedup import NearDuplicateIndex
+
+    titles = make_titles(2000)
+
+    def near_duplicates():
+        index = NearDuplicateIndex()
+        for title, price in titles:
+            index.add(title, price, now=0)
+
+    within_budget("near_duplicates", near_duplicates)
+
+
+@pytest.mark.benchmark(group="listings")
+def test_seen_check_by_key(within_budget):
+    listings = make_listings(20000)
+    seen = {listing.key for listing in listings[::2]}
+    found = within_budget("seen_check", lambda: sum(listing.key in seen for listing in listings), rounds=5)
+    assert found == len(seen)
+
+
+def test_listing_smaller_than_dict():
+    """Memory per retained listing, Listing record vs the dicts it replaced"""
+    import tracemalloc
+
+    count = 20000
+    listings = make_listings(count)
+    fields = ('title', 'price', 'link', 'platform', 'console_type', 'threshold', 'deal_score')
+
+    def retained(build):
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        kept = build()
+        size = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        del kept
+        return size / count
+
+    # Both rebuilt from the same title/link strings, so only the record itself is measured
+    as_dicts = retained(lambda: [{field: getattr(listing, field) for field in fields} for listing in listings])
+    as_records = retained(lambda: [type(listing)(listing.title, listing.price, listing.link, listing.platform,
+                                                 listing.console_type, listing.threshold, listing.deal_score)
+                                   for listing in listings])
+    # The record includes its precomputed key and is still smaller
+    assert as_records < as_dicts
+
+
+@pytest.fixture
+def replayed_scan(tmp_path, monkeypatch):
+    """A run_scan over recorded synthetic pages; yields (scan, expected rows, events, scanned counts)"""
+    import alerts
+    import scraper
+    from dedup import NearDuplicateIndex
+    from regions import load_regions
+    from worker import run_scan
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('HTTP_CACHE', 'off')
+    monkeypatch.setattr(scraper, 'DATABASE_URL', None)
+
+    settings = {"platforms": {"craigslist": True, "offerup": True, "mercari": True}, "regions": []}
+    fixture_dir = os.path.join(str(tmp_path), "fixtures")
+    rows = write_fixtures(fixture_dir, load_regions(settings, scraper.ZIP_CODE))
+    monkeypatch.setenv('FIXTURE_DIR', fixture_dir)
+    monkeypatch.setenv('SCRAPER_REPLAY', 'replay')
+    monkeypatch.setattr(alerts, '_alert_dispatcher', alerts.AlertDispatcher(NullNotifier(), coalesce_seconds=0))
+
+    events = []
+    scanned = []
+
+    def emit(kind, payload=None):
+        events.append(kind)
+        if kind == "scanned":
+            scanned.append(payload)
+
+    def scan():
+        # Fresh state each run so every listing is new again
+        run_scan({"id": 1, "settings": settings}, emit,
+                 {"seen_listings": [], "seen_keys": set(), "duplicates": NearDuplicateIndex()})
+
+    yield scan, rows, events, scanned
+    alerts.stop_alert_dispatcher(timeout=5)
+
+
+@pytest.mark.benchmark(group="scan")
+def test_replayed_scan(within_budget, replayed_scan):
+    """One full scan cycle from replayed pages, as the worker runs it"""
+    scan, rows, events, scanned = replayed_scan
+    within_budget("scan", scan)
+
+    assert rows == 1680
+    assert "error" not in events
+    # Every cycle starts from fresh state, so each one finds the same deals on all three platforms
+    cycles = [scanned[i:i + 3] for i in range(0, len(scanned), 3)]
+    assert cycles and all(cycle == cycles[0] for cycle in cycles)
@@ -0,0 +1,76 @@
+import pytest
+
+import browsing
+from browsing import apply_lean_browsing, browsing_profile, open_tab, record_page_load, restore_full_browsing
+
+
+class FakeSwitch:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def new_window(self, kind):
+        handle = f"tab-{len(self.driver.window_handles)}"
+        self.driver.window_handles.append(handle)
+        self.driver.current_window_handle = handle
+
+    def window(self, handle):
+        self.driver.current_window_handle = handle
+
+
+class FakeDriver:
+    """Records which tab each CDP command went to"""
+
+    def __init__(self, tabs=1):
+        self.window_handles = [f"tab-{index}" for index in range(tabs)]
+        self.current_window_handle = "tab-0"
+        self.switch_to = FakeSwitch(self)
+        self.blocked = {}
+
+    def execute_cdp_cmd(self, command, params):
+        if command == 'Network.setBlockedURLs':
+            self.blocked[self.current_window_handle] = params["urls"]
+
+    def execute_script(self, script):
+        return {"bytes": 1000, "resources": 3, "load_ms": 500}
+
+
+@pytest.fixture
+def observed(monkeypatch):
+    loads = []
+    monkeypatch.setattr(browsing.PAGE_BYTES, "observe", lambda value, platform, profile: loads.append(profile))
+    monkeypatch.setattr(browsing.PAGE_LOAD_SECONDS, "observe", lambda value, platform, profile: None)
+    return loads
+
+
+def test_every_tab_gets_the_block_list():
+    driver = apply_lean_browsing(FakeDriver(tabs=2), "Mercari")
+    opened = open_tab(driver)
+
+    patterns = browsing.blocked_patterns("Mercari")
+    assert driver.blocked == {"tab-0": patterns, "tab-1": patterns, opened: patterns}
+    assert driver.browsing_profiles == {"tab-0": "lean", "tab-1": "lean", opened: "lean"}
+    assert driver.current_window_handle == opened
+
+
+def test_page_loads_are_labelled_by_their_tab(observed):
+    driver = apply_lean_browsing(FakeDriver(), "OfferUp")
+    open_tab(driver)
+    restore_full_browsing(driver)
+
+    record_page_load(driver, "OfferUp")
+    driver.switch_to.window("tab-0")
+    record_page_load(driver, "OfferUp")
+
+    assert observed == ["full", "lean"]
+
+
+def test_nothing_is_blocked_with_lean_browsing_off(monkeypatch, observed):
+    monkeypatch.setattr(browsing, "LEAN_BROWSING", False)
+    driver = apply_lean_browsing(FakeDriver(), "OfferUp")
+    open_tab(driver)
+
+    assert driver.blocked == {}
+    assert browsing_profile(driver) == "full"
+    # A driver nobody set up loads everything
+    record_page_load(FakeDriver(), "OfferUp")
+    assert observed == ["full"]
@@ -0,0 +1,29 @@
+from captcha import CaptchaDesk
+
+
+class FakeDriver:
+    def __init__(self, capabilities):
+        self.capabilities = capabilities
+        self.current_window_handle = "tab-0"
+        self.quit_called = False
+
+    def execute_cdp_cmd(self, command, params):
+        pass
+
+    def quit(self):
+        self.quit_called = True
+
+
+def test_parked_headless_browser_lists_its_devtools_address():
+    desk = CaptchaDesk()
+    headless = FakeDriver({"goog:chromeOptions": {"debuggerAddress": "localhost:40213"}})
+    desk.park("OfferUp", headless, "https://offerup.com/search/?q=3ds", "3ds")
+    desk.park("Mercari", FakeDriver({}), "https://www.mercari.com/search/?keyword=3ds", "3ds")
+
+    summary = {entry["platform"]: entry for entry in desk.summary()}
+    assert summary["OfferUp"]["debugger_address"] == "localhost:40213"
+    assert summary["Mercari"]["debugger_address"] is None
+    assert all("driver" not in entry for entry in summary.values())
+
+    desk.close_all()
+    assert headless.quit_called
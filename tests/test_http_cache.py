@@ -0,0 +1,171 @@
+import os
+import types
+
+import pytest
+
+import http_cache
+from http_cache import HTTPCache, ttl_for
+
+LISTING_URL = "https://sfbay.craigslist.org/vid/d/gameboy/123.html"
+SEARCH_URL = "https://sfbay.craigslist.org/search/vga?query=gameboy"
+OTHER_URL = "https://example.com/about"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(http_cache, "time", types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = HTTPCache(directory=str(tmp_path), max_bytes=1024)
+    monkeypatch.setattr(http_cache, "_http_cache", cache)
+    monkeypatch.setattr(http_cache, "CACHE_ENABLED", True)
+    yield cache
+    cache.db.close()
+
+
+class FakeResponse:
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.status_code = status_code
+
+
+@pytest.fixture
+def network(monkeypatch):
+    """Stands in for requests.get; set responses[url] before fetching"""
+    fetched = []
+    responses = {}
+
+    def get(url, **kwargs):
+        fetched.append(url)
+        return responses[url]
+
+    monkeypatch.setattr(http_cache.requests, "get", get)
+    return types.SimpleNamespace(fetched=fetched, responses=responses)
+
+
+def test_ttl_rules():
+    assert ttl_for(SEARCH_URL) == http_cache.SEARCH_TTL > 0
+    assert ttl_for(LISTING_URL) == 6 * http_cache.HOUR
+    assert ttl_for("https://images.example.com/a.JPG?w=300") == 7 * http_cache.DAY
+    assert ttl_for("vision:abc123") == 30 * http_cache.DAY
+    assert ttl_for(OTHER_URL) == http_cache.DEFAULT_TTL
+
+
+def test_entry_is_served_until_it_expires(cache, clock):
+    cache.put(LISTING_URL, b"<html>listing</html>", ttl=60)
+
+    clock[0] += 59
+    cached = cache.get(LISTING_URL)
+    assert cached.content == b"<html>listing</html>" and cached.from_cache
+
+    clock[0] += 2
+    assert cache.get(LISTING_URL) is None
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 1
+
+
+def test_zero_ttl_is_never_stored(cache):
+    cache.put(OTHER_URL, b"page", ttl=0)
+    assert cache.get(OTHER_URL) is None
+    assert cache.summary()["entries"] == 0
+
+
+def test_missing_blob_is_a_miss_and_drops_the_entry(cache):
+    cache.put(LISTING_URL, b"page", ttl=60)
+    for root, _, files in os.walk(os.path.join(cache.directory, "blobs")):
+        for name in files:
+            os.remove(os.path.join(root, name))
+
+    assert cache.get(LISTING_URL) is None
+    assert cache.summary()["entries"] == 0
+
+
+def test_identical_bodies_share_a_blob_until_replaced(cache):
+    cache.put("https://example.com/item/1", b"same body", ttl=60)
+    cache.put("https://example.com/item/2", b"same body", ttl=60)
+    assert cache._total_bytes() == len(b"same body")
+
+    cache.put("https://example.com/item/1", b"new body", ttl=60)
+    cache.put("https://example.com/item/2", b"new body", ttl=60)
+    assert cache._total_bytes() == len(b"new body")
+    blobs = [name for _, _, files in os.walk(os.path.join(cache.directory, "blobs")) for name in files]
+    assert len(blobs) == 1
+
+
+def test_least_recently_used_entries_are_evicted(cache, clock):
+    for i in range(4):
+        clock[0] += 1
+        cache.put(f"https://example.com/item/{i}", bytes([i]) * 300, ttl=600)
+        if i == 2:
+            # Touch the first entry so the second is now the oldest
+            clock[0] += 1
+            assert cache.get("https://example.com/item/0") is not None
+
+    assert cache._total_bytes() <= cache.max_bytes
+    assert cache.get("https://example.com/item/1") is None
+    assert cache.get("https://example.com/item/0") is not None
+    assert cache.get("https://example.com/item/3") is not None
+    assert cache.stats["evictions"] >= 1
+
+
+def test_cached_get_fetches_once_while_fresh(cache, clock, network):
+    network.responses[LISTING_URL] = FakeResponse(b"<html>listing</html>")
+
+    first = http_cache.cached_get(LISTING_URL, timeout=5)
+    second = http_cache.cached_get(LISTING_URL, timeout=5)
+    assert network.fetched == [LISTING_URL]
+    assert second.from_cache and second.text == first.content.decode()
+
+    clock[0] += 6 * http_cache.HOUR + 1
+    http_cache.cached_get(LISTING_URL, timeout=5)
+    assert network.fetched == [LISTING_URL, LISTING_URL]
+
+
+def test_cached_get_does_not_store_errors_or_uncached_urls(cache, network):
+    network.responses[LISTING_URL] = FakeResponse(b"rate limited", status_code=429)
+    network.responses[OTHER_URL] = FakeResponse(b"about")
+
+    for _ in range(2):
+        assert http_cache.cached_get(LISTING_URL).status_code == 429
+        http_cache.cached_get(OTHER_URL)
+
+    assert network.fetched == [LISTING_URL, OTHER_URL] * 2
+    assert cache.stats["bypassed"] == 2
+    assert cache.summary()["entries"] == 0
+
+
+def test_search_pages_are_cached_briefly(cache, clock, network):
+    network.responses[SEARCH_URL] = FakeResponse(b"results")
+
+    http_cache.cached_get(SEARCH_URL)
+    assert http_cache.cached_get(SEARCH_URL).from_cache
+    clock[0] += http_cache.SEARCH_TTL + 1
+    http_cache.cached_get(SEARCH_URL)
+
+    assert network.fetched == [SEARCH_URL, SEARCH_URL]
+
+
+def test_cache_events_are_exported(cache, network):
+    from metrics import HTTP_CACHE_EVENTS, registry, render_metrics
+
+    before = {event: HTTP_CACHE_EVENTS.series.get((event,), 0) for event in ("hits", "misses", "bypassed")}
+    network.responses[LISTING_URL] = FakeResponse(b"listing")
+    network.responses[OTHER_URL] = FakeResponse(b"about")
+    http_cache.cached_get(LISTING_URL)
+    http_cache.cached_get(LISTING_URL)
+    http_cache.cached_get(OTHER_URL)
+
+    after = {event: HTTP_CACHE_EVENTS.series.get((event,), 0) for event in before}
+    assert {event: after[event] - before[event] for event in before} == {"hits": 1, "misses": 1, "bypassed": 1}
+    assert 'pixelflip_http_cache_events_total{event="hits"}' in render_metrics(registry.snapshot())
+
+
+def test_selenium_pages_round_trip(cache):
+    http_cache.store_page(LISTING_URL, "<html>café</html>")
+    assert http_cache.get_cached_page(LISTING_URL) == "<html>café</html>"
+
+    http_cache.store_page(OTHER_URL, "<html>about</html>")
+    assert http_cache.get_cached_page(OTHER_URL) is None
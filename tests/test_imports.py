@@ -0,0 +1,42 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Only a scan that needs them may load these
+HEAVY_MODULES = ("selenium", "undetected_chromedriver", "webdriver_manager", "bs4", "psycopg2")
+# Cold import seconds allowed per entry point, several times what it takes today
+IMPORT_BUDGET = 1.5
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - started,
+                  "heavy": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def cold_import(module):
+    """Import a module in a fresh interpreter; returns (seconds, heavy modules it loaded)"""
+    result = subprocess.run([sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                            cwd=REPO_DIR, capture_output=True, text=True, check=True)
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+    return probe["seconds"], probe["heavy"]
+
+
+@pytest.mark.parametrize("module", ["api", "worker"])
+def test_entry_point_imports_stay_light(module):
+    _, heavy = cold_import(module)
+    assert heavy == []
+
+
+@pytest.mark.budget
+@pytest.mark.parametrize("module", ["api", "worker"])
+def test_entry_point_import_time(module):
+    # Best of a few runs; still only run with --budgets, a loaded runner can blow any budget
+    seconds = min(cold_import(module)[0] for _ in range(3))
+    assert seconds < IMPORT_BUDGET, f"import {module} took {seconds:.3f}s, budget is {IMPORT_BUDGET}s"
@@ -0,0 +1,145 @@
+import base64
+import random
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+import api
+import history
+
+PLATFORMS = ["Craigslist", "OfferUp", "Mercari"]
+
+
+class SQLiteCursor:
+    """psycopg2-style cursor over sqlite3: %s placeholders, datetimes stored as text"""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def execute(self, query, params=()):
+        params = [value.isoformat(' ') if isinstance(value, datetime) else value for value in params]
+        return self.cursor.execute(query.replace('%s', '?'), params)
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    def close(self):
+        pass
+
+
+class SQLiteConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self):
+        return SQLiteCursor(self.db.cursor())
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = sqlite3.connect(':memory:', detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+    db.execute('''
+        CREATE TABLE listings (id INTEGER PRIMARY KEY, title TEXT, price NUMERIC, link TEXT,
+                               platform TEXT, console_type TEXT, created_at TIMESTAMP)
+    ''')
+    rng = random.Random(7)
+    started = datetime(2026, 1, 1)
+    for i in range(1, 301):
+        # Three listings per minute, so pages often end between rows with the same created_at
+        db.execute('INSERT INTO listings VALUES (?, ?, ?, ?, ?, ?, ?)', (
+            i, f"listing {i}", rng.randint(10, 200), f"https://example.com/item/{i}", rng.choice(PLATFORMS),
+            rng.choice(["3ds", "gba sp"]), started + timedelta(minutes=i // 3)))
+    # The stand-in table already exists; the Postgres schema is not SQLite syntax
+    monkeypatch.setattr(history, '_schema_ready', True)
+    monkeypatch.setattr(api, 'get_db', lambda: SQLiteConnection(db))
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def client(db):
+    return api.app.test_client()
+
+
+def walk(client, **args):
+    """Follow next_cursor to the end; returns (ids, pages)"""
+    ids, cursor, pages = [], None, 0
+    while True:
+        response = client.get('/api/listings', query_string=dict(args, **({"cursor": cursor} if cursor else {})))
+        assert response.status_code == 200
+        ids += [listing["id"] for listing in response.json["listings"]]
+        pages += 1
+        cursor = response.json["next_cursor"]
+        if cursor is None:
+            return ids, pages
+
+
+def test_cursor_walk_matches_one_ordered_query(client, db):
+    ids, pages = walk(client, platform="mercari", console_type="3DS", max_price=100, limit=7)
+
+    expected = [row[0] for row in db.execute(
+        "SELECT id FROM listings WHERE platform = 'Mercari' AND console_type = '3ds' AND price <= 100 "
+        "ORDER BY created_at DESC, id DESC")]
+    assert expected and ids == expected
+    # Each page fetches one extra row, so a walk that ends on a full page needs no empty page after it
+    assert pages == -(-len(expected) // 7)
+
+
+def test_time_range_is_half_open(client, db):
+    response = client.get('/api/listings', query_string={
+        "since": "2026-01-01T00:10:00", "until": "2026-01-01T00:20:00", "limit": 200})
+
+    created = [listing["created_at"] for listing in response.json["listings"]]
+    assert len(created) == 30
+    assert min(created) == "2026-01-01T00:10:00" and max(created) == "2026-01-01T00:19:00"
+    assert response.json["next_cursor"] is None
+
+
+def test_unchanged_page_is_not_modified(client, db):
+    first = client.get('/api/listings?limit=5')
+    etag = first.headers["ETag"]
+
+    again = client.get('/api/listings?limit=5', headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.headers["ETag"] == etag and not again.data
+
+    db.execute("INSERT INTO listings VALUES (301, 'new', 50, 'https://example.com/new', 'Mercari', '3ds', "
+               "'2026-02-01 00:00:00')")
+    changed = client.get('/api/listings?limit=5', headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert changed.json["listings"][0]["id"] == 301
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    base64.urlsafe_b64encode(b"no separator").decode(),
+    base64.urlsafe_b64encode(b"2026-01-01T00:00:00|abc").decode(),
+    base64.urlsafe_b64encode(b"yesterday|12").decode(),
+    base64.urlsafe_b64encode(b"\xff\xfe|1").decode(),
+])
+def test_invalid_cursor_is_rejected(client, cursor):
+    response = client.get('/api/listings', query_string={"cursor": cursor})
+    assert response.status_code == 400
+    assert response.json == {"success": False, "error": "cursor is not one this API returned"}
+
+
+@pytest.mark.parametrize("limit, size", [("0", 1), ("-5", 1), ("1", 1), ("", 50), ("1000", 200)])
+def test_limit_is_clamped(client, limit, size):
+    response = client.get('/api/listings', query_string={"limit": limit} if limit else {})
+    assert response.status_code == 200
+    assert len(response.json["listings"]) == size
+
+
+@pytest.mark.parametrize("args", [
+    {"limit": "abc"}, {"limit": "2.5"}, {"platform": "ebay"}, {"min_price": "cheap"}, {"since": "yesterday"},
+])
+def test_bad_arguments_are_rejected(client, args):
+    response = client.get('/api/listings', query_string=args)
+    assert response.status_code == 400
+    assert response.json["success"] is False
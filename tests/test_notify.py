@@ -0,0 +1,166 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from alerts import render_alert
+from listing import Listing
+from notify import Notifier, SubscriberIndex
+
+
+class HookHandler(BaseHTTPRequestHandler):
+    """Records every POST; answers 500 while the server has failures left"""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, dict(self.headers), body))
+            failing = server.failures > 0
+            server.failures -= failing
+        self.send_response(500 if failing else 200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def hook_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), HookHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.failures = 0
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class RecordingTransport:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, recipient, subject, text, html):
+        self.sent.append((recipient, subject))
+
+    def close(self):
+        pass
+
+
+def deals():
+    return [
+        Listing("Nintendo 3DS XL blue", 90.0, "https://example.com/a", "Craigslist", "3ds xl", 120, 0.6),
+        Listing("Nintendo 3DS", 110.0, "https://example.com/b", "OfferUp", "3ds", 130, 0.2),
+        Listing("Gameboy Advance SP", 40.0, "https://example.com/c", "Mercari", "gba sp", 60, None),
+    ]
+
+
+def test_each_subscriber_gets_only_its_matches(hook_server):
+    transport = RecordingTransport()
+    notifier = Notifier(subscribers=[
+        {"id": "me", "type": "email", "target": "me@example.com"},
+        {"id": "bob", "type": "webhook", "target": f"{hook_server.url}/hook",
+         "consoles": ["3DS", "3ds xl"], "max_price": 100},
+        {"id": "phone", "type": "ntfy", "target": f"{hook_server.url}/topic", "min_deal_score": 0.5},
+        {"id": "7", "type": "webhook", "target": f"{hook_server.url}/watch", "watchlist_only": True},
+    ], email_transport=transport, workers=2, backoff_seconds=0)
+
+    assert notifier.notify(deals()) == (3, 0)
+    notifier.close()
+
+    assert transport.sent == [("me@example.com", "Found 3 Gaming Console Deal(s)!")]
+    requests_by_path = {path: (headers, body) for path, headers, body in hook_server.requests}
+    assert set(requests_by_path) == {"/hook", "/topic"}
+
+    hook = json.loads(requests_by_path["/hook"][1])
+    assert hook["subscriber"] == "bob"
+    assert [listing["link"] for listing in hook["listings"]] == ["https://example.com/a"]
+
+    headers, body = requests_by_path["/topic"]
+    assert headers["Title"] == "1 console deal(s)"
+    assert headers["Click"] == "https://example.com/a"
+    assert body.decode() == "$90.00 Nintendo 3DS XL blue (Craigslist)"
+
+
+def test_watchlist_subscriber_skips_its_filters(hook_server):
+    notifier = Notifier(subscribers=[
+        {"id": "7", "type": "webhook", "target": f"{hook_server.url}/watch", "watchlist_only": True,
+         "max_price": 10},
+    ], email_transport=RecordingTransport(), backoff_seconds=0)
+
+    assert notifier.notify(deals()) == (0, 0)
+    assert notifier.notify_subscriber("7", deals()[2:]) == (1, 0)
+    assert notifier.notify_subscriber("unknown", deals()) == (0, 0)
+    notifier.close()
+
+    assert [json.loads(body)["count"] for _, _, body in hook_server.requests] == [1]
+
+
+def test_webhook_is_retried_until_it_succeeds(hook_server):
+    hook_server.failures = 2
+    notifier = Notifier(subscribers=[{"id": "bob", "type": "webhook", "target": hook_server.url}],
+                        email_transport=RecordingTransport(), max_retries=3, backoff_seconds=0)
+
+    assert notifier.notify(deals()) == (1, 0)
+    notifier.close()
+    assert len(hook_server.requests) == 3
+
+
+def test_webhook_gives_up_after_max_retries(hook_server):
+    hook_server.failures = 10
+    notifier = Notifier(subscribers=[{"id": "bob", "type": "webhook", "target": hook_server.url}],
+                        email_transport=RecordingTransport(), max_retries=2, backoff_seconds=0)
+
+    assert notifier.notify(deals()) == (0, 1)
+    notifier.close()
+    assert len(hook_server.requests) == 3
+
+
+def test_index_keys_subscribers_by_console():
+    index = SubscriberIndex([
+        {"id": "handhelds", "consoles": ["3DS", "gba sp"]},
+        {"id": "everything"},
+    ])
+
+    assert set(index.by_console) == {"3ds", "gba sp"}
+    matches = index.match(deals())
+    assert [listing.link for listing in matches["handhelds"]] == ["https://example.com/b", "https://example.com/c"]
+    assert len(matches["everything"]) == 3
+
+
+def test_console_repeated_in_another_case_matches_once():
+    index = SubscriberIndex([{"id": "handhelds", "consoles": ["3DS", "3ds", "3Ds", "gba sp"]}])
+
+    assert index.by_console["3ds"] == [index.subscribers["handhelds"]]
+    assert [listing.link for listing in index.match(deals())["handhelds"]] == [
+        "https://example.com/b", "https://example.com/c"]
+
+
+def test_email_subscribers_with_the_same_matches_share_one_render(monkeypatch):
+    import notify
+
+    rendered = []
+
+    def counting_render(listings):
+        rendered.append(len(listings))
+        return render_alert(listings)
+
+    monkeypatch.setattr(notify, "render_alert", counting_render)
+    transport = RecordingTransport()
+    notifier = Notifier(subscribers=[
+        {"id": "me", "type": "email", "target": "me@example.com"},
+        {"id": "partner", "type": "email", "target": "partner@example.com"},
+        {"id": "cheap", "type": "email", "target": "cheap@example.com", "max_price": 50},
+    ], email_transport=transport, backoff_seconds=0)
+
+    assert notifier.notify(deals()) == (3, 0)
+    notifier.close()
+
+    assert sorted(rendered) == [1, 3]
+    assert sorted(recipient for recipient, _ in transport.sent) == [
+        "cheap@example.com", "me@example.com", "partner@example.com"]
@@ -0,0 +1,115 @@
+import itertools
+import os
+from concurrent.futures import Future
+
+import pytest
+
+import checkpoint
+import replay
+import scraper
+from parsing import parse_page
+from regions import HostLimiter
+from sample_data import card_fixture, craigslist_fixture
+
+REGION = {"craigslist": "sfbay", "zip_code": "94103", "distance": 25}
+TERMS = ["gameboy", "3ds"]
+
+
+class InlinePool:
+    """Parses on the calling thread, so the test needs no worker processes"""
+
+    def submit(self, platform, content, base_url, debug=False):
+        future = Future()
+        future.set_result(parse_page(platform, content, base_url, debug)[2])
+        return future
+
+
+class FakeResponse:
+    status_code = 200
+    from_cache = False
+
+    def __init__(self, content):
+        self.content = content
+
+
+@pytest.fixture
+def fixture_dir(tmp_path, monkeypatch):
+    directory = str(tmp_path / "fixtures")
+    monkeypatch.setenv("FIXTURE_DIR", directory)
+    monkeypatch.setenv("SCRAPER_REPLAY", "")
+    return directory
+
+
+@pytest.fixture
+def fresh_journal(tmp_path, monkeypatch):
+    """A new scan journal per call, so replayed terms are not resumed from the recorded run"""
+    runs = itertools.count()
+
+    def new_journal():
+        journal = checkpoint.ScanJournal(str(tmp_path / f"journal-{next(runs)}.jsonl"))
+        monkeypatch.setattr(checkpoint, "_journal", journal)
+        return journal
+    return new_journal
+
+
+def test_fixture_paths_are_per_platform_term_and_region(fixture_dir):
+    variant = replay.region_variant(REGION)
+    assert variant == "sfbay-94103-25"
+    assert replay.fixture_path("Craigslist", "Game Boy!", variant) == \
+        os.path.join(fixture_dir, "craigslist", "sfbay-94103-25-game-boy.html")
+    assert replay.fixture_path("OfferUp", "retro console") == os.path.join(fixture_dir, "offerup", "retro-console.html")
+
+
+def test_pages_are_written_only_while_recording(fixture_dir, monkeypatch):
+    replay.record_page("Mercari", "3ds", "<html>off</html>")
+    assert replay.load_page("Mercari", "3ds") is None
+
+    monkeypatch.setenv("SCRAPER_REPLAY", "record")
+    replay.record_page("Mercari", "3ds", "<html>café</html>")
+    replay.record_page("Craigslist", "3ds", b"<html>bytes</html>", "sfbay-94103-25")
+
+    assert replay.load_page("Mercari", "3ds") == "<html>café</html>".encode("utf-8")
+    assert replay.load_page("Craigslist", "3ds", "sfbay-94103-25") == b"<html>bytes</html>"
+    # Another region's page was never recorded
+    assert replay.load_page("Craigslist", "3ds", "nyc-10001-25") is None
+
+
+def test_craigslist_scan_replays_what_it_recorded(fixture_dir, fresh_journal, monkeypatch):
+    pages = {term: craigslist_fixture(20, seed).encode("utf-8") for seed, term in enumerate(TERMS)}
+    fetched = []
+
+    def fake_get(url, **kwargs):
+        fetched.append(url)
+        term = url.split("query=")[1].split("&")[0].replace("+", " ")
+        return FakeResponse(pages[term])
+
+    monkeypatch.setattr(scraper, "CRAIGSLIST_SEARCH_TERMS", TERMS)
+    monkeypatch.setattr(scraper, "cached_get", fake_get)
+
+    monkeypatch.setenv("SCRAPER_REPLAY", "record")
+    fresh_journal()
+    recorded = scraper.fetch_craigslist_region(REGION, InlinePool(), HostLimiter())
+    assert len(fetched) == len(TERMS)
+    assert recorded
+
+    def no_network(url, **kwargs):
+        raise AssertionError(f"replay fetched {url}")
+
+    monkeypatch.setattr(scraper, "cached_get", no_network)
+    monkeypatch.setenv("SCRAPER_REPLAY", "replay")
+    fresh_journal()
+    assert scraper.fetch_craigslist_region(REGION, InlinePool(), HostLimiter()) == recorded
+
+
+def test_card_pages_replay_without_a_browser(fixture_dir, fresh_journal, monkeypatch):
+    monkeypatch.setenv("SCRAPER_REPLAY", "record")
+    replay.record_page("Mercari", "gameboy", card_fixture(10))
+    monkeypatch.setenv("SCRAPER_REPLAY", "replay")
+    fresh_journal()
+
+    pending = scraper.replay_card_pages("Mercari", ["gameboy", "3ds"], "https://www.mercari.com", InlinePool())
+
+    # The unrecorded term is skipped rather than fetched
+    assert [term for term, _ in pending] == ["gameboy"]
+    rows = pending[0][1].result()
+    assert rows == InlinePool().submit("Mercari", card_fixture(10), "https://www.mercari.com").result()
@@ -0,0 +1,86 @@
+import pytest
+
+import scraper
+from listing import Listing
+from scraper import screen_listings
+from settings import DEFAULT_SETTINGS, compile_filters
+
+GAMES = "Selling 3 ds games, cartridge only, no console. Pick up downtown."
+CONSOLE = "Nintendo 3DS XL in blue, charger included, a few scratches on the lid."
+
+
+def page(description, image="https://images.example.com/photo.jpg"):
+    return (f'<html><head><meta property="og:image" content="{image}"></head>'
+            f'<body><div data-testid="description">{description}</div></body></html>')
+
+
+class FakeDriver:
+    def __init__(self, pages):
+        self.pages = pages
+        self.loaded = []
+        self.quit_called = False
+        self.page_source = None
+
+    def get(self, url):
+        self.loaded.append(url)
+        self.page_source = self.pages[url]
+
+    def quit(self):
+        self.quit_called = True
+
+
+@pytest.fixture
+def pages(monkeypatch):
+    cached = {}
+    monkeypatch.setattr(scraper, "get_cached_page", cached.get)
+    monkeypatch.setattr(scraper, "store_page", cached.__setitem__)
+    monkeypatch.setattr(scraper.time, "sleep", lambda seconds: None)
+    return cached
+
+
+def filters(**switches):
+    return compile_filters(dict(DEFAULT_SETTINGS, **switches))
+
+
+def listing(name):
+    return Listing(f"Nintendo 3DS {name}", 90.0, f"https://offerup.com/item/detail/{name}", "OfferUp", "3ds", 100)
+
+
+def test_listings_whose_description_shows_games_are_dropped(pages):
+    pages["https://offerup.com/item/detail/cached"] = page(CONSOLE)
+    driver = FakeDriver({"https://offerup.com/item/detail/games": page(GAMES)})
+    created = []
+
+    kept = screen_listings([listing("cached"), listing("games")], "OfferUp",
+                           lambda: created.append(driver) or driver, filters=filters(ai_detection=False))
+
+    assert [item.link for item in kept] == ["https://offerup.com/item/detail/cached"]
+    # Only the page missing from the cache was loaded, in one driver
+    assert driver.loaded == ["https://offerup.com/item/detail/games"] and len(created) == 1
+    assert driver.quit_called
+    assert "https://offerup.com/item/detail/games" in pages
+
+
+def test_photo_check_uses_the_listing_image(pages, monkeypatch):
+    pages["https://offerup.com/item/detail/a"] = page(CONSOLE, image="https://images.example.com/a.jpg")
+    pages["https://offerup.com/item/detail/b"] = page(CONSOLE, image="https://images.example.com/b.jpg")
+    checked = []
+    monkeypatch.setattr(scraper, "check_image_with_ai",
+                        lambda image_url, debug=False: checked.append(image_url) or image_url.endswith("a.jpg"))
+
+    kept = screen_listings([listing("a"), listing("b")], "OfferUp", lambda: None,
+                           filters=filters(description_scan=False))
+
+    assert [item.link for item in kept] == ["https://offerup.com/item/detail/a"]
+    assert checked == ["https://images.example.com/a.jpg", "https://images.example.com/b.jpg"]
+
+
+def test_switches_off_or_no_driver_keeps_every_listing(pages):
+    listings = [listing("a"), listing("b")]
+
+    assert screen_listings(listings, "OfferUp", lambda: pytest.fail("no driver needed"),
+                           filters=filters(ai_detection=False, description_scan=False)) is listings
+    # Listings that can't be checked are kept, and a failed driver start isn't retried per listing
+    created = []
+    assert screen_listings(listings, "OfferUp", lambda: created.append(1), filters=filters()) == listings
+    assert created == [1]
@@ -0,0 +1,116 @@
+import pytest
+
+import tabs
+from browsing import apply_lean_browsing, blocked_patterns
+from tabs import TabPool
+
+
+class FakeSwitch:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def new_window(self, kind):
+        self.driver.opened += 1
+        self.driver.current_window_handle = f"tab-{self.driver.opened}"
+        self.driver.window_handles.append(self.driver.current_window_handle)
+
+    def window(self, handle):
+        self.driver.current_window_handle = handle
+
+
+class FakeDriver:
+    def __init__(self, name="first"):
+        self.name = name
+        self.opened = 0
+        self.current_window_handle = "tab-0"
+        self.window_handles = ["tab-0"]
+        self.switch_to = FakeSwitch(self)
+        self.loaded = []
+        self.blocked = {}
+
+    def execute_cdp_cmd(self, command, params):
+        if command == 'Network.setBlockedURLs':
+            self.blocked[self.current_window_handle] = params["urls"]
+
+    def execute_script(self, script, *args):
+        if script.startswith("window.location.href"):
+            self.loaded.append((self.current_window_handle, args[0]))
+            return None
+        return "complete"
+
+
+class FakeLimiter:
+    def acquire(self, url):
+        pass
+
+    def try_acquire(self, url):
+        return True
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(tabs, "TAB_POLL_SECONDS", 0)
+
+
+def run_pool(size, terms, idle_due=None, drivers=None):
+    # Set up like create_driver does
+    driver = apply_lean_browsing(FakeDriver(), "OfferUp")
+    pool = TabPool(driver, "OfferUp", FakeLimiter(), size=size)
+    harvested = []
+    idle_calls = []
+    if drivers is not None:
+        drivers.append(driver)
+
+    def idle(current):
+        idle_calls.append((current.name, len(harvested)))
+        fresh = apply_lean_browsing(FakeDriver(f"fresh-{len(idle_calls)}"), "OfferUp")
+        if drivers is not None:
+            drivers.append(fresh)
+        return fresh
+
+    final = pool.run(terms, lambda term: f"https://offerup.com/search/?q={term}",
+                     lambda term, url: harvested.append((term, pool.driver.name)),
+                     settle=0, idle=idle, idle_due=idle_due)
+    return harvested, idle_calls, final
+
+
+@pytest.mark.parametrize("size", [1, 2])
+def test_idle_runs_between_harvests_when_due(size):
+    terms = ["gameboy", "nintendo ds", "3ds", "retro console"]
+    harvested, idle_calls, final = run_pool(size, terms, idle_due=lambda driver: driver.name == "first")
+
+    assert [term for term, _ in harvested] == terms
+    # The bloated first driver is drained and swapped once, the fresh one is kept
+    assert len(idle_calls) == 1
+    assert idle_calls[0][0] == "first"
+    assert final.name == "fresh-1"
+    assert harvested[-1][1] == "fresh-1"
+
+
+def test_idle_runs_after_every_harvest_of_a_single_tab():
+    harvested, idle_calls, _ = run_pool(1, ["a", "b", "c"])
+
+    # Not after the last term, there is nothing left to load
+    assert [count for _, count in idle_calls] == [1, 2]
+
+
+def test_no_idle_when_not_due():
+    harvested, idle_calls, final = run_pool(2, ["a", "b", "c", "d"], idle_due=lambda driver: False)
+
+    assert len(harvested) == 4
+    assert idle_calls == []
+    assert final.name == "first"
+
+
+@pytest.mark.parametrize("size", [1, 2, 3])
+def test_every_tab_loads_with_the_block_list(size):
+    drivers = []
+    harvested, _, _ = run_pool(size, ["a", "b", "c", "d", "e"],
+                               idle_due=lambda driver: driver.name == "first", drivers=drivers)
+
+    assert len(harvested) == 5
+    for driver in drivers:
+        used = {handle for handle, _ in driver.loaded}
+        assert used and len(used) <= size
+        assert all(driver.blocked.get(handle) == blocked_patterns("OfferUp") for handle in used)
+        assert all(driver.browsing_profiles[handle] == "lean" for handle in used)
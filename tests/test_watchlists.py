@@ -0,0 +1,57 @@
+from listing import Listing
+from scraper import rows_to_listings
+from watchlists import WatchlistIndex
+
+
+def listing(title, price=80.0):
+    return Listing(title, price, f"https://example.com/{title.replace(' ', '-')}", "Craigslist")
+
+
+def matched(index, *listings):
+    return {user_id: [(item.title, keyword) for item, keyword in found]
+            for user_id, found in index.match(listings).items()}
+
+
+def test_overlapping_keywords_of_different_users_both_match():
+    index = WatchlistIndex([("ann", "3ds xl", 0, 150), ("bob", "3DS", 0, 150)])
+
+    assert matched(index, listing("Nintendo 3DS XL blue")) == {
+        "ann": [("Nintendo 3DS XL blue", "3ds xl")],
+        "bob": [("Nintendo 3DS XL blue", "3ds")],
+    }
+    # The same result bob gets with nobody else watching
+    assert matched(WatchlistIndex([("bob", "3ds", 0, 150)]), listing("Nintendo 3DS XL blue")) == {
+        "bob": [("Nintendo 3DS XL blue", "3ds")]}
+
+
+def test_a_user_watching_both_gets_one_match_for_the_longer_keyword():
+    index = WatchlistIndex([("ann", "3ds", 0, 150), ("ann", "3ds xl", 0, 150)])
+    assert matched(index, listing("3DS XL with charger")) == {"ann": [("3DS XL with charger", "3ds xl")]}
+
+
+def test_keywords_match_whole_words_within_the_price_range():
+    index = WatchlistIndex([("ann", "ds", 0, 150), ("bob", "game boy", 20, 50), ("cat", "  N64  ", 0, 150)])
+
+    assert matched(index, listing("Nintendo 3DS"), listing("Game-Boy color", 40.0),
+                   listing("Game Boy advance", 60.0), listing("n64 console")) == {
+        "bob": [("Game-Boy color", "game boy")],
+        "cat": [("n64 console", "n64")],
+    }
+    assert matched(WatchlistIndex([]), listing("Nintendo 3DS")) == {}
+
+
+def test_consoles_without_an_operator_threshold_are_candidates():
+    rows = [
+        ("Nintendo 3DS", 80.0, "https://example.com/a", "3ds", 120, True),
+        ("Sega Dreamcast", 60.0, "https://example.com/b", None, None, False),
+        ("3DS case only", 10.0, "https://example.com/c", "3ds", 120, False),
+        ("No price", None, "https://example.com/d", None, None, False),
+    ]
+    candidates = []
+    listings = rows_to_listings(rows, "Craigslist", candidates)
+
+    assert [item.title for item in listings] == ["Nintendo 3DS"]
+    # Rows the console filters rejected stay out, unpriced consoles are watchable
+    assert [item.title for item in candidates] == ["Nintendo 3DS", "Sega Dreamcast"]
+    assert matched(WatchlistIndex([("ann", "dreamcast", 0, 100)]), *candidates) == {
+        "ann": [("Sega Dreamcast", "dreamcast")]}
@@ -0,0 +1,222 @@
+"""
+Tracing spans for the scan pipeline.
+
+Spans use OpenTelemetry's field names (traceId, spanId, parentSpanId,
+startTimeUnixNano, ...) with flat attribute dicts, one JSON object per
+line, so they can be loaded as-is or converted to OTLP. A scan produces:
+
+    scan > platform > term > fetch
+                           > parse_page > filter_item   (parse pool process)
+    alert                                               (dispatcher thread)
+
+plus vision/description spans for item checks. What the debug prints say
+is recorded as span events through debug_log(), whether or not debug
+output is on.
+
+TRACING=file writes to TRACE_FILE, TRACING=console prints the spans,
+anything else turns tracing off and every span is a shared no-op.
+Finished spans go on a queue and a background thread writes them in
+batches, so the scan never waits on the exporter.
+"""
+import atexit
+import contextvars
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+TRACING = os.getenv('TRACING', 'off').lower()
+TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+TRACE_BATCH_SIZE = 256
+TRACE_FLUSH_SECONDS = 1.0
+SERVICE_NAME = "pixelflip-scraper"
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def tracing_enabled():
+    return TRACING in ('file', 'console')
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "end", "attributes", "events", "status")
+
+    def __init__(self, name, trace_id, parent_id, attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.start = time.time_ns()
+        self.end = None
+        self.attributes = attributes
+        self.events = []
+        self.status = None
+
+    @property
+    def recording(self):
+        return True
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def add_event(self, name, **attributes):
+        self.events.append({"name": name, "timeUnixNano": time.time_ns(), "attributes": attributes})
+
+    def record_exception(self, error):
+        self.status = {"code": "ERROR", "message": str(error)}
+        self.add_event("exception", **{"exception.type": type(error).__name__, "exception.message": str(error)})
+
+    def context(self):
+        """(trace id, span id) to hand to another process"""
+        return self.trace_id, self.span_id
+
+    def to_dict(self):
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "startTimeUnixNano": self.start,
+            "endTimeUnixNano": self.end,
+            "attributes": self.attributes,
+            "events": self.events,
+            "status": self.status or {"code": "OK"},
+            "resource": {"service.name": SERVICE_NAME, "process.pid": os.getpid()},
+        }
+
+
+class NoopSpan:
+    __slots__ = ()
+    recording = False
+
+    def set_attribute(self, key, value):
+        pass
+
+    def add_event(self, name, **attributes):
+        pass
+
+    def record_exception(self, error):
+        pass
+
+    def context(self):
+        return None
+
+
+NOOP_SPAN = NoopSpan()
+
+
+class BatchExporter:
+    """Writes finished spans from a background thread, TRACE_BATCH_SIZE at a time"""
+
+    def __init__(self, mode=TRACING, path=TRACE_FILE):
+        self.mode = mode
+        self.path = path
+        self.queue = queue.SimpleQueue()
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self.thread.start()
+
+    def export(self, span):
+        self.queue.put(span)
+
+    def _run(self):
+        while True:
+            batch = []
+            deadline = time.monotonic() + TRACE_FLUSH_SECONDS
+            while len(batch) < TRACE_BATCH_SIZE:
+                try:
+                    span = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if span is None:
+                    self._write(batch)
+                    return
+                batch.append(span)
+            self._write(batch)
+
+    def _write(self, batch):
+        if not batch:
+            return
+        # One write per batch, appended, so processes sharing TRACE_FILE don't interleave lines
+        text = "".join(json.dumps(span.to_dict(), default=str) + "\n" for span in batch)
+        try:
+            if self.mode == 'console':
+                sys.stdout.write(text)
+                sys.stdout.flush()
+            else:
+                with open(self.path, 'a') as f:
+                    f.write(text)
+        except OSError:
+            self.dropped += len(batch)
+
+    def shutdown(self):
+        self.queue.put(None)
+        self.thread.join(timeout=5)
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def get_exporter():
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = BatchExporter()
+                atexit.register(_exporter.shutdown)
+                # Pool and worker processes skip atexit but run multiprocessing finalizers
+                from multiprocessing import util
+                util.Finalize(None, _exporter.shutdown, exitpriority=10)
+    return _exporter
+
+
+@contextmanager
+def start_span(name, parent=None, **attributes):
+    """
+    Run the block inside a new span, child of the current span or of
+    parent, a (trace id, span id) pair from Span.context().
+    """
+    if not tracing_enabled():
+        yield NOOP_SPAN
+        return
+
+    if parent is None:
+        current = _current_span.get()
+        parent = current.context() if current is not None else None
+    trace_id, parent_id = parent if parent else (f"{random.getrandbits(128):032x}", None)
+
+    span = Span(name, trace_id, parent_id, attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.record_exception(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end = time.time_ns()
+        get_exporter().export(span)
+
+
+def current_span():
+    return _current_span.get() or NOOP_SPAN
+
+
+def current_context():
+    """Context of the current span for another process, or None"""
+    span = _current_span.get()
+    return span.context() if span is not None else None
+
+
+def debug_log(debug, message, **attributes):
+    """A debug print that is also recorded as an event on the current span"""
+    span = _current_span.get()
+    if span is not None:
+        span.add_event(message.strip(), **attributes)
+    if debug:
+        print(message)
@@ -0,0 +1,169 @@
+"""
+Multi-user watchlists.
+
+Each user keeps their own (keyword, min_price, max_price) entries in the
+database. A scan fetches every (platform, term) once, and everything it
+parsed, except rows the console filters rejected, is matched against
+all watchlists together through an inverted index from keyword to
+watchers, so scraping cost does not grow with the number of users. Seen listings and alerts are stored per user.
+"""
+import re
+
+WORD = re.compile(r'\w+')
+
+WATCHLIST_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS watchlists (
+        id SERIAL PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        keyword TEXT NOT NULL,
+        min_price NUMERIC NOT NULL DEFAULT 0,
+        max_price NUMERIC NOT NULL,
+        created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+        UNIQUE (user_id, keyword)
+    );
+    CREATE TABLE IF NOT EXISTS watch_seen (
+        user_id TEXT NOT NULL,
+        listing_key TEXT NOT NULL,
+        seen_at TIMESTAMP NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (user_id, listing_key)
+    );
+    CREATE TABLE IF NOT EXISTS watch_alerts (
+        id SERIAL PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        title TEXT NOT NULL,
+        price NUMERIC NOT NULL,
+        link TEXT NOT NULL,
+        platform TEXT NOT NULL,
+        console_type TEXT,
+        keyword TEXT NOT NULL,
+        created_at TIMESTAMP NOT NULL DEFAULT NOW()
+    );
+    CREATE INDEX IF NOT EXISTS watch_alerts_user_created ON watch_alerts (user_id, created_at DESC);
+"""
+
+
+def ensure_watchlist_tables(conn):
+    cursor = conn.cursor()
+    cursor.execute(WATCHLIST_SCHEMA)
+    conn.commit()
+    cursor.close()
+
+
+class WatchlistIndex:
+    """
+    Inverted index from watchlist keyword to (user, min_price, max_price).
+    Keywords are stored as their lower-cased words joined by single
+    spaces, and a title is matched by looking up each of its word runs
+    up to the longest keyword's length. Every keyword in a title is
+    found, so "3ds" still matches "Nintendo 3DS XL" for one user while
+    another user watches "3ds xl".
+    """
+
+    def __init__(self, entries):
+        self.watchers = {}
+        for user_id, keyword, min_price, max_price in entries:
+            phrase = " ".join(WORD.findall(keyword.lower()))
+            if phrase:
+                self.watchers.setdefault(phrase, []).append((user_id, float(min_price), float(max_price)))
+        self.longest = max((phrase.count(" ") + 1 for phrase in self.watchers), default=0)
+
+    def __len__(self):
+        return sum(len(watchers) for watchers in self.watchers.values())
+
+    def keywords_in(self, title):
+        """Every watched keyword that appears in the title, as whole words"""
+        words = WORD.findall(title.lower())
+        found = set()
+        for start in range(len(words)):
+            for end in range(start + 1, min(start + self.longest, len(words)) + 1):
+                phrase = " ".join(words[start:end])
+                if phrase in self.watchers:
+                    found.add(phrase)
+        return found
+
+    def match(self, listings):
+        """Return {user_id: [(listing, keyword)]} for every watcher a listing satisfies"""
+        matches = {}
+        if not self.watchers:
+            return matches
+
+        for listing in listings:
+            price = listing.price
+            matched_users = set()
+            # Longest first, so a user watching both is told about the more specific keyword
+            for keyword in sorted(self.keywords_in(listing.title), key=len, reverse=True):
+                for user_id, min_price, max_price in self.watchers[keyword]:
+                    if user_id in matched_users or not min_price <= price <= max_price:
+                        continue
+                    matched_users.add(user_id)
+                    matches.setdefault(user_id, []).append((listing, keyword))
+
+        return matches
+
+
+def load_watchlist_index(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT user_id, keyword, min_price, max_price FROM watchlists")
+    entries = cursor.fetchall()
+    cursor.close()
+    return WatchlistIndex(entries)
+
+
+def record_watch_matches(conn, matches):
+    """
+    Drop listings each user has already been alerted about, remember the
+    rest and store them as that user's alerts.
+    Returns {user_id: [new listings]}.
+    """
+    if not matches:
+        return {}
+
+    cursor = conn.cursor()
+    keys = list({listing.key for user_matches in matches.values() for listing, _ in user_matches})
+    cursor.execute(
+        "SELECT user_id, listing_key FROM watch_seen WHERE user_id = ANY(%s) AND listing_key = ANY(%s)",
+        (list(matches), keys)
+    )
+    already_seen = set(cursor.fetchall())
+
+    new_matches = {}
+    for user_id, user_matches in matches.items():
+        for listing, keyword in user_matches:
+            key = listing.key
+            if (user_id, key) in already_seen:
+                continue
+            already_seen.add((user_id, key))
+
+            cursor.execute(
+                "INSERT INTO watch_seen (user_id, listing_key) VALUES (%s, %s) ON CONFLICT DO NOTHING",
+                (user_id, key)
+            )
+            cursor.execute('''
+                INSERT INTO watch_alerts (user_id, title, price, link, platform, console_type, keyword)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ''', (user_id, listing.title, listing.price, listing.link, listing.platform.value,
+                  listing.console_type, keyword))
+            new_matches.setdefault(user_id, []).append(listing)
+
+    conn.commit()
+    cursor.close()
+    return new_matches
+
+
+def match_watchlists(database_url, candidates):
+    """
+    Match one scan's listings against every user's watchlist.
+    Returns {user_id: [new listings]}, or {} when there is no database.
+    """
+    if not database_url or not candidates:
+        return {}
+
+    import psycopg2
+
+    conn = psycopg2.connect(database_url)
+    try:
+        ensure_watchlist_tables(conn)
+        index = load_watchlist_index(conn)
+        return record_watch_matches(conn, index.match(candidates))
+    finally:
+        conn.close()
@@ -0,0 +1,491 @@
+"""
+Scan worker process.
+
+The API process only schedules scans and serves status. Chrome, page
+fetches, parsing, filtering and alerts all run in a separate process that
+takes scan jobs from a local queue and sends status events back.
+"""
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+# How long a new worker waits for a stopped one to finish its scan; it
+# shares the checkpoint journal and seen store, so it is killed after that
+RETIRED_JOIN_SECONDS = 120
+
+
+def run_scan(job, emit, state):
+    """
+    Run one scan cycle for a job and report progress through emit().
+    state holds what outlives a single scan (seen listings, dedup index).
+    """
+    from scraper import (
+        scrape_craigslist_regions,
+        scrape_offerup,
+        scrape_mercari,
+        save_seen_listings,
+        ZIP_CODE
+    )
+    from parsing import get_parse_pool
+    from regions import load_regions
+    from http_cache import get_http_cache
+    from governor import get_governor
+    from ratelimit import get_circuit_breaker, get_rate_limiter
+    from profiling import ScanProfiler, prune_profiles, section
+    from captcha import get_captcha_desk
+    from settings import compile_filters, set_filters
+    from checkpoint import get_journal
+
+    settings = job["settings"]
+    platforms = settings["platforms"]
+    regions = load_regions(settings, ZIP_CODE)
+    # The job's settings, unless the API sends newer ones mid-scan
+    set_filters(compile_filters(settings))
+
+    emit("activity", {"message": "Starting scan..."})
+    journal = get_journal()
+    resumed = journal.begin_scan(job["id"])
+    if resumed:
+        emit("activity", {"message": f"Resuming the interrupted scan, {resumed} search term(s) already done",
+                          "type": "info"})
+
+    try:
+        all_listings = []
+        # Every listing found, whatever its price or console type, for user watchlists
+        candidates = []
+        profiler = ScanProfiler(job["id"]) if job.get("profile") else None
+
+        if platforms.get("craigslist", True) and platform_allowed("Craigslist", emit):
+            emit("activity", {"message": f"Checking Craigslist ({len(regions)} region(s))..."})
+            with platform_stage("Craigslist", profiler):
+                craigslist_listings = scrape_craigslist_regions(regions, debug=False, candidates=candidates)
+            all_listings.extend(craigslist_listings)
+            emit("scanned", len(craigslist_listings))
+
+        if platforms.get("offerup", True) and platform_allowed("OfferUp", emit):
+            emit("activity", {"message": "Checking OfferUp..."})
+            # OfferUp takes its location from the browser session, only the radius is ours
+            with platform_stage("OfferUp", profiler):
+                offerup_listings = scrape_offerup(debug=False, distance=regions[0]["distance"],
+                                                  candidates=candidates)
+            all_listings.extend(offerup_listings)
+            emit("scanned", len(offerup_listings))
+
+        if platforms.get("mercari", True) and platform_allowed("Mercari", emit):
+            emit("activity", {"message": "Checking Mercari..."})
+            with platform_stage("Mercari", profiler):
+                mercari_listings = scrape_mercari(debug=False, candidates=candidates)
+            all_listings.extend(mercari_listings)
+            emit("scanned", len(mercari_listings))
+
+        emit("parse_stats", get_parse_pool().stats())
+        emit("cache_stats", get_http_cache().summary())
+        emit("governor", get_governor().summary())
+        emit("rate_limits", {"hosts": get_rate_limiter().summary(), "breakers": get_circuit_breaker().summary()})
+
+        captchas = get_captcha_desk().summary()
+        emit("captchas", captchas)
+        waiting = [entry["platform"] for entry in captchas if entry["status"] == "needs_human"]
+        if waiting:
+            emit("activity", {"message": f"CAPTCHA waiting for a human: {', '.join(waiting)}", "type": "info"})
+
+        with section(profiler, "Alerts"):
+            process_results(settings, all_listings, candidates, emit, state)
+    except BaseException:
+        # Keys journaled as seen must be in the seen file before the journal drops them
+        if journal.seen:
+            save_seen_listings(state["seen_listings"])
+        raise
+    finally:
+        # Only a worker that dies mid-scan resumes; a scan that failed starts over
+        journal.end_scan()
+
+    if profiler is not None:
+        prune_profiles()
+        emit("profile", profiler.files)
+        emit("activity", {"message": f"Saved scan profile ({len(profiler.files)} section(s))", "type": "info"})
+
+
+def platform_allowed(platform, emit):
+    """False while the platform's circuit breaker is open"""
+    from ratelimit import get_circuit_breaker
+
+    breaker = get_circuit_breaker()
+    if breaker.allow(platform):
+        return True
+    emit("activity", {
+        "message": f"Skipping {platform}, it keeps failing (retrying in {breaker.retry_in(platform)}s)",
+        "type": "info"
+    })
+    return False
+
+
+@contextmanager
+def platform_stage(platform, profiler):
+    """Time, profile and trace one platform's part of a scan"""
+    from metrics import PLATFORM_SCAN_SECONDS
+    from profiling import section
+    from tracing import start_span
+
+    with PLATFORM_SCAN_SECONDS.time(platform), section(profiler, platform), start_span("platform", platform=platform):
+        yield
+
+
+def process_results(settings, all_listings, candidates, emit, state):
+    """Everything after the fetch: price stats, dedup, alerts and watchlists"""
+    from scraper import send_email_alert, save_seen_listings, DATABASE_URL
+    from dedup import group_near_duplicates
+    from prices import get_price_index
+    from alerts import get_alert_dispatcher
+    from watchlists import match_watchlists
+    from history import save_listings
+    from metrics import FILTER_SECONDS, MATCHES, count_outcomes, record_error
+    from tracing import current_span
+    from settings import get_filters
+    from checkpoint import get_journal
+
+    journal = get_journal()
+    price_index = get_price_index()
+    price_index.save()
+    emit("price_stats", price_index.summary())
+
+    # Filter out already seen listings
+    started = time.perf_counter()
+    seen_listings = state["seen_listings"]
+    seen_keys = state["seen_keys"]
+    new_listings = []
+    for listing in all_listings:
+        if listing.key not in seen_keys:
+            new_listings.append(listing)
+            seen_listings.append(listing.key)
+            seen_keys.add(listing.key)
+    FILTER_SECONDS.observe(time.perf_counter() - started, "seen")
+    # Journaled before any alert goes out, so a restart never alerts them again
+    journal.mark_seen([listing.key for listing in new_listings])
+
+    emit("matches", len(new_listings))
+
+    # Cross-posts of one item become a single alert entry
+    started = time.perf_counter()
+    alerts, suppressed = group_near_duplicates(new_listings, state["duplicates"])
+    FILTER_SECONDS.observe(time.perf_counter() - started, "near_duplicates")
+    grouped = {id(listing) for listing in alerts}
+
+    if suppressed:
+        emit("activity", {"message": f"Skipped {suppressed} cross-post(s) of items already alerted"})
+
+    # Best deals first; optionally drop listings that are only cheap on paper
+    min_deal_score = get_filters().min_deal_score
+    alerts = [
+        listing for listing in alerts
+        if listing.deal_score is None or listing.deal_score >= min_deal_score
+    ]
+    alerts.sort(key=lambda listing: -1 if listing.deal_score is None else listing.deal_score, reverse=True)
+
+    span = current_span()
+    span.set_attribute("listings", len(all_listings))
+    span.set_attribute("new_listings", len(new_listings))
+    span.set_attribute("alerts", len(alerts))
+
+    alerted = {id(listing) for listing in alerts}
+    new = {id(listing) for listing in new_listings}
+    outcomes = {}
+    for listing in all_listings:
+        if id(listing) in alerted:
+            outcome = "alerted"
+        elif id(listing) in grouped:
+            outcome = "below_deal_score"
+        elif id(listing) in new:
+            outcome = "cross_post"
+        else:
+            outcome = "seen"
+        counts = outcomes.setdefault(listing.platform.value, {})
+        counts[outcome] = counts.get(outcome, 0) + 1
+    for platform, counts in outcomes.items():
+        count_outcomes(platform, counts, MATCHES)
+
+    if new_listings:
+        save_seen_listings(seen_listings)
+        # Browsable later through /api/listings
+        try:
+            save_listings(DATABASE_URL, new_listings)
+        except Exception as e:
+            record_error("history", e)
+            emit("activity", {"message": f"Could not save listing history: {e}", "type": "error"})
+
+    if alerts:
+        emit("activity", {
+            "message": f"Found {len(alerts)} new match(es)!",
+            "type": "success"
+        })
+        batch = journal.queue_alerts(alerts)
+        send_email_alert(alerts, on_sent=lambda: journal.alerts_sent(batch))
+    else:
+        emit("activity", {
+            "message": "Scan complete. No new matches found.",
+            "type": "info"
+        })
+
+    # Same scan, matched against every user's watchlist at once
+    try:
+        watch_matches = match_watchlists(DATABASE_URL, candidates)
+    except Exception as e:
+        record_error("watchlists", e)
+        emit("activity", {"message": f"Could not match watchlists: {e}", "type": "error"})
+        watch_matches = {}
+    for user_id, listings in watch_matches.items():
+        batch = journal.queue_alerts(listings, user_id)
+        get_alert_dispatcher().submit(listings, subscriber_id=user_id,
+                                      on_sent=lambda batch=batch: journal.alerts_sent(batch))
+    if watch_matches:
+        emit("activity", {
+            "message": f"Watchlists: {sum(len(l) for l in watch_matches.values())} new match(es) "
+                       f"for {len(watch_matches)} user(s)",
+            "type": "success"
+        })
+
+    emit("alert_stats", dict(get_alert_dispatcher().stats))
+
+
+def control_loop(control_queue, event_queue):
+    """
+    Operator actions that must not wait for a scan to finish: CAPTCHA
+    resolutions and settings changes. Also closes parked browsers nobody
+    came back for.
+    """
+    from captcha import get_captcha_desk
+    from settings import compile_filters, set_filters
+
+    desk = get_captcha_desk()
+    while True:
+        try:
+            message = control_queue.get(timeout=60)
+        except queue.Empty:
+            desk.expire()
+            continue
+        if message is None:
+            break
+
+        if message.get("type") == "settings":
+            bundle = compile_filters(message["settings"])
+            if set_filters(bundle):
+                log.info("Filters now at settings version %s", bundle.version)
+            continue
+
+        if message.get("type") == "captcha_resolve":
+            status = desk.resolve(message["id"], message["action"])
+            log.info("CAPTCHA #%s %s -> %s", message["id"], message["action"], status)
+        desk.expire()
+        # Not tied to a job, whichever scan is being followed picks it up
+        event_queue.put((None, "captchas", desk.summary()))
+
+
+def recover_checkpoint(journal, state, event_queue):
+    """Put back what the journal holds from before a restart: seen keys, unsent alerts, counters"""
+    from scraper import save_seen_listings
+    from alerts import get_alert_dispatcher
+
+    seen_listings = state["seen_listings"]
+    seen_keys = state["seen_keys"]
+    missing = [key for key in journal.seen if key not in seen_keys]
+    if missing:
+        seen_listings.extend(missing)
+        seen_keys.update(missing)
+        save_seen_listings(seen_listings)
+
+    pending = journal.pending_alerts()
+    for batch, subscriber_id, listings in pending:
+        get_alert_dispatcher().submit(listings, subscriber_id=subscriber_id,
+                                      on_sent=lambda batch=batch: journal.alerts_sent(batch))
+
+    event_queue.put((None, "counters", journal.today()))
+    if journal.recovered and (missing or pending or journal.done):
+        event_queue.put((None, "activity", {
+            "message": f"Recovered scan checkpoint: {len(journal.done)} finished term(s), "
+                       f"{len(missing)} seen listing(s), {len(pending)} unsent alert batch(es)",
+            "type": "info"
+        }))
+
+
+def worker_main(job_queue, event_queue, control_queue=None):
+    """Entry point of the worker process: run jobs until told to stop"""
+    from scraper import load_seen_listings
+    from parsing import shutdown_parse_pool
+    from dedup import NearDuplicateIndex
+    from alerts import stop_alert_dispatcher
+    from metrics import SCAN_SECONDS, record_error, registry
+    from tracing import start_span
+    from captcha import get_captcha_desk
+    from checkpoint import COUNTERS, get_journal
+
+    # A spawned process starts with logging unconfigured
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
+    if control_queue is not None:
+        threading.Thread(target=control_loop, args=(control_queue, event_queue),
+                         name="worker-control", daemon=True).start()
+
+    # Seen listings live in the worker so dedup never touches the API process.
+    # The list keeps the file's order, the set next to it answers "seen before?"
+    seen_listings = load_seen_listings()
+    state = {
+        "seen_listings": seen_listings,
+        "seen_keys": set(seen_listings),
+        "duplicates": NearDuplicateIndex()
+    }
+    journal = get_journal()
+    recover_checkpoint(journal, state, event_queue)
+
+    while True:
+        job = job_queue.get()
+        if job is None:
+            break
+
+        def emit(kind, payload=None):
+            if kind in COUNTERS:
+                journal.count(kind, payload)
+            event_queue.put((job["id"], kind, payload))
+
+        started = time.perf_counter()
+        with start_span("scan", job_id=job["id"]) as span:
+            try:
+                run_scan(job, emit, state)
+                ok = True
+            except Exception as e:
+                record_error("scan", e)
+                span.record_exception(e)
+                emit("error", str(e))
+                ok = False
+
+        SCAN_SECONDS.observe(time.perf_counter() - started)
+        emit("counters", journal.today())
+        emit("metrics", registry.snapshot())
+        emit("done", {"ok": ok})
+
+    if control_queue is not None:
+        control_queue.put(None)
+    get_captcha_desk().close_all()
+    shutdown_parse_pool()
+    # Flush any digest still inside its coalescing window
+    stop_alert_dispatcher(timeout=60)
+    journal.close()
+
+
+class ScanWorker:
+    """
+    Handle to the scan worker process, owned by the API.
+    Every start() gets fresh queues, so a worker that is still finishing a
+    job after stop() can never mix its events into the next run.
+    """
+
+    def __init__(self):
+        # spawn, not fork: the API process has Flask threads we must not copy.
+        # Not a daemon process either, daemons can't start the parse pool.
+        self.context = multiprocessing.get_context("spawn")
+        self.process = None
+        self.job_queue = None
+        self.event_queue = None
+        self.control_queue = None
+        self.next_job_id = 0
+        # Stopped workers that may still be finishing their last job
+        self.retired = []
+
+    @property
+    def pid(self):
+        return self.process.pid if self.process else None
+
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def start(self):
+        # Never two workers writing the same journal and seen store
+        for process in self.retired:
+            process.join(RETIRED_JOIN_SECONDS)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self.retired = []
+
+        self.job_queue = self.context.Queue()
+        self.event_queue = self.context.Queue()
+        self.control_queue = self.context.Queue()
+        self.process = self.context.Process(
+            target=worker_main,
+            args=(self.job_queue, self.event_queue, self.control_queue),
+            name="pixelflip-scan-worker"
+        )
+        self.process.start()
+
+    def stop(self):
+        """Ask the worker to exit once its current job is finished"""
+        if self.job_queue is not None:
+            self.job_queue.put(None)
+            self.retired = [p for p in self.retired if p.is_alive()]
+            self.retired.append(self.process)
+        # Forget it, the next submit() starts a fresh worker
+        self.process = None
+        self.job_queue = None
+        self.event_queue = None
+        self.control_queue = None
+
+    def terminate(self):
+        """Kill the worker outright, used when the API itself exits"""
+        self.stop()
+        for process in self.retired:
+            if process.is_alive():
+                process.terminate()
+        self.retired = []
+
+    def submit(self, settings, profile=False):
+        """Queue a scan job and return its id"""
+        if not self.is_alive():
+            self.start()
+
+        self.next_job_id += 1
+        job_id = self.next_job_id
+        self.job_queue.put({
+            "id": job_id,
+            "settings": settings,
+            "profile": profile,
+            "queued_at": datetime.now().isoformat()
+        })
+        return job_id
+
+    def control(self, message):
+        """Send an operator action to the running worker; False if there is none"""
+        if not self.is_alive():
+            return False
+        self.control_queue.put(message)
+        return True
+
+    def events(self, job_id, should_continue, poll_interval=1.0):
+        """
+        Yield (kind, payload) events for a job until it reports done.
+        Stops early if should_continue() goes False or the worker dies.
+        """
+        process = self.process
+        event_queue = self.event_queue
+
+        while should_continue():
+            try:
+                event_job_id, kind, payload = event_queue.get(timeout=poll_interval)
+            except queue.Empty:
+                if not process.is_alive():
+                    yield "error", "Scan worker exited unexpectedly"
+                    return
+                continue
+
+            # job id None: worker-wide news, e.g. a CAPTCHA resolved between scans
+            if event_job_id is not None and event_job_id != job_id:
+                continue
+
+            yield kind, payload
+
+            if kind == "done":
+                return